@@ -1,199 +1,207 @@
 from fastapi import APIRouter, HTTPException
 import uuid
-import boto3
 import json # Import the json module
 from typing import List, Optional, Dict
 # Make sure Request is imported from fastapi
 from fastapi import APIRouter, HTTPException, Depends, Form, Body, Request
-from fastapi import UploadFile, File, Form
-from sqlalchemy import Column, Integer, String, Float, text,create_engine, ForeignKey, TIMESTAMP
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
-from datetime import datetime, timedelta
+from fastapi import UploadFile, File, Form, Query, Response
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
 # Assuming config.py is in the same directory or accessible via PYTHONPATH
-from config import AWS_REGION, AWS_S3_BUCKET, DATABASE_URL
+from config import AWS_REGION, AWS_S3_BUCKET, REPORT_PAGE_SIZE, REPORT_MAX_PAGE_SIZE, USERS_PAGE_SIZE, USERS_MAX_PAGE_SIZE, ROLLUP_MAX_REFRESH_DAYS
+from models import Product, Transaction, get_db, get_async_db
+from search.engine import unindex_product
+from cache import invalidate_product
+from db.versions import written_version
+from starlette.concurrency import run_in_threadpool
+from storage.deletions import aenqueue_deletions, deletion_worker
+from images.gallery import astored_keys
+from analytics.rollups import query as query_rollups, refresh_now as refresh_rollups
+from auth.tokens import Identity
+from auth.middleware import require_admin
 import logging # Use logging module
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configured centrally by logging_config.setup_logging()
 logger = logging.getLogger(__name__)
 
 
 router = APIRouter()
-logger.info(f"AWS region: {AWS_REGION}")
-logger.info(f"S3 bucket: {AWS_S3_BUCKET}")
-logger.info(f"Database Url: {DATABASE_URL}")
-
-# # --- Database setup (remains the same) ---
-# engine = create_engine(DATABASE_URL)
-# SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-# Base = declarative_base()
-try:
-    # Assuming config.py exists and contains DATABASE_URL
-    from config import DATABASE_URL
-
-    Base = declarative_base()
-
-    # Define the Transaction model
-    class Transaction(Base):
-        __tablename__ = "transactions" # Matches the table name
-
-        transaction_id = Column(Integer, primary_key=True, index=True) # Primary key
-        buyer_id = Column(String, nullable=False) # Not nullable
-        seller_id = Column(String, nullable=False) # Not nullable
-        # Foreign key linking to the Product table
-        product_id = Column(Integer, ForeignKey("Products.product_id"), nullable=False) # Links to Products.product_id, not nullable
-        status = Column(String) # Status column
-        created_at = Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP')) # Timestamp with default
-        
-
-        
-
-    
-    # Create database engine and session factory
-    engine = create_engine(DATABASE_URL)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-    # Dependency to get database session
-    def get_db():
-        db = SessionLocal()
-        try:
-            yield db
-        finally:
-            db.close()
-
-except ImportError as e:
-    logger.error(f"Could not import necessary modules (e.g., config). Error: {e}")
-    # Re-raise the exception to stop the application if config is missing
-    raise
-except Exception as e:
-    logger.error(f"Database setup failed: {e}", exc_info=True)
-    # Re-raise the exception if database setup fails
-    raise
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# --- S3 client (remains the same) ---
-s3 = boto3.client("s3", region_name=AWS_REGION)
-
-# --- Models (remains the same) ---
-class Product(Base):
-    __tablename__ = "Products"
-    # Define your columns matching the create_product parameters
-    product_id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=False)
-    category = Column(String) # Consider adding description if needed
-    price = Column(Float, nullable=False)
-    seller_id = Column(String, nullable=False)  # <-- change Integer ➔ String
-    image_key = Column(String)
-    status     = Column(String, server_default=text("'unsold'"))
-    # quantity = Column(Integer) # Add if you want to store quantity
-# --- Add after your existing code ---
-
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-
-# Cognito Setup
-USER_POOL_ID = "us-east-1_IPqipLOoX"  # Your pool ID
-AWS_REGION = "us-east-1"              # Region (already imported earlier)
-cognito_client = boto3.client('cognito-idp', region_name=AWS_REGION)
-
-# Bearer auth scheme
-bearer_scheme = HTTPBearer()
+logger.info("AWS region: %s", AWS_REGION)
+logger.info("S3 bucket: %s", AWS_S3_BUCKET)
 
-@router.get("/users")
-async def list_users(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
-    token = credentials.credentials
+from botocore.exceptions import ClientError
+from admin.user_directory import UserDirectory, get_user_directory
 
+@router.get("/users")
+def list_users(
+    response: Response,
+    q: Optional[str] = Query(None, description="Only users whose id or email contains this (case-insensitive)"),
+    role: Optional[str] = Query(None, description="Only users with this custom:role"),
+    limit: int = Query(USERS_PAGE_SIZE, ge=1, le=USERS_MAX_PAGE_SIZE, description="Page size"),
+    after: Optional[str] = Query(None, description="Cursor: users after this id (use the X-Next-Cursor header of the previous page)"),
+    identity: Identity = Depends(require_admin),  # verified by AuthMiddleware
+    directory: UserDirectory = Depends(get_user_directory),
+):
+    # Sync handler: the first load (or a reload after the TTL) pages through Cognito, which
+    # must not block the event loop. Everything else is served from the cached directory.
     try:
-        response = cognito_client.list_users(
-            UserPoolId=USER_POOL_ID,
-            Limit=60  # Fetch up to 60 users at a time
-        )
-
-        users = []
-        for user in response['Users']:
-            attributes = {attr['Name']: attr['Value'] for attr in user['Attributes']}
-            user_data = {
-                'id': user['Username'],                # Cognito Username = unique id
-                'email': attributes.get('email', ''),   # Get email if exists
-                'role': attributes.get('custom:role', '') # Get custom role if exists
-            }
-            users.append(user_data)
-
-        logger.info(f"Fetched {len(users)} users from Cognito.")
-        return users
-
-    except cognito_client.exceptions.NotAuthorizedException as e:
-        logger.warning(f"Unauthorized access attempt: {e}")
-        raise HTTPException(status_code=401, detail="Unauthorized")
+        users, next_cursor = directory.query(q=q, role=role, after=after, limit=limit)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "NotAuthorizedException":
+            logger.warning("Unauthorized access attempt: %s", e)
+            raise HTTPException(status_code=401, detail="Unauthorized")
+        logger.error("Error fetching users: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
     except Exception as e:
-        logger.error(f"Error fetching users: {e}", exc_info=True)
+        logger.error("Error fetching users: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
 
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    logger.debug("Returning %d users from the directory.", len(users))
+    return users
 
-
-Base.metadata.create_all(bind=engine) # Creates the table if it doesn't exist
 @router.delete('/{id}')
-async def delete_product(id: int):
-    logger.info(f"Attempting to delete product with ID {id}")
-    
-    db: Session = next(get_db())
-    product: Product = db.query(Product).get(id)
-    
+async def delete_product(
+    id: int,
+    identity: Identity = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    logger.debug("Attempting to delete product with ID %s", id)
+
+    product: Product = await db.get(Product, id)
     if not product:
-        logger.warning(f"Delete failed: Product with ID {id} not found.")
+        logger.warning("Delete failed: Product with ID %s not found.", id)
         raise HTTPException(404, "Product not found")
 
-    # Optional: Delete image from S3 if the product has an image key
-    if product.image_key:
-        try:
-            s3.delete_object(Bucket=AWS_S3_BUCKET, Key=product.image_key)
-            logger.info(f"Deleted S3 object: {product.image_key}")
-        except Exception as e:
-            logger.error(f"Failed to delete S3 object {product.image_key}: {e}", exc_info=True)
-            # Proceed without raising an error, as it's optional
+    # Queue every image and its variants for background deletion from S3, committed with the product delete
+    await aenqueue_deletions(db, [product.image_key, *await astored_keys(db, [id])])
 
-    # Delete the product from the database
-    db.delete(product)
-    db.commit()
+    # Delete the product from the database; the flush bumps the catalogue version
+    await db.delete(product)
+    await db.commit()
+    deletion_worker.wake()
+    unindex_product(id, written_version(db))
+    await run_in_threadpool(invalidate_product, id)
 
-    logger.info(f"Product {id} deleted successfully.")
+    logger.info("Product %s deleted by admin", id)
     return {"message": f"Product {id} deleted successfully"}
 
+# Only the columns the report shows, joined in one query: rows come back as tuples, not ORM objects
+REPORT_COLUMNS = (
+    Transaction.transaction_id,
+    Transaction.buyer_id,
+    Transaction.seller_id,
+    Transaction.product_id,
+    Transaction.status,
+    Transaction.created_at,
+    Product.name.label("product_name"),
+)
+
+
+def _utc_naive(value: datetime) -> datetime:
+    # created_at is a naive UTC timestamp; accept aware datetimes from the query string too
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def _parse_report_cursor(cursor: str):
+    try:
+        created_at, transaction_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created_at), int(transaction_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/transactions/last_week")
-async def get_transactions_last_week(db: Session = Depends(get_db)):
+@router.get("/transactions")
+async def get_transactions_last_week(
+    start: Optional[datetime] = Query(None, description="Earliest created_at (default: 7 days ago)"),
+    end: Optional[datetime] = Query(None, description="Latest created_at, exclusive (default: now)"),
+    limit: int = Query(REPORT_PAGE_SIZE, ge=1, le=REPORT_MAX_PAGE_SIZE, description="Page size"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    identity: Identity = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Newest first. Keyset pagination on (created_at, transaction_id) walks
+    # ix_transactions_created_at backwards, so every page costs the same however deep it is.
+    end = _utc_naive(end) if end else datetime.utcnow()
+    start = _utc_naive(start) if start else end - timedelta(days=7)
+    query = (
+        select(*REPORT_COLUMNS)
+        .join(Product, Transaction.product_id == Product.product_id)
+        .where(Transaction.created_at >= start, Transaction.created_at < end)
+        .order_by(Transaction.created_at.desc(), Transaction.transaction_id.desc())
+    )
+    if cursor:
+        query = query.where(tuple_(Transaction.created_at, Transaction.transaction_id) < _parse_report_cursor(cursor))
+
     try:
-        one_week_ago = datetime.utcnow() - timedelta(days=7)
-        
-        transactions = db.query(Transaction).filter(Transaction.created_at >= one_week_ago).all()
-        
-        if not transactions:
-            raise HTTPException(status_code=404, detail="No transactions found in the last week.")
-        
-        transactions_list = [
-            {
-                "transaction_id": transaction.transaction_id,
-                "buyer_id": transaction.buyer_id,
-                "seller_id": transaction.seller_id,
-                "product_id": transaction.product_id,
-                "status": transaction.status,
-                "created_at": transaction.created_at.isoformat(),
-                "buyer_username": transaction.buyer_id,  # use buyer_id directly
-                "seller_username": transaction.seller_id, # use seller_id directly
-                "product_name": transaction.product_id,  # use product_id directly
-            }
-            for transaction in transactions
-        ]
-        
-        logger.info(f"Retrieved {len(transactions_list)} transactions from the past week.")
-        
-        return {"transactions": transactions_list}
-    
+        # One extra row tells us whether there is another page
+        rows = (await db.execute(query.limit(limit + 1))).all()
     except Exception as e:
-        logger.error(f"Error fetching transactions from the last week: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        logger.error("Error fetching transactions report: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    transactions_list = [
+        {
+            "transaction_id": row.transaction_id,
+            "buyer_id": row.buyer_id,
+            "seller_id": row.seller_id,
+            "product_id": row.product_id,
+            "status": row.status,
+            "created_at": row.created_at.isoformat(),
+            "buyer_username": row.buyer_id,  # use buyer_id directly
+            "seller_username": row.seller_id, # use seller_id directly
+            "product_name": row.product_name,
+        }
+        for row in rows
+    ]
+    logger.debug("Retrieved %d transactions between %s and %s.", len(transactions_list), start, end)
+
+    last = rows[-1] if has_more else None
+    return {
+        "transactions": transactions_list,
+        "next_cursor": f"{last.created_at.isoformat()}_{last.transaction_id}" if last else None,
+    }
+
+
+@router.get("/analytics/transactions")
+def get_transaction_analytics(
+    start: Optional[datetime] = Query(None, description="Earliest created_at, rounded down to a bucket (default: 7 days before end)"),
+    end: Optional[datetime] = Query(None, description="Latest created_at, rounded up to a bucket (default: now)"),
+    bucket: str = Query("day", pattern="^(hour|day)$"),
+    category: Optional[str] = Query(None, description="Only this category ('' for none); default every category"),
+    identity: Identity = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    # Transaction count, GMV and distinct buyers/sellers from the hourly/daily rollups
+    # (analytics/rollups.py): per bucket, per category and for the whole range
+    end = _utc_naive(end) if end else datetime.utcnow()
+    start = _utc_naive(start) if start else end - timedelta(days=7)
+    try:
+        return query_rollups(db, start, end, bucket, category)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/analytics/refresh")
+async def refresh_transaction_analytics(
+    since: Optional[datetime] = Query(None, description=f"Recompute from this created_at, at most {ROLLUP_MAX_REFRESH_DAYS} days back (default: the last watermark)"),
+    identity: Identity = Depends(require_admin),
+):
+    # Normally the rollup worker does this every ROLLUP_INTERVAL seconds. Every rollup row
+    # since `since` is deleted and recomputed under the rollup lock, so how far back is capped;
+    # a full rebuild is refresh_now() from a shell, not a request
+    if since is not None:
+        since = _utc_naive(since)
+        now = datetime.utcnow()
+        if since > now or since < now - timedelta(days=ROLLUP_MAX_REFRESH_DAYS):
+            raise HTTPException(status_code=400, detail=f"since must be within the last {ROLLUP_MAX_REFRESH_DAYS} days")
+    report = await run_in_threadpool(refresh_rollups, since)
+    if report is None:
+        raise HTTPException(status_code=409, detail="A rollup refresh is already running")
+    return report
@@ -0,0 +1,150 @@
+# backend/admin/user_directory.py
+# The Cognito user pool as served by GET /api/admin/users.
+#
+# The whole pool is paged through (list_users returns at most 60 users per call, following
+# PaginationToken) and held in memory, sorted by username. Reads filter and page that copy:
+#   age < REFRESH_AHEAD * TTL  -> served as is
+#   age < TTL                  -> served, and one background refresh starts (refresh-ahead)
+#   age >= TTL or never loaded -> reloaded before serving; if Cognito fails and an older
+#                                 copy exists, that copy is served and retried in the background
+#
+# The Cognito client is injectable (UserDirectory(client=...), or override the
+# get_user_directory dependency), and COGNITO_ENDPOINT_URL points the default client at a
+# local emulator.
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import boto3
+
+from config import (
+    COGNITO_USER_POOL_ID, COGNITO_REGION, COGNITO_ENDPOINT_URL,
+    USER_DIRECTORY_TTL, USER_DIRECTORY_REFRESH_AHEAD,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+COGNITO_PAGE_LIMIT = 60  # the most ListUsers will return per call
+
+
+def _user_dict(user) -> Dict:
+    attributes = {attr['Name']: attr['Value'] for attr in user.get('Attributes', [])}
+    return {
+        'id': user['Username'],                # Cognito Username = unique id
+        'email': attributes.get('email', ''),   # Get email if exists
+        'role': attributes.get('custom:role', '') # Get custom role if exists
+    }
+
+
+class UserDirectory:
+    def __init__(self, client=None, user_pool_id: str = COGNITO_USER_POOL_ID,
+                 ttl: int = USER_DIRECTORY_TTL, refresh_ahead: float = USER_DIRECTORY_REFRESH_AHEAD):
+        self._client = client
+        self.user_pool_id = user_pool_id
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._users: List[Dict] = []
+        self._ids: List[str] = []  # parallel to _users, for bisecting to a cursor
+        self._loaded_at = 0.0
+        self._refreshing = False
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = boto3.client('cognito-idp', region_name=COGNITO_REGION, endpoint_url=COGNITO_ENDPOINT_URL)
+        return self._client
+
+    def fetch_all(self) -> List[Dict]:
+        users, token = [], None
+        while True:
+            kwargs = {"UserPoolId": self.user_pool_id, "Limit": COGNITO_PAGE_LIMIT}
+            if token:
+                kwargs["PaginationToken"] = token
+            response = self.client.list_users(**kwargs)
+            users.extend(_user_dict(user) for user in response["Users"])
+            token = response.get("PaginationToken")
+            if not token:
+                return sorted(users, key=lambda u: u["id"])
+
+    def refresh(self):
+        started = time.perf_counter()
+        users = self.fetch_all()
+        with self._lock:
+            self._users = users
+            self._ids = [u["id"] for u in users]
+            self._loaded_at = time.monotonic()
+        logger.info("User directory loaded %d users in %.2fs", len(users), time.perf_counter() - started)
+
+    def _background_refresh(self):
+        try:
+            # Held so a reader finding the copy expired waits for this load instead of starting another
+            with self._reload_lock:
+                self.refresh()
+        except Exception as e:
+            logger.error("User directory refresh failed: %s", e, exc_info=True)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def snapshot(self) -> Tuple[List[Dict], List[str]]:
+        """The current (users, ids), loading or refreshing the pool as the TTL requires."""
+        with self._lock:
+            age = time.monotonic() - self._loaded_at if self._loaded_at else None
+            refresh_ahead = (
+                age is not None and self.ttl * self.refresh_ahead <= age < self.ttl and not self._refreshing
+            )
+            if refresh_ahead:
+                self._refreshing = True
+            current = (self._users, self._ids)
+        if refresh_ahead:
+            threading.Thread(target=self._background_refresh, name="user-directory-refresh", daemon=True).start()
+        if age is not None and age < self.ttl:
+            return current
+
+        with self._reload_lock:  # one caller reloads; the others wait and reuse its result
+            with self._lock:
+                if self._loaded_at and time.monotonic() - self._loaded_at < self.ttl:
+                    return self._users, self._ids
+            try:
+                self.refresh()
+            except Exception as e:
+                if not self._loaded_at:
+                    raise
+                logger.warning("User directory reload failed, serving a copy %.0fs old: %s", age, e)
+                with self._lock:
+                    # Back into the refresh-ahead window: keep serving this copy while retries
+                    # run in the background, rather than every request waiting on Cognito
+                    self._loaded_at = time.monotonic() - self.ttl * self.refresh_ahead
+            with self._lock:
+                return self._users, self._ids
+
+    def query(self, q: Optional[str] = None, role: Optional[str] = None,
+              after: Optional[str] = None, limit: int = 100) -> Tuple[List[Dict], Optional[str]]:
+        """Users with id/email containing q and the given role, by id after `after`.
+
+        Returns (page, next_cursor); next_cursor is None on the last page.
+        """
+        users, ids = self.snapshot()
+        q = q.strip().lower() if q and q.strip() else None
+        page = []
+        for i in range(bisect.bisect_right(ids, after) if after else 0, len(users)):
+            user = users[i]
+            if role is not None and user["role"] != role:
+                continue
+            if q is not None and q not in user["id"].lower() and q not in user["email"].lower():
+                continue
+            if len(page) == limit:
+                return page, page[-1]["id"]
+            page.append(user)
+        return page, None
+
+
+user_directory = UserDirectory()
+
+
+def get_user_directory() -> UserDirectory:
+    return user_directory
@@ -0,0 +1,69 @@
+# backend/analytics/hll.py
+# HyperLogLog sketches for distinct buyer/seller counts in the sales rollups.
+#
+# A distinct count can't be added up across buckets (a buyer active in two hours is one
+# buyer for the day), so every rollup row stores a sketch instead: M one-byte registers,
+# ~3% standard error (a value or two at a few dozen). Sketches of any buckets merge
+# (register-wise max) into the sketch of their union, so a range costs one merge per bucket.
+#
+# A sketch is a Python int holding the registers as M bytes, big-endian: merge() is then a
+# handful of big-int operations instead of an M-step loop.
+import hashlib
+import math
+import zlib
+from functools import lru_cache
+from typing import Iterable, Tuple
+
+P = 10  # index bits
+M = 1 << P  # registers
+_RANK_BITS = 64 - P
+_ALPHA = 0.7213 / (1 + 1.079 / M)
+_HIGH = int.from_bytes(b"\x80" * M, "big")  # the top bit of every register
+_POWERS = [2.0 ** -rank for rank in range(256)]
+
+
+@lru_cache(maxsize=65536)
+def _position(value: str) -> Tuple[int, int]:
+    # (register, rank): the first P bits of a 64-bit hash pick the register, the rank is the
+    # position of the first 1 in the rest (at most _RANK_BITS + 1 = 55, well inside a byte)
+    h = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+    rest = h & ((1 << _RANK_BITS) - 1)
+    return h >> _RANK_BITS, _RANK_BITS - rest.bit_length() + 1
+
+
+def sketch(values: Iterable[str]) -> int:
+    """The sketch of a set of values."""
+    registers = bytearray(M)
+    for value in values:
+        index, rank = _position(value)
+        if rank > registers[index]:
+            registers[index] = rank
+    return int.from_bytes(registers, "big")
+
+
+def merge(a: int, b: int) -> int:
+    """The sketch of the union of a's and b's values."""
+    # SWAR max of every byte at once: registers are < 0x80, so (a | 0x80) - b keeps a lane's
+    # top bit exactly where a >= b, and * 0xFF widens that bit into a byte mask
+    a_wins = (((a | _HIGH) - b) & _HIGH) >> 7
+    mask = a_wins * 0xFF
+    return (a & mask) | (b & ~mask)
+
+
+def estimate(s: int) -> int:
+    """How many distinct values went into s."""
+    registers = s.to_bytes(M, "big")
+    raw = _ALPHA * M * M / sum(map(_POWERS.__getitem__, registers))
+    zeros = registers.count(0)
+    if raw <= 2.5 * M and zeros:
+        return round(M * math.log(M / zeros))  # linear counting: far better for small sets
+    return round(raw)
+
+
+def dumps(s: int) -> bytes:
+    # Sketches of a few dozen values are mostly zero registers and compress to ~100 bytes
+    return zlib.compress(s.to_bytes(M, "big"))
+
+
+def loads(data: bytes) -> int:
+    return int.from_bytes(zlib.decompress(data), "big")
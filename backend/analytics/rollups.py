@@ -0,0 +1,263 @@
+# backend/analytics/rollups.py
+# Sales analytics from time-bucketed rollups of the transactions table.
+#
+# transaction_rollups (migration 10) holds, per hour and per day and per category: the number
+# of completed transactions, their GMV (sum of transactions.amount) and HyperLogLog sketches
+# of the buyers and sellers (analytics/hll.py). query() answers any date range from those
+# rows, so its cost depends on the number of buckets, not on how many sales are behind them.
+#
+# refresh() is incremental: it re-reads only the transactions created since the last
+# watermark (less ROLLUP_GRACE, for transactions that commit a little after they start),
+# recomputes the hours they fall in, then the days holding those hours from their hour rows.
+# RollupWorker runs it every ROLLUP_INTERVAL seconds; an advisory lock keeps instances from
+# refreshing at the same time. By hand:
+#
+#   python -m analytics.rollups                        # refresh from the watermark
+#   python -m analytics.rollups --since 2025-01-01     # recompute everything since a date
+#
+# Transactions inserted with an older created_at than the grace period (e.g. a backfill) need
+# --since; the watermark only moves forwards.
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Optional
+
+from sqlalchemy import select, delete, insert, func, text, Numeric
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from config import ROLLUP_INTERVAL, ROLLUP_GRACE, ROLLUP_MAX_BUCKETS
+from models import Product, Transaction, TransactionRollup, RollupWatermark, SessionLocal
+from analytics import hll
+import logging
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_LOCK_ID = 7339002  # next to MIGRATION_LOCK_ID in db/migrations.py
+WATERMARK = "transactions"
+BUCKETS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+ROLLUP_BATCH_SIZE = 5000  # transactions fetched per round trip while refreshing
+
+
+def floor(ts: datetime, bucket: str) -> datetime:
+    """The start of the bucket holding ts."""
+    ts = ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0) if bucket == "day" else ts
+
+
+def ceil(ts: datetime, bucket: str) -> datetime:
+    """The end of the bucket holding ts (ts itself if a bucket starts there)."""
+    start = floor(ts, bucket)
+    return start if start == ts else start + BUCKETS[bucket]
+
+
+class _Totals:
+    # One bucket's (or range's) figures while they are being added up
+    __slots__ = ("transactions", "gmv", "buyers", "sellers")
+
+    def __init__(self):
+        self.transactions, self.gmv, self.buyers, self.sellers = 0, Decimal(0), 0, 0
+
+    def add(self, transactions: int, gmv: Decimal, buyers: int, sellers: int):
+        self.transactions += transactions
+        self.gmv += gmv
+        # The first figures added need no merge
+        self.buyers = hll.merge(self.buyers, buyers) if self.buyers else buyers
+        self.sellers = hll.merge(self.sellers, sellers) if self.sellers else sellers
+
+    def add_totals(self, other: "_Totals"):
+        self.add(other.transactions, other.gmv, other.buyers, other.sellers)
+
+    def row(self, bucket: str, bucket_start: datetime, category: str) -> Dict:
+        return {"bucket": bucket, "bucket_start": bucket_start, "category": category,
+                "transactions": self.transactions, "gmv": self.gmv,
+                "buyers": hll.dumps(self.buyers), "sellers": hll.dumps(self.sellers)}
+
+    def as_dict(self) -> Dict:
+        return {"transactions": self.transactions, "gmv": float(self.gmv),
+                "buyers": hll.estimate(self.buyers), "sellers": hll.estimate(self.sellers)}
+
+
+def _write_day(db: Session, day: datetime, hours: Dict):
+    # hours: {(hour, category): (transactions, gmv, buyer ids, seller ids)} recomputed for this day
+    if hours:
+        db.execute(insert(TransactionRollup.__table__), [
+            {"bucket": "hour", "bucket_start": hour, "category": category, "transactions": count,
+             "gmv": gmv, "buyers": hll.dumps(hll.sketch(buyers)), "sellers": hll.dumps(hll.sketch(sellers))}
+            for (hour, category), (count, gmv, buyers, sellers) in hours.items()
+        ])
+    # The day from all of its hour rows: the ones just written and any earlier ones kept
+    rows = db.execute(
+        select(TransactionRollup.category, TransactionRollup.transactions, TransactionRollup.gmv,
+               TransactionRollup.buyers, TransactionRollup.sellers)
+        .where(TransactionRollup.bucket == "hour",
+               TransactionRollup.bucket_start >= day, TransactionRollup.bucket_start < day + BUCKETS["day"])
+    )
+    categories = {}
+    for category, count, gmv, buyers, sellers in rows:
+        categories.setdefault(category, _Totals()).add(count, gmv, hll.loads(buyers), hll.loads(sellers))
+    db.execute(delete(TransactionRollup).where(TransactionRollup.bucket == "day", TransactionRollup.bucket_start == day))
+    if categories:
+        db.execute(insert(TransactionRollup.__table__),
+                   [totals.row("day", day, category) for category, totals in categories.items()])
+
+
+def refresh(db: Session, since: Optional[datetime] = None) -> Optional[Dict]:
+    """Fold transactions created since the watermark (or since `since`) into the rollups.
+
+    Returns what was recomputed, or None if another process is refreshing right now.
+    """
+    if not db.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": ROLLUP_LOCK_ID}).scalar():
+        db.rollback()
+        return None
+    # created_at's clock; everything committed before this transaction started is read below
+    now = db.execute(text("SELECT LOCALTIMESTAMP")).scalar()
+    if since is None:
+        watermark = db.get(RollupWatermark, WATERMARK)
+        if watermark is not None:
+            since = watermark.watermark - timedelta(seconds=ROLLUP_GRACE)
+        else:
+            since = db.execute(select(func.min(Transaction.created_at))).scalar() or now
+    start = floor(since, "hour")
+
+    # Whole hours are recomputed, so their old rows go first (including hours now empty)
+    db.execute(delete(TransactionRollup).where(TransactionRollup.bucket == "hour", TransactionRollup.bucket_start >= start))
+    db.execute(delete(TransactionRollup).where(TransactionRollup.bucket == "day",
+                                               TransactionRollup.bucket_start >= floor(start, "day")))
+    rows = db.execute(
+        select(Transaction.created_at, Transaction.buyer_id, Transaction.seller_id,
+               func.coalesce(Transaction.amount, 0).cast(Numeric), func.coalesce(Product.category, ""))
+        .outerjoin(Product, Product.product_id == Transaction.product_id)
+        .where(Transaction.status == "completed", Transaction.created_at >= start)
+        .order_by(Transaction.created_at)  # ix_transactions_created_at; one day in memory at a time
+        .execution_options(stream_results=True, yield_per=ROLLUP_BATCH_SIZE)
+    )
+    report = {"since": start.isoformat(), "watermark": now.isoformat(), "transactions": 0, "days": 0}
+    day, hours = floor(start, "day"), {}
+    for created_at, buyer_id, seller_id, amount, category in rows:
+        if created_at >= day + BUCKETS["day"]:
+            _write_day(db, day, hours)
+            report["days"] += 1
+            day, hours = floor(created_at, "day"), {}
+        key = (floor(created_at, "hour"), category)
+        count, gmv, buyers, sellers = hours.get(key) or (0, Decimal(0), set(), set())
+        buyers.add(buyer_id)
+        sellers.add(seller_id)
+        hours[key] = (count + 1, gmv + amount, buyers, sellers)
+        report["transactions"] += 1
+    _write_day(db, day, hours)
+    report["days"] += 1
+
+    db.execute(
+        pg_insert(RollupWatermark)
+        .values(name=WATERMARK, watermark=now)
+        .on_conflict_do_update(index_elements=[RollupWatermark.name],
+                               set_={"watermark": now, "refreshed_at": func.now()})
+    )
+    db.commit()
+    logger.debug("Rolled up %d transactions since %s", report["transactions"], start)
+    return report
+
+
+def refresh_now(since: Optional[datetime] = None) -> Optional[Dict]:
+    """refresh() in a session of its own (for the worker and the threadpool)."""
+    db = SessionLocal()
+    try:
+        return refresh(db, since)
+    finally:
+        db.close()
+
+
+def query(db: Session, start: datetime, end: datetime, bucket: str = "day",
+          category: Optional[str] = None) -> Dict:
+    """Sales between start and end, widened to whole buckets: per bucket, per category and in total.
+
+    category=None is every category; '' is products without one. Raises ValueError for a
+    range of more than ROLLUP_MAX_BUCKETS buckets.
+    """
+    start, end = floor(start, bucket), ceil(end, bucket)
+    if end <= start:
+        raise ValueError("end must be after start")
+    if (end - start) / BUCKETS[bucket] > ROLLUP_MAX_BUCKETS:
+        raise ValueError(f"at most {ROLLUP_MAX_BUCKETS} {bucket} buckets per request")
+
+    statement = (
+        select(TransactionRollup.bucket_start, TransactionRollup.category, TransactionRollup.transactions,
+               TransactionRollup.gmv, TransactionRollup.buyers, TransactionRollup.sellers)
+        .where(TransactionRollup.bucket == bucket,
+               TransactionRollup.bucket_start >= start, TransactionRollup.bucket_start < end)
+        .order_by(TransactionRollup.bucket_start)
+    )
+    if category is not None:
+        statement = statement.where(TransactionRollup.category == category)
+    series, categories, total = {}, {}, _Totals()
+    for bucket_start, row_category, count, gmv, buyers, sellers in db.execute(statement):
+        buyers, sellers = hll.loads(buyers), hll.loads(sellers)
+        series.setdefault(bucket_start, _Totals()).add(count, gmv, buyers, sellers)
+        categories.setdefault(row_category, _Totals()).add(count, gmv, buyers, sellers)
+    for totals in series.values():
+        total.add_totals(totals)
+
+    watermark = db.get(RollupWatermark, WATERMARK)
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "bucket": bucket,
+        "category": category,
+        "totals": total.as_dict(),
+        "series": [{"bucket_start": bucket_start.isoformat(), **totals.as_dict()} for bucket_start, totals in series.items()],
+        "categories": sorted(
+            ({"category": row_category or None, **totals.as_dict()} for row_category, totals in categories.items()),
+            key=lambda row: -row["gmv"],
+        ),
+        # Transactions created after this aren't in the figures yet
+        "refreshed_through": watermark.watermark.isoformat() if watermark else None,
+    }
+
+
+class RollupWorker:
+    def __init__(self, interval: float = ROLLUP_INTERVAL):
+        self.interval = interval
+        self._task = None
+        self._stopping = False
+
+    def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="rollup-worker")
+
+    async def stop(self):
+        if self._task:
+            # The flag as well as cancel(), as in storage/deletions.py
+            self._stopping = True
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await run_in_threadpool(refresh_now)
+            except Exception as e:
+                logger.error("Transaction rollup refresh failed: %s", e, exc_info=True)
+            if self._stopping:
+                break
+            await asyncio.sleep(self.interval)
+
+
+rollup_worker = RollupWorker()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the transaction rollups")
+    parser.add_argument("--since", type=datetime.fromisoformat,
+                        help="recompute from this created_at instead of the watermark")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = refresh_now(args.since)
+    print(report if report else "Another process is refreshing the rollups; try again shortly.")
@@ -0,0 +1,125 @@
+# backend/auth/jwks.py
+# The Cognito user pool's signing keys (its JWKS), held in memory for auth/tokens.py.
+#
+# Keys are loaded at startup and refreshed every JWKS_REFRESH_INTERVAL seconds in the
+# background, so verifying a token never waits on Cognito. Key rotation: a token signed with
+# a kid we don't have triggers one refetch straight away (at most every
+# JWKS_MIN_REFRESH_INTERVAL, so a flood of forged kids can't hammer the endpoint), and keys
+# that leave the JWKS are dropped at the next refresh.
+#
+# cryptography is optional: without it no key can be loaded, and every token is rejected.
+import asyncio
+import base64
+import time
+from typing import Dict, Optional
+
+import requests
+from starlette.concurrency import run_in_threadpool
+
+from config import JWKS_URL, JWKS_REFRESH_INTERVAL, JWKS_MIN_REFRESH_INTERVAL, JWKS_TIMEOUT
+import logging
+
+try:
+    from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicNumbers
+except ImportError:
+    RSAPublicNumbers = None
+
+logger = logging.getLogger(__name__)
+
+
+def _b64_int(value: str) -> int:
+    return int.from_bytes(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)), "big")
+
+
+def load_keys(jwks: Dict) -> Dict:
+    """{kid: RSA public key} for the RS256 signing keys of a JWKS document."""
+    if RSAPublicNumbers is None:
+        logger.error("cryptography is not installed: bearer tokens can't be verified")
+        return {}
+    keys = {}
+    for jwk in jwks.get("keys", []):
+        if jwk.get("kty") != "RSA" or jwk.get("use", "sig") != "sig" or jwk.get("alg", "RS256") != "RS256":
+            continue
+        try:
+            keys[jwk["kid"]] = RSAPublicNumbers(_b64_int(jwk["e"]), _b64_int(jwk["n"])).public_key()
+        except (KeyError, ValueError) as e:
+            logger.warning("Skipping unusable JWK %s: %s", jwk.get("kid"), e)
+    return keys
+
+
+class JWKSCache:
+    def __init__(self, url: str = JWKS_URL, refresh_interval: float = JWKS_REFRESH_INTERVAL,
+                 min_refresh_interval: float = JWKS_MIN_REFRESH_INTERVAL, fetch=None):
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self._fetch = fetch  # injectable (bench, local keypairs); default: GET url
+        self.keys: Dict = {}
+        self._refetched_at = float("-inf")  # last refetch for an unknown kid
+        self._inflight = None
+        self._task = None
+        self._stopping = False
+
+    def fetch(self) -> Dict:
+        if self._fetch is not None:
+            return self._fetch()
+        response = requests.get(self.url, timeout=JWKS_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def refresh(self):
+        """Replace the keys with the current JWKS (blocking; keeps the old keys if it fails)."""
+        keys = load_keys(self.fetch())
+        added, removed = keys.keys() - self.keys.keys(), self.keys.keys() - keys.keys()
+        self.keys = keys
+        if added or removed:
+            logger.info("JWKS from %s: %d keys (added %s, removed %s)", self.url, len(keys), sorted(added), sorted(removed))
+
+    async def arefresh(self):
+        # One fetch at a time: concurrent requests with a new kid all wait for the same one
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(run_in_threadpool(self.refresh))
+            self._inflight.add_done_callback(lambda _: setattr(self, "_inflight", None))
+        try:
+            await asyncio.shield(self._inflight)
+        except Exception as e:
+            logger.warning("JWKS refresh from %s failed: %s", self.url, e)
+
+    async def get(self, kid: Optional[str]):
+        """The public key for kid, refetching the JWKS once if it's one we haven't seen."""
+        key = self.keys.get(kid)
+        if key is None and kid:
+            # Join a fetch already in flight, or start one if the last was long enough ago
+            if self._inflight is None:
+                if time.monotonic() - self._refetched_at < self.min_refresh_interval:
+                    return None
+                self._refetched_at = time.monotonic()
+            await self.arefresh()
+            key = self.keys.get(kid)
+        return key
+
+    def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="jwks-refresh")
+
+    async def stop(self):
+        if self._task:
+            # The flag as well as cancel(), as in storage/deletions.py
+            self._stopping = True
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while not self._stopping:
+            await self.arefresh()
+            if self._stopping:
+                break
+            # Retry a failed load sooner than the normal interval
+            await asyncio.sleep(self.refresh_interval if self.keys else self.min_refresh_interval)
+
+
+jwks = JWKSCache()
@@ -0,0 +1,79 @@
+# backend/auth/middleware.py
+# Who is calling: AuthMiddleware verifies the bearer token of each request, if it has one
+# (auth/tokens.py), and leaves the caller in request.state.identity for the handlers.
+#
+#   no Authorization: Bearer header -> identity None; handlers fall back to the ids in the
+#                                      form/query, unless AUTH_REQUIRED
+#   a token that doesn't verify     -> 401 before any handler runs
+#   a valid token                   -> its Identity; ids in the form/query must match it
+#
+# The /api/admin routes take require_admin: a valid token whose cognito:groups has ADMIN_GROUP.
+# Anyone can sign up to the pool, so a verified token alone isn't enough there.
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from config import AUTH_REQUIRED, ADMIN_GROUP
+from auth.tokens import Identity, InvalidToken, token_verifier
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AuthMiddleware:
+    def __init__(self, app, verifier=None):
+        self.app = app
+        self.verifier = verifier or token_verifier
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        identity = None
+        header = next((value for name, value in scope["headers"] if name == b"authorization"), None)
+        if header:
+            scheme, _, token = header.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token.strip():
+                try:
+                    identity = await self.verifier.verify(token.strip())
+                except InvalidToken as e:
+                    logger.debug("Rejected bearer token for %s %s: %s", scope["method"], scope["path"], e)
+                    response = JSONResponse({"detail": f"Invalid token: {e}"}, status_code=401,
+                                            headers={"WWW-Authenticate": 'Bearer error="invalid_token"'})
+                    await response(scope, receive, send)
+                    return
+        scope.setdefault("state", {})["identity"] = identity
+        await self.app(scope, receive, send)
+
+
+def get_identity(request: Request) -> Optional[Identity]:
+    """The verified caller, or None if the request carried no token."""
+    return getattr(request.state, "identity", None)
+
+
+def require_identity(identity: Optional[Identity] = Depends(get_identity)) -> Identity:
+    if identity is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return identity
+
+
+def require_admin(identity: Identity = Depends(require_identity)) -> Identity:
+    if ADMIN_GROUP not in identity.groups:
+        logger.warning("User %s (groups %s) denied admin access", identity.sub, identity.groups)
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return identity
+
+
+def caller_id(identity: Optional[Identity], claimed: Optional[str], field: str = "seller_id") -> str:
+    """The user a request acts for: the token's subject if there is a token, else the claimed id."""
+    if identity is not None:
+        if claimed and claimed != identity.sub:
+            raise HTTPException(status_code=403, detail=f"{field} does not match the signed-in user")
+        return identity.sub
+    if AUTH_REQUIRED:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    if not claimed:
+        raise HTTPException(status_code=400, detail=f"{field} is required")
+    return claimed
@@ -0,0 +1,142 @@
+# backend/auth/tokens.py
+# Cognito JWT verification, in-process: no call to Cognito per request.
+#
+# A token is checked against the cached JWKS (auth/jwks.py): RS256 signature, exp/nbf (with
+# JWT_LEEWAY seconds of clock skew), iss = the user pool, token_use id or access, and the app
+# client when COGNITO_APP_CLIENT_ID is set. Verified tokens are remembered in an LRU of
+# JWT_CACHE_SIZE entries until they expire, so a client sending the same token on every
+# request pays for the RSA check once. An entry is dropped early if its signing key leaves
+# the JWKS.
+import base64
+import binascii
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional
+
+from config import COGNITO_ISSUER, COGNITO_APP_CLIENT_ID, JWT_LEEWAY, JWT_CACHE_SIZE
+from auth.jwks import jwks as default_jwks
+from metrics import collector
+import logging
+
+try:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+except ImportError:
+    InvalidSignature = None
+
+logger = logging.getLogger(__name__)
+
+TOKEN_USES = ("id", "access")
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class Identity(NamedTuple):
+    sub: str  # the Cognito user id; what the app stores as seller_id / buyer_id
+    username: Optional[str]
+    groups: List[str]
+    claims: Dict
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _identity(claims: Dict) -> Identity:
+    # Id tokens name the user cognito:username, access tokens username
+    return Identity(
+        sub=claims["sub"],
+        username=claims.get("cognito:username") or claims.get("username"),
+        groups=list(claims.get("cognito:groups") or []),
+        claims=claims,
+    )
+
+
+class TokenVerifier:
+    def __init__(self, jwks=default_jwks, issuer: str = COGNITO_ISSUER, client_id: Optional[str] = COGNITO_APP_CLIENT_ID,
+                 leeway: int = JWT_LEEWAY, cache_size: int = JWT_CACHE_SIZE):
+        self.jwks = jwks
+        self.issuer = issuer
+        self.client_id = client_id
+        self.leeway = leeway
+        self.cache_size = cache_size
+        # token -> (identity, exp, kid). Only touched from the event loop, so no lock
+        self._verified = OrderedDict()
+        self.hits = self.misses = 0
+
+    def _check_claims(self, claims: Dict, now: float):
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)) or now > exp + self.leeway:
+            raise InvalidToken("token expired")
+        nbf = claims.get("nbf")
+        if isinstance(nbf, (int, float)) and now + self.leeway < nbf:
+            raise InvalidToken("token not yet valid")
+        if claims.get("iss") != self.issuer:
+            raise InvalidToken("wrong issuer")
+        token_use = claims.get("token_use")
+        if token_use not in TOKEN_USES:
+            raise InvalidToken("not an id or access token")
+        if self.client_id and claims.get("aud" if token_use == "id" else "client_id") != self.client_id:
+            raise InvalidToken("token is for another app client")
+        if not isinstance(claims.get("sub"), str) or not claims["sub"]:
+            raise InvalidToken("token has no subject")
+
+    async def verify(self, token: str) -> Identity:
+        """The caller a token identifies; raises InvalidToken saying why it can't be trusted."""
+        now = time.time()
+        cached = self._verified.get(token)
+        if cached is not None:
+            identity, exp, kid = cached
+            if now <= exp + self.leeway and kid in self.jwks.keys:
+                self._verified.move_to_end(token)
+                self.hits += 1
+                return identity
+            del self._verified[token]
+        self.misses += 1
+
+        try:
+            header_segment, claims_segment, signature_segment = token.split(".")
+            header = json.loads(_b64decode(header_segment))
+            claims = json.loads(_b64decode(claims_segment))
+            signature = _b64decode(signature_segment)
+        except (ValueError, binascii.Error):
+            raise InvalidToken("malformed token")
+        if not isinstance(header, dict) or not isinstance(claims, dict):
+            raise InvalidToken("malformed token")
+        # Only RS256: never "none" or an HMAC keyed with the public key
+        if header.get("alg") != "RS256":
+            raise InvalidToken("unsupported signing algorithm")
+        if InvalidSignature is None:
+            raise InvalidToken("token verification is unavailable")
+        kid = header.get("kid")
+        key = await self.jwks.get(kid)
+        if key is None:
+            raise InvalidToken("unknown signing key")
+        try:
+            key.verify(signature, f"{header_segment}.{claims_segment}".encode("ascii"), padding.PKCS1v15(), hashes.SHA256())
+        except (InvalidSignature, UnicodeEncodeError):
+            raise InvalidToken("bad signature")
+        self._check_claims(claims, now)
+
+        identity = _identity(claims)
+        self._verified[token] = (identity, claims["exp"], kid)
+        if len(self._verified) > self.cache_size:
+            self._verified.popitem(last=False)
+        return identity
+
+    def stats(self) -> Dict:
+        return {"entries": len(self._verified), "hits": self.hits, "misses": self.misses}
+
+
+token_verifier = TokenVerifier()
+
+
+@collector
+def _token_cache_metrics():
+    yield ("cache_lookups_total", "counter", "Cache lookups by cache and result.",
+           [({"cache": "tokens", "result": "hit"}, token_verifier.hits),
+            ({"cache": "tokens", "result": "miss"}, token_verifier.misses)])
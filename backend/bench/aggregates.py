@@ -0,0 +1,157 @@
+# backend/bench/aggregates.py
+# Seller and category figures from the trigger-maintained counters (GET /api/stats/...)
+# versus computing them when asked, and what maintaining them costs writers. Wipes
+# "Products" and transactions, so point DATABASE_URL at a throwaway database:
+#
+#   python -m bench.aggregates --products 200000 --sellers 2000 --sales 50000
+#
+# Reads: median latency of the stats endpoints against the same figures aggregated on the
+# fly (the *_expected views, filtered to one seller/category). Writes: a bulk import and a
+# run of single create-product requests with the stats triggers enabled and disabled.
+import argparse
+import asyncio
+import io
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("IMAGE_PIPELINE", "false")
+os.environ.setdefault("S3_DELETE_WORKER", "false")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")  # one client firing the whole load
+os.environ.setdefault("CONCURRENCY_LIMIT", "0")
+
+import httpx  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+import main  # noqa: E402
+from auth.middleware import require_identity  # noqa: E402
+from auth.tokens import Identity  # noqa: E402
+from bench.bulk_import import as_csv, make_rows  # noqa: E402
+from models import SessionLocal, engine  # noqa: E402
+from stats.aggregates import rebuild  # noqa: E402
+
+# Seller figures are for the seller or an admin; stand in for an admin's Cognito token
+main.app.dependency_overrides[require_identity] = lambda: Identity("bench-admin", "bench-admin", ["admin"], {})
+
+CATEGORIES = ["home", "office", "electronics", "sports", "fashion", "books", "music", "outdoor"]
+STATS_TRIGGERS = [f"products_stats_{op}" for op in ("insert", "update", "delete")]
+
+
+def seed(products, sellers, sales):
+    rng = random.Random(products)
+    buf = io.StringIO()
+    for i in range(1, products + 1):
+        status = "sold" if i <= sales else "unsold"
+        buf.write(f"item {i}\t{rng.choice(CATEGORIES)}\t{rng.randint(1, 1000)}.5\tseller{i % sellers}\t{status}\n")
+    buf.seek(0)
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute('TRUNCATE "Products" RESTART IDENTITY CASCADE')
+        cur.copy_expert('COPY "Products" (name, category, price, seller_id, status) FROM STDIN', buf)
+        # The first `sales` products sold once each, at their price
+        cur.execute(
+            "INSERT INTO transactions (buyer_id, seller_id, product_id, status, amount) "
+            "SELECT 'buyer' || (product_id % 97), seller_id, product_id, 'completed', price "
+            "FROM \"Products\" WHERE status = 'sold'"
+        )
+        conn.commit()
+        cur.execute('ANALYZE "Products"')
+        cur.execute("ANALYZE transactions")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def median_ms(fn, keys):
+    samples = []
+    for key in keys:
+        start = time.perf_counter()
+        fn(key)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def set_triggers(enabled):
+    with engine.begin() as conn:
+        for trigger in STATS_TRIGGERS:
+            conn.exec_driver_sql(f'ALTER TABLE "Products" {"ENABLE" if enabled else "DISABLE"} TRIGGER {trigger}')
+
+
+async def writes(rows, singles):
+    body = as_csv(make_rows(rows, 0))
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        response = await client.post("/api/products/import", data={"seller_id": "bench-import"}, files={"file": ("b.csv", body)})
+        assert response.status_code == 200 and response.json()["failed"] == 0, response.text
+        imported = time.perf_counter() - start
+        samples = []
+        for i in range(singles):
+            start = time.perf_counter()
+            response = await client.post("/api/products/create-product",
+                                         data={"name": f"single {i}", "price": 10, "seller_id": "bench-single", "category": "home"})
+            assert response.status_code == 200, response.text
+            samples.append((time.perf_counter() - start) * 1000)
+    return imported, statistics.median(samples)
+
+
+async def main_bench(products, sellers, sales, rounds, rows, singles):
+    async with main.app.router.lifespan_context(main.app):
+        seed(products, sellers, sales)
+        print(f"{products} products, {sellers} sellers, {sales} sales; median of {rounds} lookups")
+        sellers_sample = [f"seller{i * 7919 % sellers}" for i in range(rounds)]
+        categories_sample = [CATEGORIES[i % len(CATEGORIES)] for i in range(rounds)]
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for label, path, keys in (("seller", "/api/stats/sellers/", sellers_sample),
+                                      ("category", "/api/stats/categories/", categories_sample)):
+                samples = []
+                for key in keys:
+                    start = time.perf_counter()
+                    response = await client.get(path + key)
+                    assert response.status_code == 200
+                    samples.append((time.perf_counter() - start) * 1000)
+                print(f"  {label:8s} GET {path + '{key}':28s} {statistics.median(samples):8.2f}ms")
+
+        db = SessionLocal()
+        try:
+            for label, table, column, keys in (("seller", "seller_stats", "seller_id", sellers_sample),
+                                               ("category", "category_stats", "category", categories_sample)):
+                for source, how in ((table, "counter row"), (f"{table}_expected", "aggregated on request")):
+                    query = text(f"SELECT * FROM {source} WHERE {column} = :key")
+                    ms = median_ms(lambda key: db.execute(query, {"key": key}).all(), keys)
+                    print(f"  {label:8s} SQL, {how:24s}   {ms:8.2f}ms")
+            start = time.perf_counter()
+            report = rebuild(db, dry_run=True)
+            print(f"  full recount check: {time.perf_counter() - start:.2f}s, "
+                  f"{sum(len(rows) for rows in report.values())} counters differ")
+        finally:
+            db.close()
+
+        await writes(rows, singles)  # warm up
+        for enabled in (False, True):
+            set_triggers(enabled)
+            try:
+                imported, single = await writes(rows, singles)
+            finally:
+                set_triggers(True)
+            print(f"  stats triggers {'on ' if enabled else 'off'}: import {rows} rows {imported:6.2f}s, "
+                  f"create-product p50 {single:6.2f}ms")
+        with engine.begin() as conn:
+            conn.exec_driver_sql("SELECT recount_stats()")  # the triggers-off run left them behind
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=200_000)
+    parser.add_argument("--sellers", type=int, default=2_000)
+    parser.add_argument("--sales", type=int, default=50_000)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=10_000, help="rows in the bulk import")
+    parser.add_argument("--singles", type=int, default=200, help="create-product requests")
+    args = parser.parse_args()
+    asyncio.run(main_bench(args.products, args.sellers, args.sales, args.rounds, args.rows, args.singles))
@@ -0,0 +1,100 @@
+# backend/bench/async_db_load.py
+# Concurrent checkout/list/orders load against the app running in-process.
+# Needs a reachable PostgreSQL in DATABASE_URL (a local throwaway database is fine):
+#
+#   DATABASE_URL=postgresql://postgres@localhost/market python -m bench.async_db_load
+#
+# Stripe is replaced by a stub that sleeps STRIPE_LATENCY seconds so the run
+# measures our own handlers rather than the network.
+import os
+
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")  # one client firing the whole load
+os.environ.setdefault("CONCURRENCY_LIMIT", "0")
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+import stripe
+
+import main
+from db.migrations import migrate
+from models import Product, Transaction, SessionLocal, engine
+
+
+class _FakeStripeSession:
+    url = "https://checkout.stripe.test/session"
+
+
+def _install_stripe_stub(latency):
+    def create(**kwargs):
+        time.sleep(latency)
+        return _FakeStripeSession()
+    stripe.checkout.Session.create = create
+
+
+def seed(products, orders_per_buyer):
+    migrate(engine)
+    db = SessionLocal()
+    try:
+        if db.query(Product).count() >= products:
+            return
+        db.add_all([
+            Product(name=f"Item {i}", category=f"cat{i % 20}", price=10 + i % 90, seller_id=f"seller{i % 50}", status="unsold")
+            for i in range(products)
+        ])
+        db.flush()
+        ids = [p.product_id for p in db.query(Product.product_id).limit(orders_per_buyer)]
+        db.add_all([Transaction(buyer_id="bench-buyer", seller_id="seller0", product_id=pid, status="completed") for pid in ids])
+        db.commit()
+    finally:
+        db.close()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run(requests, concurrency):
+    transport = httpx.ASGITransport(app=main.app)
+    latencies = {"list": [], "checkout": [], "orders": []}
+    sem = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            kind = ("list", "checkout", "orders")[i % 3]
+            async with sem:
+                start = time.perf_counter()
+                if kind == "list":
+                    resp = await client.get("/api/products/")
+                elif kind == "checkout":
+                    resp = await client.post("/api/orders/create-checkout-session",
+                                             params={"buyer_id": "bench-buyer", "seller_id": "seller1", "product_id": 1 + i % 100})
+                else:
+                    resp = await client.get("/api/orders/", params={"buyer_id": "bench-buyer", "userRole": "buyer"})
+                latencies[kind].append((time.perf_counter() - start) * 1000)
+                resp.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    print(f"{requests} requests, concurrency {concurrency}: {requests / elapsed:.1f} req/s")
+    for kind, samples in latencies.items():
+        print(f"  {kind:9s} p50={statistics.median(samples):7.1f}ms p99={percentile(samples, 99):7.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--stripe-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    _install_stripe_stub(args.stripe_latency)
+    seed(args.products, orders_per_buyer=50)
+    asyncio.run(run(args.requests, args.concurrency))
@@ -0,0 +1,117 @@
+# backend/bench/bulk_import.py
+# Loading a seller's inventory: one POST /api/products/create-product per item versus one
+# POST /api/products/import of the whole file (CSV and NDJSON, at a few batch sizes), then
+# GET /api/products/export of it. Wipes "Products", so point DATABASE_URL at a throwaway database:
+#
+#   python -m bench.bulk_import --rows 10000 --images 2 --batch-sizes 100 1000 5000
+#
+# Requests go through the ASGI app in-process, so the numbers are server time, not network.
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("IMAGE_PIPELINE", "false")  # the image keys aren't real images
+os.environ.setdefault("S3_DELETE_WORKER", "false")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")  # one client firing the whole load
+os.environ.setdefault("CONCURRENCY_LIMIT", "0")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from models import engine  # noqa: E402
+from products import bulk  # noqa: E402
+
+SELLER = "bench-seller"
+
+
+def make_rows(count, images):
+    return [
+        {"name": f"item {i}", "category": f"cat{i % 8}", "price": i % 1000 + 0.5,
+         "image_keys": [f"products/{i}-{n}.jpg" for n in range(images)]}
+        for i in range(count)
+    ]
+
+
+def as_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, ["name", "category", "price", "image_keys"])
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({**row, "image_keys": bulk.KEY_SEPARATOR.join(row["image_keys"])})
+    return buffer.getvalue().encode()
+
+
+def as_ndjson(rows):
+    return "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+
+def truncate():
+    with engine.begin() as conn:
+        conn.exec_driver_sql('TRUNCATE "Products" RESTART IDENTITY CASCADE')
+
+
+async def per_item(client, rows, concurrency):
+    queue = iter(rows)
+
+    async def worker():
+        for row in queue:
+            data = {"name": row["name"], "category": row["category"], "price": row["price"],
+                    "seller_id": SELLER, "image_keys": row["image_keys"]}
+            response = await client.post("/api/products/create-product", data=data)
+            assert response.status_code == 200, response.text
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def import_file(client, body, filename):
+    response = await client.post("/api/products/import", data={"seller_id": SELLER}, files={"file": (filename, body)})
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["failed"] == 0, report
+
+
+async def main_bench(count, images, batch_sizes, concurrency):
+    rows = make_rows(count, images)
+    files = {"csv": as_csv(rows), "ndjson": as_ndjson(rows)}
+    print(f"{count} products x {images} images; CSV {len(files['csv']) / 1e6:.1f}MB, NDJSON {len(files['ndjson']) / 1e6:.1f}MB")
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def timed(label, coro):
+                truncate()
+                start = time.perf_counter()
+                await coro
+                elapsed = time.perf_counter() - start
+                print(f"  {label:40s} {elapsed:8.2f}s  {count / elapsed:9.0f} rows/s")
+
+            for batch_size in batch_sizes:
+                bulk.IMPORT_BATCH_SIZE = batch_size
+                for fmt, body in files.items():
+                    await timed(f"import {fmt}, batches of {batch_size}", import_file(client, body, f"bench.{fmt}"))
+            # Last: its 10k commits leave the server checkpointing for a while afterwards
+            await timed(f"create-product x {count}, {concurrency} at a time", per_item(client, rows, concurrency))
+
+            for fmt in files:
+                start = time.perf_counter()
+                response = await client.get("/api/products/export", params={"seller_id": SELLER, "format": fmt})
+                elapsed = time.perf_counter() - start
+                lines = response.text.count("\n") - (fmt == "csv")
+                assert lines == count, lines
+                print(f"  {'export ' + fmt:40s} {elapsed:8.2f}s  {count / elapsed:9.0f} rows/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--images", type=int, default=2, help="image keys per product")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--concurrency", type=int, default=8, help="create-product requests in flight")
+    args = parser.parse_args()
+    asyncio.run(main_bench(args.rows, args.images, args.batch_sizes, args.concurrency))
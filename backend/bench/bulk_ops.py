@@ -0,0 +1,73 @@
+# backend/bench/bulk_ops.py
+# Repricing and removing many listings: one PUT/DELETE /api/products/{id} per product versus
+# one POST /api/products/bulk-update / bulk-delete for all of them. Wipes "Products", so
+# point DATABASE_URL at a throwaway database:
+#
+#   python -m bench.bulk_ops --products 500 --rtt 0.02
+#
+# Each request pays a simulated client round trip (--rtt), since that is what a seller's
+# browser waits on for every per-product call.
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("IMAGE_PIPELINE", "false")
+os.environ.setdefault("S3_DELETE_WORKER", "false")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")  # one client firing the whole load
+os.environ.setdefault("CONCURRENCY_LIMIT", "0")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from bench.bulk_import import SELLER, as_csv, make_rows, truncate  # noqa: E402
+
+
+async def main_bench(count, rtt):
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def request(method, url, **kwargs):
+                await asyncio.sleep(rtt)  # the browser <-> API round trip
+                response = await client.request(method, url, **kwargs)
+                assert response.status_code == 200, response.text
+                return response.json()
+
+            async def seed():
+                truncate()
+                await request("POST", "/api/products/import", data={"seller_id": SELLER},
+                              files={"file": ("seed.csv", as_csv(make_rows(count, 1)))})
+                return list(range(1, count + 1))
+
+            reprice = json.dumps({"price": 9.99})
+            cases = [
+                ("reprice, PUT /{id} each", lambda ids: [
+                    request("PUT", f"/api/products/{i}", data={"seller_id": SELLER, "updates_json_string": reprice})
+                    for i in ids]),
+                ("reprice, 1 x bulk-update", lambda ids: [
+                    request("POST", "/api/products/bulk-update",
+                            data={"seller_id": SELLER, "product_ids": ids, "updates_json_string": reprice})]),
+                ("delete, DELETE /{id} each", lambda ids: [
+                    request("DELETE", f"/api/products/{i}", data={"seller_id": SELLER}) for i in ids]),
+                ("delete, 1 x bulk-delete", lambda ids: [
+                    request("POST", "/api/products/bulk-delete", data={"seller_id": SELLER, "product_ids": ids})]),
+            ]
+            print(f"{count} products, simulated round trip {rtt * 1000:.0f}ms")
+            for label, calls in cases:
+                pending = calls(await seed())
+                start = time.perf_counter()
+                for call in pending:  # one after another, like a script or a naive UI loop
+                    await call
+                elapsed = time.perf_counter() - start
+                print(f"  {label:28s} {len(pending):5d} requests  {elapsed:8.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--rtt", type=float, default=0.02, help="seconds per browser round trip")
+    args = parser.parse_args()
+    asyncio.run(main_bench(args.products, args.rtt))
@@ -0,0 +1,113 @@
+# backend/bench/finalize_race.py
+# Hammers POST /api/orders/finalize-order from many threads and checks the invariants:
+#   race:   N buyers finalize the same product with their own checkout sessions
+#           -> exactly one sale and one transaction per product
+#   replay: one buyer's OrderSuccess page retries the same session N times
+#           -> one transaction, every response carries the same transaction_id
+# Exits 1 if either is violated. Needs a throwaway database in DATABASE_URL:
+#
+#   DATABASE_URL=postgresql://postgres@localhost/market python -m bench.finalize_race --threads 32
+import os
+
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")  # one client firing the whole load
+os.environ.setdefault("CONCURRENCY_LIMIT", "0")
+
+import argparse
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+import main
+from db.migrations import migrate
+from models import Product, Transaction, SessionLocal, engine
+
+
+def seed(products):
+    migrate(engine)
+    db = SessionLocal()
+    try:
+        items = [Product(name=f"Race item {i}", category="race", price=10, seller_id="race-seller", status="unsold") for i in range(products)]
+        db.add_all(items)
+        db.commit()
+        return [p.product_id for p in items]
+    finally:
+        db.close()
+
+
+def transactions_per_product(product_ids):
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(Transaction.product_id, func.count())
+            .where(Transaction.product_id.in_(product_ids))
+            .group_by(Transaction.product_id)
+        ).all()
+        return dict(rows)
+    finally:
+        db.close()
+
+
+def finalize(client, product_id, buyer, session_id):
+    response = client.post("/api/orders/finalize-order", params={
+        "buyer_id": buyer, "seller_id": "race-seller", "product_id": product_id, "session_id": session_id,
+    })
+    body = response.json() if response.headers.get("content-type") == "application/json" else {}
+    return response.status_code, body.get("transaction_id")
+
+
+def run(client, pool, calls):
+    started = time.perf_counter()
+    results = list(pool.map(lambda args: finalize(client, *args), calls))
+    return results, time.perf_counter() - started
+
+
+def main_bench(products, threads):
+    failures = 0
+    with TestClient(main.app) as client, ThreadPoolExecutor(threads) as pool:
+        # Race: every thread is a different buyer going for the same product
+        race_ids = seed(products)
+        calls = [(pid, f"buyer{t}", f"cs_race_{pid}_{t}") for pid in race_ids for t in range(threads)]
+        results, elapsed = run(client, pool, calls)
+        statuses = Counter(status for status, _ in results)
+        counts = transactions_per_product(race_ids)
+        oversold = {pid: n for pid, n in counts.items() if n != 1}
+        unsold = [pid for pid in race_ids if pid not in counts]
+        print(f"race:   {len(calls)} finalizes on {products} products x {threads} buyers in {elapsed:.2f}s "
+              f"({len(calls) / elapsed:.0f} req/s), responses {dict(statuses)}")
+        if oversold or unsold:
+            failures += 1
+            print(f"FAIL    {len(oversold)} products sold more than once (e.g. {dict(list(oversold.items())[:3])}), {len(unsold)} not sold")
+        else:
+            print("ok      every product sold exactly once")
+
+        # Replay: the same checkout session retried concurrently
+        replay_ids = seed(products)
+        calls = [(pid, "replay-buyer", f"cs_replay_{pid}") for pid in replay_ids for _ in range(threads)]
+        results, elapsed = run(client, pool, calls)
+        statuses = Counter(status for status, _ in results)
+        counts = transactions_per_product(replay_ids)
+        ids_per_product = {}
+        for (pid, _, _), (_, transaction_id) in zip(calls, results):
+            ids_per_product.setdefault(pid, set()).add(transaction_id)
+        duplicated = {pid: n for pid, n in counts.items() if n != 1}
+        inconsistent = [pid for pid, ids in ids_per_product.items() if len(ids) != 1 or None in ids]
+        print(f"replay: {len(calls)} finalizes on {products} sessions x {threads} retries in {elapsed:.2f}s "
+              f"({len(calls) / elapsed:.0f} req/s), responses {dict(statuses)}")
+        if duplicated or inconsistent:
+            failures += 1
+            print(f"FAIL    {len(duplicated)} sessions with duplicate transactions, {len(inconsistent)} with differing/missing transaction ids")
+        else:
+            print("ok      one transaction per session, same transaction_id on every retry")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+    sys.exit(main_bench(args.products, args.threads))
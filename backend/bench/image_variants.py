@@ -0,0 +1,99 @@
+# backend/bench/image_variants.py
+# Throughput of the image variant renderer (images/render.py) on a corpus of photos:
+#
+#   python -m bench.image_variants --corpus ~/sample-photos     # your own JPEG/PNG files
+#   python -m bench.image_variants --generate 24                # synthetic 12MP camera-like JPEGs
+#
+# Reports images/s for a naive render (full decode, every size resized from the original)
+# and for render_variants on a process pool of 1..--workers processes, and what the listing
+# grid downloads per image before (the original) and after (the thumb variant).
+import argparse
+import multiprocessing
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image, ImageFilter, ImageOps
+
+from config import IMAGE_VARIANT_SIZES, IMAGE_FORMATS, IMAGE_QUALITY
+from images.render import _ENCODERS, available_formats, parse_sizes, render_variants
+
+
+def generate(count, size=(4032, 3024)):
+    """Noisy gradients saved as quality-92 JPEGs: about the size and entropy of a phone photo."""
+    corpus = []
+    for i in range(count):
+        noise = Image.effect_noise((size[0] // 4, size[1] // 4), 40 + i % 20).resize(size, Image.BILINEAR)
+        gradient = Image.linear_gradient("L").rotate(i * 37 % 360).resize(size)
+        image = Image.merge("RGB", (noise, gradient, ImageOps.invert(noise))).filter(ImageFilter.DETAIL)
+        buffer = BytesIO()
+        image.save(buffer, "JPEG", quality=92)
+        corpus.append(buffer.getvalue())
+    return corpus
+
+
+def load(directory):
+    return [p.read_bytes() for p in sorted(Path(directory).expanduser().iterdir())
+            if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp")]
+
+
+def naive_render(data, sizes, formats, quality):
+    # What a straightforward implementation does: decode everything, resize from the original each time
+    out = {}
+    with Image.open(BytesIO(data)) as original:
+        original = ImageOps.exif_transpose(original).convert("RGB")
+        for name, edge in sizes.items():
+            image = original.copy()
+            image.thumbnail((edge, edge), Image.LANCZOS, reducing_gap=None)
+            out[name] = {}
+            for fmt in formats:
+                plugin, options = _ENCODERS[fmt]
+                buffer = BytesIO()
+                image.save(buffer, plugin, quality=quality, **options)
+                out[name][fmt] = buffer.getvalue()
+    return out
+
+
+def run(fn, corpus, workers, sizes, formats, quality):
+    if workers == 0:  # in this process
+        started = time.perf_counter()
+        results = [fn(data, sizes, formats, quality) for data in corpus]
+        return results, time.perf_counter() - started
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        list(pool.map(fn, corpus[:workers], *[[x] * workers for x in (sizes, formats, quality)]))  # start the workers
+        started = time.perf_counter()
+        results = list(pool.map(fn, corpus, *[[x] * len(corpus) for x in (sizes, formats, quality)]))
+        return results, time.perf_counter() - started
+
+
+def main_bench(corpus, max_workers):
+    sizes = parse_sizes(IMAGE_VARIANT_SIZES)
+    formats = available_formats(IMAGE_FORMATS.split(","))
+    mb = sum(len(d) for d in corpus) / 1e6
+    print(f"{len(corpus)} images, {mb:.1f}MB, variants {sizes} x {formats}, quality {IMAGE_QUALITY}, "
+          f"{multiprocessing.cpu_count()} CPUs")
+
+    _, elapsed = run(naive_render, corpus, 0, sizes, formats, IMAGE_QUALITY)
+    print(f"  naive render, 1 process     {len(corpus) / elapsed:6.2f} images/s")
+    results = None
+    for workers in sorted({1, *range(2, max_workers + 1, 2), max_workers}):
+        results, elapsed = run(render_variants, corpus, workers, sizes, formats, IMAGE_QUALITY)
+        print(f"  render_variants, {workers:2d} workers {len(corpus) / elapsed:6.2f} images/s")
+
+    originals = statistics.mean(len(d) for d in corpus) / 1024
+    print(f"  grid download per image: original {originals:.0f}KB -> " + ", ".join(
+        f"thumb.{fmt} {statistics.mean(len(r['thumb'][fmt]) for r in results) / 1024:.1f}KB" for fmt in formats
+        if "thumb" in sizes))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--corpus", help="directory of sample images")
+    source.add_argument("--generate", type=int, default=24, help="number of synthetic photos")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+    corpus = load(args.corpus) if args.corpus else generate(args.generate)
+    main_bench(corpus, args.workers)
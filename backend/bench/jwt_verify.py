@@ -0,0 +1,167 @@
+# backend/bench/jwt_verify.py
+# Bearer token verification (auth/): verifications per second with and without the
+# verified-token LRU, and what AuthMiddleware adds to a request. Uses a locally generated
+# RSA keypair as a stand-in Cognito pool, so it needs no network and no user pool:
+#
+#   python -m bench.jwt_verify --tokens 2000 --seconds 3
+#
+# Before timing anything it checks the verifier against hand-made tokens: valid id/access
+# tokens, expired, not yet valid, wrong issuer/client, tampered, alg "none"/HS256, and key
+# rotation (a new kid is fetched on first sight, a removed key stops verifying).
+import argparse
+import asyncio
+import base64
+import json
+import os
+import statistics
+import time
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("IMAGE_PIPELINE", "false")
+os.environ.setdefault("S3_DELETE_WORKER", "false")
+os.environ.setdefault("ROLLUP_WORKER", "false")
+
+import httpx  # noqa: E402
+from cryptography.hazmat.primitives import hashes  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import padding, rsa  # noqa: E402
+
+import main  # noqa: E402
+from auth import tokens  # noqa: E402
+from auth.jwks import JWKSCache, jwks as app_jwks  # noqa: E402
+from auth.tokens import InvalidToken, TokenVerifier  # noqa: E402
+
+ISSUER = "https://cognito-idp.bench.amazonaws.com/bench_pool"
+CLIENT_ID = "bench-client"
+
+
+def b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+class Pool:
+    """A fake user pool: RSA keys by kid, and the JWKS document serving their public halves."""
+
+    def __init__(self):
+        self.keys = {}
+        self.fetches = 0
+
+    def add_key(self, kid):
+        self.keys[kid] = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def jwks(self):
+        self.fetches += 1
+        documents = []
+        for kid, key in self.keys.items():
+            numbers = key.public_key().public_numbers()
+            documents.append({"kid": kid, "kty": "RSA", "alg": "RS256", "use": "sig",
+                              "e": b64(numbers.e.to_bytes(3, "big")),
+                              "n": b64(numbers.n.to_bytes((numbers.n.bit_length() + 7) // 8, "big"))})
+        return {"keys": documents}
+
+    def token(self, kid, sub="user-1", token_use="id", alg="RS256", **overrides):
+        now = int(time.time())
+        claims = {"sub": sub, "iss": ISSUER, "token_use": token_use, "iat": now, "exp": now + 3600,
+                  "cognito:username": sub, ("aud" if token_use == "id" else "client_id"): CLIENT_ID}
+        claims.update(overrides)
+        signing_input = f"{b64(json.dumps({'alg': alg, 'kid': kid}).encode())}.{b64(json.dumps(claims).encode())}"
+        signer = self.keys.get(kid) or next(iter(self.keys.values()))  # an unknown kid still gets a signature
+        signature = signer.sign(signing_input.encode(), padding.PKCS1v15(), hashes.SHA256()) if alg == "RS256" else b""
+        return f"{signing_input}.{b64(signature)}"
+
+
+async def check(pool, jwks):
+    verifier = TokenVerifier(jwks=jwks, issuer=ISSUER, client_id=CLIENT_ID)
+
+    async def rejects(token, reason):
+        try:
+            await verifier.verify(token)
+        except InvalidToken as e:
+            assert reason in str(e), (reason, str(e))
+            return
+        raise AssertionError(f"accepted a token that should fail with {reason!r}")
+
+    assert (await verifier.verify(pool.token("k1"))).sub == "user-1"
+    assert (await verifier.verify(pool.token("k1", sub="user-2", token_use="access", username="user-2"))).username == "user-2"
+    await rejects(pool.token("k1", exp=int(time.time()) - 120), "expired")
+    await rejects(pool.token("k1", nbf=int(time.time()) + 120), "not yet valid")
+    await rejects(pool.token("k1", iss="https://evil.example"), "wrong issuer")
+    await rejects(pool.token("k1", aud="other-client"), "another app client")
+    await rejects(pool.token("k1", token_use="refresh"), "not an id or access")
+    header, claims, signature = pool.token("k1").split(".")
+    forged = b64(json.dumps({**json.loads(base64.urlsafe_b64decode(claims + "==")), "sub": "admin"}).encode())
+    await rejects(f"{header}.{forged}.{signature}", "bad signature")
+    await rejects(pool.token("k1", alg="none"), "unsupported signing algorithm")
+    await rejects(pool.token("k1", alg="HS256"), "unsupported signing algorithm")
+    await rejects("not-a-jwt", "malformed")
+
+    # Rotation: a token from a new key triggers one refetch; the retired key's tokens stop verifying
+    cached = pool.token("k1", sub="cached")
+    await verifier.verify(cached)
+    fetches = pool.fetches
+    pool.add_key("k2")
+    assert (await verifier.verify(pool.token("k2", sub="rotated"))).sub == "rotated"
+    assert pool.fetches == fetches + 1
+    await rejects(pool.token("k3-unknown"), "unknown signing key")  # within min_refresh_interval: no refetch
+    assert pool.fetches == fetches + 1
+    del pool.keys["k1"]
+    jwks.refresh()
+    await rejects(cached, "unknown signing key")
+    print("  verifier checks passed")
+
+
+async def throughput(verifier, token_list, seconds):
+    count, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for token in token_list:
+            await verifier.verify(token)
+        count += len(token_list)
+    return count / seconds
+
+
+async def request_ms(client, rounds, headers):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        response = await client.get("/api/db/pool", headers=headers)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.text
+    return statistics.median(samples)
+
+
+async def main_bench(token_count, seconds, rounds):
+    pool = Pool()
+    pool.add_key("k1")
+    jwks = JWKSCache(fetch=pool.jwks, min_refresh_interval=60)
+    jwks.refresh()
+    await check(pool, jwks)
+
+    token_list = [pool.token("k2", sub=f"user-{i}") for i in range(token_count)]
+    uncached = await throughput(TokenVerifier(jwks=jwks, issuer=ISSUER, client_id=CLIENT_ID, cache_size=0), token_list, seconds)
+    cached_verifier = TokenVerifier(jwks=jwks, issuer=ISSUER, client_id=CLIENT_ID)
+    cached = await throughput(cached_verifier, token_list, seconds)
+    print(f"  {token_count} distinct tokens, RSA-2048")
+    print(f"  verify, no LRU            {uncached:10.0f}/s  {1e6 / uncached:7.1f}us each")
+    print(f"  verify, LRU               {cached:10.0f}/s  {1e6 / cached:7.1f}us each  {cached_verifier.stats()}")
+
+    # The app's verifier against the same fake pool, through the whole middleware stack
+    tokens.token_verifier.jwks, tokens.token_verifier.issuer, tokens.token_verifier.client_id = jwks, ISSUER, CLIENT_ID
+    async with main.app.router.lifespan_context(main.app):
+        await app_jwks.stop()  # no background fetches of the real pool
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            token = pool.token("k2")
+            plain = await request_ms(client, rounds, {})
+            with_token = await request_ms(client, rounds, {"Authorization": f"Bearer {token}"})
+            response = await client.get("/api/db/pool", headers={"Authorization": "Bearer x.y.z"})
+            assert response.status_code == 401, response.status_code
+    print(f"  GET /api/db/pool p50: no token {plain:.3f}ms, cached token {with_token:.3f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=2000, help="distinct tokens cycled through")
+    parser.add_argument("--seconds", type=float, default=3.0, help="per throughput run")
+    parser.add_argument("--rounds", type=int, default=500, help="requests per latency sample")
+    args = parser.parse_args()
+    asyncio.run(main_bench(args.tokens, args.seconds, args.rounds))
@@ -0,0 +1,365 @@
+# backend/bench/loadtest.py
+# Reproducible load test of the API. Seeds a synthetic marketplace (products, sellers,
+# buyers, a history of sales), runs scripted user journeys against the app in-process, and
+# reports throughput and p50/p95/p99 per endpoint as JSON. Wipes "Products", transactions and
+# the rollups, so point DATABASE_URL at a throwaway database:
+#
+#   python -m bench.loadtest --out results.json
+#   python -m bench.loadtest --baseline bench/loadtest_baseline.json     # CI: exit 1 on regression
+#   python -m bench.loadtest --save-baseline bench/loadtest_baseline.json
+#
+# Scenarios (weights with --mix):
+#   browse          first page of the catalogue (sometimes one category), then the next page
+#   search          a name search from the seeded vocabulary
+#   product_detail  one product
+#   checkout        a Stripe checkout session for an unsold product (Stripe stubbed, see
+#                   async_db_load.py)
+#   finalize        buys the next product of a reserved unsold pool, then the buyer's orders
+#   admin_reports   transactions report, sales analytics, seller and category stats
+#
+# Journeys are drawn from a seeded random generator per virtual user, so two runs with the
+# same arguments send the same requests. Latencies are taken client-side around each request.
+# Baselines are machine-specific: save one on the machine (CI runner) that compares against it.
+import os
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("IMAGE_PIPELINE", "false")
+os.environ.setdefault("S3_DELETE_WORKER", "false")
+os.environ.setdefault("ROLLUP_WORKER", "false")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")  # one client firing the whole load
+os.environ.setdefault("CONCURRENCY_LIMIT", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import json  # noqa: E402
+import platform  # noqa: E402
+import random  # noqa: E402
+import statistics  # noqa: E402
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+from collections import defaultdict  # noqa: E402
+from datetime import datetime, timezone  # noqa: E402
+
+import httpx  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+import main  # noqa: E402
+from analytics.rollups import refresh_now  # noqa: E402
+from auth.middleware import require_identity  # noqa: E402
+from auth.tokens import Identity  # noqa: E402
+from bench.async_db_load import _install_stripe_stub, percentile  # noqa: E402
+from db.versions import bump_version  # noqa: E402
+from models import SessionLocal, engine  # noqa: E402
+
+# The admin and seller-stats endpoints want a signed-in admin; stand in for the Cognito token
+main.app.dependency_overrides[require_identity] = lambda: Identity("bench-admin", "bench-admin", ["admin"], {})
+
+CATEGORIES = ["home", "office", "electronics", "sports", "fashion", "books", "music", "outdoor"]
+ADJECTIVES = ["vintage", "modern", "compact", "wooden", "leather", "wireless", "classic", "handmade", "portable", "steel"]
+NOUNS = ["chair", "lamp", "desk", "camera", "jacket", "guitar", "tent", "novel", "speaker", "bicycle", "kettle", "watch"]
+SEARCH_TERMS = NOUNS + ADJECTIVES + ["vintage lamp", "wireless speaker", "leather jacket", "chiar", "lamps"]
+
+DEFAULT_MIX = "browse=30,search=20,product_detail=30,checkout=8,finalize=4,admin_reports=8"
+PERCENTILES = (50, 95, 99)
+
+
+class Marketplace:
+    """What was seeded: id ranges the journeys pick from."""
+
+    def __init__(self, products, sellers, buyers, sold, finalize_pool):
+        self.products = products
+        self.sellers = sellers
+        self.buyers = buyers
+        self.sold = sold  # products 1..sold carry the sales history
+        # The last finalize_pool products are kept for finalize, one buy each
+        self.pool_start = products - finalize_pool + 1
+        self._next_pool = self.pool_start
+
+    def unsold_product(self, rng):
+        return rng.randint(self.sold + 1, self.pool_start - 1)
+
+    def next_pool_product(self):
+        if self._next_pool > self.products:
+            return None
+        product_id, self._next_pool = self._next_pool, self._next_pool + 1
+        return product_id
+
+
+def seed(products, sellers, buyers, sales, days, sold_fraction, finalize_pool):
+    sold = int(products * sold_fraction)
+    if not 0 < sold < products - finalize_pool:
+        raise SystemExit("need some sold products and some unsold ones besides the finalize pool")
+    with engine.begin() as conn:
+        conn.exec_driver_sql('TRUNCATE "Products", transaction_rollups, rollup_watermarks RESTART IDENTITY CASCADE')
+        conn.execute(text(
+            "INSERT INTO \"Products\" (name, category, price, seller_id, status) "
+            "SELECT initcap((:adjectives)[1 + i % cardinality(:adjectives)]) || ' ' "
+            "|| (:nouns)[1 + (i / cardinality(:adjectives)) % cardinality(:nouns)] || ' ' || i, "
+            "(:categories)[1 + i % cardinality(:categories)], 5 + (i * 37) % 500, 'seller' || i % :sellers, "
+            "CASE WHEN i <= :sold THEN 'sold' ELSE 'unsold' END "
+            "FROM generate_series(1, :products) i"
+        ), {"adjectives": ADJECTIVES, "nouns": NOUNS, "categories": CATEGORIES, "sellers": sellers,
+            "sold": sold, "products": products})
+        # Spread evenly over the last `days` days, ending a little before now
+        conn.execute(text(
+            "INSERT INTO transactions (buyer_id, seller_id, product_id, status, amount, created_at) "
+            "SELECT 'buyer' || (i::bigint * 7919) % :buyers, 'seller' || (i % :sold + 1) % :sellers, i % :sold + 1, "
+            "'completed', 5 + ((i % :sold + 1) * 37) % 500, "
+            "LOCALTIMESTAMP - make_interval(secs => :span * (1 - i::float8 / :sales) + 600) "
+            "FROM generate_series(1, :sales) i"
+        ), {"buyers": buyers, "sold": sold, "sellers": sellers, "sales": sales, "span": days * 86400})
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE transactions")
+        conn.exec_driver_sql('ANALYZE "Products"')
+    # Raw SQL skips the ORM hook that bumps the catalogue version the caches are keyed on
+    db = SessionLocal()
+    try:
+        bump_version(db)
+        db.commit()
+    finally:
+        db.close()
+    refresh_now()
+    return Marketplace(products, sellers, buyers, sold, finalize_pool)
+
+
+def parse_mix(spec):
+    mix = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}; known: {', '.join(SCENARIOS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, client, endpoint, method, path, params=None, ok=(200,)):
+        start = time.perf_counter()
+        response = await client.request(method, path, params=params)
+        self.latencies[endpoint].append((time.perf_counter() - start) * 1000)
+        if response.status_code not in ok:
+            self.errors[endpoint] += 1
+        return response
+
+
+async def browse(client, rec, rng, market):
+    params = {"limit": 24}
+    if rng.random() < 0.3:
+        params["category"] = rng.choice(CATEGORIES)
+    response = await rec.call(client, "list_products", "GET", "/api/products/", params)
+    cursor = response.headers.get("x-next-cursor")
+    if cursor:
+        await rec.call(client, "list_products", "GET", "/api/products/", {**params, "after": cursor})
+
+
+async def search(client, rec, rng, market):
+    await rec.call(client, "search_products", "GET", "/api/search/", {"name": rng.choice(SEARCH_TERMS), "limit": 24})
+
+
+async def product_detail(client, rec, rng, market):
+    await rec.call(client, "get_product", "GET", f"/api/products/{rng.randint(1, market.pool_start - 1)}")
+
+
+async def checkout(client, rec, rng, market):
+    product_id = market.unsold_product(rng)
+    await rec.call(client, "create_checkout_session", "POST", "/api/orders/create-checkout-session", {
+        "buyer_id": f"buyer{rng.randrange(market.buyers)}", "seller_id": f"seller{product_id % market.sellers}",
+        "product_id": product_id,
+    })
+
+
+async def finalize(client, rec, rng, market):
+    product_id = market.next_pool_product()
+    if product_id is None:  # pool used up: replay an earlier sale, as a retried success page would
+        product_id = rng.randint(market.pool_start, market.products)
+    buyer = f"buyer{rng.randrange(market.buyers)}"
+    await rec.call(client, "finalize_order", "POST", "/api/orders/finalize-order", {
+        "buyer_id": buyer, "seller_id": f"seller{product_id % market.sellers}", "product_id": product_id,
+        "session_id": f"cs_load_{product_id}",
+    }, ok=(200, 409))
+    await rec.call(client, "get_user_orders", "GET", "/api/orders/", {"buyer_id": buyer, "userRole": "buyer"})
+
+
+async def admin_reports(client, rec, rng, market):
+    await rec.call(client, "get_transactions_last_week", "GET", "/api/admin/transactions", {"limit": 50})
+    await rec.call(client, "get_transaction_analytics", "GET", "/api/admin/analytics/transactions",
+                   {"bucket": rng.choice(("hour", "day"))})
+    await rec.call(client, "seller_stats", "GET", f"/api/stats/sellers/seller{rng.randrange(market.sellers)}")
+    await rec.call(client, "category_stats_list", "GET", "/api/stats/categories")
+
+
+SCENARIOS = {
+    "browse": browse,
+    "search": search,
+    "product_detail": product_detail,
+    "checkout": checkout,
+    "finalize": finalize,
+    "admin_reports": admin_reports,
+}
+
+
+async def run_load(market, mix, journeys, concurrency, seed_value):
+    """Run `journeys` scenarios over `concurrency` virtual users; (Recorder, seconds)."""
+    rec = Recorder()
+    names, weights = list(mix), list(mix.values())
+
+    async def user(n, client):
+        # A fixed share of the journeys each, so the requests don't depend on scheduling
+        rng = random.Random(seed_value * 1000 + n)
+        for _ in range(journeys // concurrency + (n < journeys % concurrency)):
+            scenario = rng.choices(names, weights)[0]
+            await SCENARIOS[scenario](client, rec, rng, market)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(user(n, client) for n in range(concurrency)))
+        return rec, time.perf_counter() - started
+
+
+def summarize(rec, elapsed):
+    endpoints = {}
+    for endpoint, samples in sorted(rec.latencies.items()):
+        endpoints[endpoint] = {
+            "requests": len(samples),
+            "errors": rec.errors[endpoint],
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "mean_ms": round(statistics.fmean(samples), 2),
+            **{f"p{pct}_ms": round(percentile(samples, pct), 2) for pct in PERCENTILES},
+            "max_ms": round(max(samples), 2),
+        }
+    total = sum(stats["requests"] for stats in endpoints.values())
+    return {
+        "total": {
+            "requests": total,
+            "errors": sum(stats["errors"] for stats in endpoints.values()),
+            "seconds": round(elapsed, 3),
+            "throughput_rps": round(total / elapsed, 2),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result, baseline, tolerance, slack_ms):
+    """Regressions of result against baseline, as readable lines (empty when none).
+
+    A p95 may grow by `tolerance` (a fraction) plus `slack_ms`, throughput may drop by
+    `tolerance`, and an endpoint may not start failing requests it didn't fail before.
+    """
+    problems = []
+    if baseline.get("config", {}).get("scenario") != result["config"]["scenario"]:
+        problems.append("baseline was recorded with different arguments; re-save it or pass the same ones")
+        return problems
+    floor_rps = baseline["total"]["throughput_rps"] * (1 - tolerance)
+    if result["total"]["throughput_rps"] < floor_rps:
+        problems.append(f"throughput {result['total']['throughput_rps']} req/s < {floor_rps:.2f} "
+                        f"(baseline {baseline['total']['throughput_rps']})")
+    for endpoint, before in baseline["endpoints"].items():
+        now = result["endpoints"].get(endpoint)
+        if now is None:
+            problems.append(f"{endpoint}: not called in this run")
+            continue
+        ceiling = before["p95_ms"] * (1 + tolerance) + slack_ms
+        if now["p95_ms"] > ceiling:
+            problems.append(f"{endpoint}: p95 {now['p95_ms']}ms > {ceiling:.2f}ms (baseline {before['p95_ms']}ms)")
+        if now["errors"] / now["requests"] > before["errors"] / before["requests"]:
+            problems.append(f"{endpoint}: {now['errors']}/{now['requests']} errors (baseline {before['errors']}/{before['requests']})")
+    return problems
+
+
+def print_table(result, file=sys.stderr):
+    print(f"  {'endpoint':28s} {'requests':>8s} {'errors':>6s} {'req/s':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s}", file=file)
+    for endpoint, stats in result["endpoints"].items():
+        print(f"  {endpoint:28s} {stats['requests']:8d} {stats['errors']:6d} {stats['throughput_rps']:8.1f} "
+              + " ".join(f"{stats[f'p{pct}_ms']:6.1f}ms" for pct in PERCENTILES), file=file)
+    total = result["total"]
+    print(f"  {total['requests']} requests, {total['errors']} errors in {total['seconds']:.1f}s: "
+          f"{total['throughput_rps']:.1f} req/s", file=file)
+
+
+async def main_bench(args):
+    async with main.app.router.lifespan_context(main.app):
+        _install_stripe_stub(args.stripe_latency)
+        started = time.perf_counter()
+        market = seed(args.products, args.sellers, args.buyers, args.sales, args.days, args.sold_fraction,
+                      args.finalize_pool)
+        print(f"seeded {args.products} products ({market.sold} sold), {args.sellers} sellers, {args.buyers} buyers, "
+              f"{args.sales} sales over {args.days} days in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        mix = parse_mix(args.mix)
+        # Warm-up: connection pools, caches, the search index; not counted
+        await run_load(market, mix, args.warmup, args.concurrency, args.seed + 1)
+        rec, elapsed = await run_load(market, mix, args.journeys, args.concurrency, args.seed)
+    return summarize(rec, elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--sellers", type=int, default=500)
+    parser.add_argument("--buyers", type=int, default=5000)
+    parser.add_argument("--sales", type=int, default=100000, help="transactions in the sales history")
+    parser.add_argument("--days", type=int, default=30, help="the sales history spans this many days")
+    parser.add_argument("--sold-fraction", type=float, default=0.5, help="share of products with sales")
+    parser.add_argument("--finalize-pool", type=int, default=1000, help="unsold products kept for the finalize scenario")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario=weight,...")
+    parser.add_argument("--journeys", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="virtual users, each running its journeys back to back")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stripe-latency", type=float, default=0.05)
+    parser.add_argument("--out", help="write the JSON results here (default: stdout)")
+    parser.add_argument("--baseline", help="compare against this results file; exit 1 on regression")
+    parser.add_argument("--save-baseline", help="write the results here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 growth / throughput drop, as a fraction")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="allowed p95 growth on top of --tolerance")
+    args = parser.parse_args()
+
+    scenario = {key: getattr(args, key) for key in (
+        "products", "sellers", "buyers", "sales", "days", "sold_fraction", "finalize_pool", "mix", "journeys",
+        "warmup", "concurrency", "seed", "stripe_latency")}
+    result = {
+        "config": {"scenario": scenario},
+        "environment": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        **asyncio.run(main_bench(args)),
+    }
+
+    # The table goes to stderr, so stdout stays the JSON when there's no --out
+    print_table(result)
+    output = json.dumps(result, indent=2) + "\n"
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(output)
+        print(f"  baseline saved to {args.save_baseline}", file=sys.stderr)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(result, json.load(f), args.tolerance, args.slack_ms)
+        for problem in problems:
+            print(f"  REGRESSION {problem}", file=sys.stderr)
+        print("  no regressions against the baseline" if not problems else f"  {len(problems)} regression(s)",
+              file=sys.stderr)
+        sys.exit(1 if problems else 0)
@@ -0,0 +1,101 @@
+# backend/bench/logging_overhead.py
+# Per-request cost of request-path logging on the hot read endpoints, measured in-process.
+# Needs a reachable PostgreSQL in DATABASE_URL (a local throwaway database is fine):
+#
+#   DATABASE_URL=postgresql://postgres@localhost/market python -m bench.logging_overhead
+#   LOG_SAMPLE_RATE=0.1 DATABASE_URL=... python -m bench.logging_overhead
+#
+# Each endpoint is timed twice: with logging as configured (stdout/stderr go to a scratch
+# file, like the stream the CloudWatch agent ships) and with logging and print() switched
+# off. The difference is the logging overhead; bytes written is the ingest volume.
+import os
+
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")  # one client firing the whole load
+os.environ.setdefault("CONCURRENCY_LIMIT", "0")
+
+import argparse
+import builtins
+import logging
+import statistics
+import sys
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from bench.async_db_load import seed
+
+ENDPOINTS = [
+    ("get_product", "/api/products/1", {}),
+    ("list_products", "/api/products/", {}),
+    ("search_products", "/api/search/", {"name": "item"}),
+    ("get_user_orders", "/api/orders/", {"buyer_id": "bench-buyer", "userRole": "buyer"}),
+]
+
+
+class _CapturedOutput:
+    """Point fds 1 and 2 at a scratch file and count what gets written there."""
+
+    def __enter__(self):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        self.file = tempfile.TemporaryFile()
+        self.saved = (os.dup(1), os.dup(2))
+        os.dup2(self.file.fileno(), 1)
+        os.dup2(self.file.fileno(), 2)
+        return self
+
+    def __exit__(self, *exc):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(self.saved[0], 1)
+        os.dup2(self.saved[1], 2)
+        self.bytes = os.fstat(self.file.fileno()).st_size
+        self.file.close()
+
+
+def time_endpoint(client, path, params, requests):
+    client.get(path, params=params)  # warm the product cache / search index
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get(path, params=params)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main_bench(requests, rounds):
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # the test client's own request log
+    results = {}
+    with TestClient(main.app) as client:
+        for label, path, params in ENDPOINTS:
+            # Alternate the two modes and keep the medians, so drift hits both equally
+            logged, silent, written = [], [], 0
+            for _ in range(rounds):
+                with _CapturedOutput() as out:
+                    logged.append(time_endpoint(client, path, params, requests))
+                written += out.bytes
+
+                real_print = builtins.print
+                builtins.print = lambda *args, **kwargs: None
+                logging.disable(logging.CRITICAL)
+                try:
+                    silent.append(time_endpoint(client, path, params, requests))
+                finally:
+                    logging.disable(logging.NOTSET)
+                    builtins.print = real_print
+            results[label] = (statistics.median(logged), statistics.median(silent), written / (rounds * (requests + 1)))
+
+    print(f"{'endpoint':16s} {'logged':>10s} {'silent':>10s} {'overhead':>10s} {'bytes/req':>10s}")
+    for label, (logged, silent, size) in results.items():
+        print(f"{label:16s} {logged:8.0f}us {silent:8.0f}us {logged - silent:8.0f}us {size:10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=50)
+    args = parser.parse_args()
+    seed(args.products, args.orders)
+    main_bench(args.requests, args.rounds)
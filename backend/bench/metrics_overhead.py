@@ -0,0 +1,140 @@
+# backend/bench/metrics_overhead.py
+# Per-request cost of metrics.py: the request middleware plus the SQL timing hooks, on the hot
+# read endpoints, and what a scrape of /metrics costs. Needs a reachable PostgreSQL in
+# DATABASE_URL (a local throwaway database is fine):
+#
+#   DATABASE_URL=postgresql://postgres@localhost/market python -m bench.metrics_overhead
+#
+# Metrics are wired up at import, so each mode runs in its own process (METRICS_ENABLED
+# true/false); the modes alternate and the medians are kept, so drift hits both equally.
+import os
+
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")  # one client firing the whole load
+os.environ.setdefault("CONCURRENCY_LIMIT", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import statistics  # noqa: E402
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+
+ENDPOINTS = [
+    ("get_product", "/api/products/1", {}),
+    ("list_products", "/api/products/", {}),
+    ("search_products", "/api/search/", {"name": "item"}),
+    ("get_user_orders", "/api/orders/", {"buyer_id": "bench-buyer", "userRole": "buyer"}),
+]
+
+
+def time_endpoint(client, path, params, requests):
+    client.get(path, params=params)  # warm the product cache / search index
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get(path, params=params)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def child(requests):
+    """One mode, in this process: print {endpoint: us per request} as JSON."""
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        print(json.dumps({label: time_endpoint(client, path, params, requests) for label, path, params in ENDPOINTS}))
+
+
+def run_mode(enabled, requests):
+    env = {**os.environ, "METRICS_ENABLED": "true" if enabled else "false"}
+    out = subprocess.run([sys.executable, "-m", "bench.metrics_overhead", "--child", "--requests", str(requests)],
+                         env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def recording_ns(rounds):
+    from metrics import Histogram
+
+    histogram = Histogram("bench_seconds", "bench", ("method", "route", "status"))
+    start = time.perf_counter()
+    for i in range(rounds):
+        histogram.labels("GET", "/api/products/{id}", 200).observe(i % 100 / 1000)
+    return (time.perf_counter() - start) / rounds * 1e9
+
+
+def middleware_us(rounds):
+    """MetricsMiddleware around an ASGI app that does nothing, with and without it."""
+    import asyncio
+
+    from metrics import MetricsMiddleware
+
+    class Route:
+        path = "/api/products/{id}"
+
+    async def app(scope, receive, send):
+        scope["route"] = Route
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    async def per_call(target):
+        scope = {"type": "http", "method": "GET", "path": "/api/products/1"}
+        start = time.perf_counter()
+        for _ in range(rounds):
+            await target(scope, None, send)
+        return (time.perf_counter() - start) / rounds * 1e6
+
+    bare = asyncio.run(per_call(app))
+    return asyncio.run(per_call(MetricsMiddleware(app))) - bare
+
+
+def scrape_ms(routes, statuses):
+    from metrics import render, request_db_queries, request_db_seconds, request_duration
+
+    # A busy process: every route seen with several statuses
+    for r in range(routes):
+        for status in statuses:
+            request_duration.labels("GET", f"/api/route{r}/{{id}}", status).observe(0.01)
+        request_db_seconds.labels("GET", f"/api/route{r}/{{id}}").observe(0.002)
+        request_db_queries.labels("GET", f"/api/route{r}/{{id}}").observe(2)
+    render()
+    start = time.perf_counter()
+    text = render()
+    return (time.perf_counter() - start) * 1000, len(text)
+
+
+def main_bench(requests, rounds):
+    results = {True: [], False: []}
+    for _ in range(rounds):
+        for enabled in (True, False):
+            results[enabled].append(run_mode(enabled, requests))
+
+    print(f"{'endpoint':16s} {'metrics':>10s} {'off':>10s} {'overhead':>10s}")
+    for label, _, _ in ENDPOINTS:
+        on = statistics.median(run[label] for run in results[True])
+        off = statistics.median(run[label] for run in results[False])
+        print(f"{label:16s} {on:8.0f}us {off:8.0f}us {on - off:8.0f}us")
+    print(f"histogram labels().observe(): {recording_ns(200_000):.0f}ns")
+    print(f"MetricsMiddleware alone: {middleware_us(100_000):.1f}us per request")
+    took, size = scrape_ms(routes=40, statuses=(200, 400, 404, 500))
+    print(f"scrape, 40 routes x 4 statuses: {took:.1f}ms, {size / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=50)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.requests)
+    else:
+        from bench.async_db_load import seed
+
+        seed(args.products, args.orders)
+        main_bench(args.requests, args.rounds)
@@ -0,0 +1,92 @@
+# backend/bench/product_images.py
+# Attaching images to a page of products: one product_images query per product (N+1)
+# versus one query for the page (images/gallery.load_images). Wipes and re-seeds "Products"
+# and product_images, so point DATABASE_URL at a throwaway database:
+#
+#   python -m bench.product_images --products 10000 --images 4 --limit 20 100 500
+#
+# Counts the statements each approach sends, and the time per page.
+import argparse
+import io
+import statistics
+import time
+
+from sqlalchemy import event
+
+from db.migrations import migrate
+from images.gallery import load_images
+from models import SessionLocal, engine
+from products.routes import _listing_query
+
+
+def seed(products, images):
+    buf, gallery = io.StringIO(), io.StringIO()
+    for i in range(1, products + 1):
+        buf.write(f"item {i}\tcat{i % 8}\t{i % 1000}\tseller{i % 500}\tproducts/{i}-0.jpg\tunsold\n")
+        for position in range(images):
+            gallery.write(f"{i}\t{position}\tproducts/{i}-{position}.jpg\n")
+    buf.seek(0)
+    gallery.seek(0)
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute('TRUNCATE "Products" RESTART IDENTITY CASCADE')
+        cur.copy_expert('COPY "Products" (name, category, price, seller_id, image_key, status) FROM STDIN', buf)
+        cur.copy_expert("COPY product_images (product_id, position, image_key) FROM STDIN", gallery)
+        conn.commit()
+        cur.execute('ANALYZE "Products"')
+        cur.execute("ANALYZE product_images")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def per_product(db, rows):
+    # The obvious loop: each product fetches its own images
+    return {row.product_id: load_images(db, [row.product_id])[row.product_id] for row in rows}
+
+
+def batched(db, rows):
+    return load_images(db, [row.product_id for row in rows])
+
+
+def measure(fn, pages, limit):
+    statements = []
+    listener = lambda *args: statements.append(1)  # noqa: E731
+    samples = []
+    db = SessionLocal()
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        for after in pages:
+            start = time.perf_counter()
+            rows = db.execute(_listing_query(None, after).limit(limit)).all()
+            images = fn(db, rows)
+            samples.append((time.perf_counter() - start) * 1000)
+            assert len(images) == len(rows)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+        db.close()
+    return len(statements) / len(pages), statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--images", type=int, default=4, help="images per product")
+    parser.add_argument("--limit", type=int, nargs="+", default=[20, 100, 500], help="page sizes")
+    parser.add_argument("--pages", type=int, default=20)
+    args = parser.parse_args()
+
+    migrate(engine)
+    seed(args.products, args.images)
+    print(f"{args.products} products x {args.images} images, median of {args.pages} pages")
+    for limit in args.limit:
+        step = max(1, (args.products - limit) // args.pages)
+        pages = [i * step for i in range(args.pages)]
+        for label, fn in (("per product", per_product), ("batched", batched)):
+            queries, ms = measure(fn, pages, limit)
+            print(f"  limit {limit:4d}  {label:12s} {queries:6.0f} queries/page  {ms:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# backend/bench/query_budget.py
+# Query budgets and N+1 check for the read endpoints (db/profiler.py), for CI. Each endpoint is
+# called at several data sizes (orders per buyer, page sizes) with the product cache off and
+# SQL_BUDGET_MODE=raise; it fails if an endpoint goes over its SQL_QUERY_BUDGETS entry or its
+# statement count changes with the size. Needs a throwaway database in DATABASE_URL:
+#
+#   DATABASE_URL=postgresql://postgres@localhost/market python -m bench.query_budget
+#
+# Exits 1 on any failure. As a check of the check, it also mounts a deliberately N+1 copy of
+# get_user_orders (one SELECT per order, held to the same budget by name), which must be caught.
+import os
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("IMAGE_PIPELINE", "false")
+os.environ.setdefault("S3_DELETE_WORKER", "false")
+os.environ.setdefault("ROLLUP_WORKER", "false")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")  # one client firing the whole load
+os.environ.setdefault("CONCURRENCY_LIMIT", "0")
+os.environ["SQL_PROFILE"] = "true"
+os.environ["SQL_BUDGET_MODE"] = "raise"
+os.environ["CACHE_BACKEND"] = "none"  # count the statements of a cold request
+
+import argparse  # noqa: E402
+import sys  # noqa: E402
+
+from fastapi import Depends  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import delete, select  # noqa: E402
+
+import main  # noqa: E402
+from auth.middleware import require_identity  # noqa: E402
+from auth.tokens import Identity  # noqa: E402
+from bench.async_db_load import seed  # noqa: E402
+from db.profiler import QueryBudgetExceeded  # noqa: E402
+from models import Product, Transaction, SessionLocal, get_db  # noqa: E402
+
+# The admin and seller-stats endpoints want a signed-in admin; stand in for the Cognito token
+main.app.dependency_overrides[require_identity] = lambda: Identity("bench-admin", "bench-admin", ["admin"], {})
+
+SIZES = (1, 10, 100)
+
+
+def seed_buyers(sizes):
+    """A buyer "budget-<n>" with n orders for each size."""
+    db = SessionLocal()
+    try:
+        db.execute(delete(Transaction).where(Transaction.buyer_id.like("budget-%")))
+        product_ids = db.scalars(select(Product.product_id).order_by(Product.product_id).limit(max(sizes))).all()
+        for size in sizes:
+            db.add_all([Transaction(buyer_id=f"budget-{size}", seller_id="seller0", product_id=product_id, status="completed")
+                        for product_id in product_ids[:size]])
+        db.commit()
+    finally:
+        db.close()
+
+
+@main.app.get("/bench/n-plus-one-orders")
+def get_user_orders(buyer_id: str, db=Depends(get_db)):
+    # The shape the budget exists to catch: one query for the orders, then one per order
+    orders = db.scalars(select(Transaction).where(Transaction.buyer_id == buyer_id)).all()
+    return [{"transaction_id": order.transaction_id, "name": db.get(Product, order.product_id).name} for order in orders]
+
+
+CHECKS = [
+    ("get_user_orders", "/api/orders/", lambda n: {"buyer_id": f"budget-{n}", "userRole": "buyer"}),
+    ("list_products", "/api/products/", lambda n: {"limit": n}),
+    ("search_products", "/api/search/", lambda n: {"name": "item", "limit": n}),
+    ("get_product", "/api/products/{n}", lambda n: {}),
+    ("get_transactions_last_week", "/api/admin/transactions", lambda n: {"limit": n}),
+    ("seller_stats", "/api/stats/sellers/seller{n}", lambda n: {}),
+    ("category_stats_list", "/api/stats/categories", lambda n: {}),
+    ("category_stats", "/api/stats/categories/cat{n}", lambda n: {}),
+    ("get_transaction_analytics", "/api/admin/analytics/transactions", lambda n: {"bucket": "day"}),
+]
+SELF_CHECK = ("get_user_orders, N+1 copy", "/bench/n-plus-one-orders", lambda n: {"buyer_id": f"budget-{n}"})
+
+
+def run_check(client, path, params, sizes):
+    """Statements per size, or the error that stopped it."""
+    # Warm up first: the first search of a process builds the in-process index
+    try:
+        client.get(path.format(n=sizes[0]), params=params(sizes[0]))
+    except QueryBudgetExceeded:
+        pass
+    counts = []
+    for n in sizes:
+        try:
+            response = client.get(path.format(n=n), params=params(n))
+        except QueryBudgetExceeded as e:
+            return counts, str(e).split(":")[0]
+        if response.status_code != 200:
+            return counts, f"HTTP {response.status_code}: {response.text[:200]}"
+        counts.append(int(response.headers["x-sql-queries"]))
+    if len(set(counts)) > 1:
+        return counts, "statement count grows with the data (N+1?)"
+    return counts, None
+
+
+def main_check(sizes):
+    failures = 0
+    with TestClient(main.app) as client:
+        print(f"  {'endpoint':28s} " + " ".join(f"{f'n={n}':>6s}" for n in sizes))
+        for name, path, params in CHECKS:
+            counts, error = run_check(client, path, params, sizes)
+            print(f"  {name:28s} " + " ".join(f"{count:6d}" for count in counts) + (f"  FAIL {error}" if error else ""))
+            failures += error is not None
+        name, path, params = SELF_CHECK
+        counts, error = run_check(client, path, params, sizes)
+        print(f"  {name:28s} " + " ".join(f"{count:6d}" for count in counts) + f"  (must fail: {error})")
+        if error is None:
+            print("  the deliberate N+1 endpoint was not caught")
+            failures += 1
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="orders per buyer / page sizes to compare")
+    args = parser.parse_args()
+    sizes = [int(n) for n in args.sizes.split(",")]
+    seed(2000, orders_per_buyer=50)
+    seed_buyers(sizes)
+    failures = main_check(sizes)
+    print("  query budgets OK" if not failures else f"  {failures} endpoint(s) over budget or N+1")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,187 @@
+# backend/bench/ratelimit.py
+# Edge protection (ratelimit.py): what a bucket check costs per request with each backend, a
+# greedy client against the per-caller limit, and a request flood with and without load
+# shedding. Needs the database of async_db_load; the redis backend runs against
+# RATE_LIMIT_URL when a server answers there (any Redis-protocol server; without Lua the
+# buckets fall back to WATCH/MULTI):
+#
+#   RATE_LIMIT_URL=redis://localhost:6379/0 python -m bench.ratelimit --flood 400
+#
+# The app's own limiters are switched off; the bench wraps main.app in its own, one
+# configuration per run.
+import os
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("IMAGE_PIPELINE", "false")
+os.environ.setdefault("S3_DELETE_WORKER", "false")
+os.environ.setdefault("ROLLUP_WORKER", "false")
+os.environ["RATE_LIMIT_BACKEND"] = "none"
+os.environ["CONCURRENCY_LIMIT"] = "0"
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import statistics  # noqa: E402
+import time  # noqa: E402
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from bench.async_db_load import percentile, seed  # noqa: E402
+from config import RATE_LIMIT_URL  # noqa: E402
+from ratelimit import (  # noqa: E402
+    ConcurrencyLimitMiddleware, MemoryBuckets, MemorySlots, RateLimitMiddleware, RedisBuckets, RedisSlots,
+    Rules, _redis_client,
+)
+
+ORDERS = ("/api/orders/", {"buyer_id": "bench-buyer", "userRole": "buyer"})
+
+
+async def redis_backends():
+    client = _redis_client(RATE_LIMIT_URL)
+    try:
+        await client.ping()
+    except Exception as e:
+        print(f"  no server at {RATE_LIMIT_URL} ({e}); redis backend skipped")
+        return None
+    buckets = RedisBuckets(client)
+    # The first take finds out whether the server runs Lua. Some stand-ins drop the
+    # connection after the error that says it doesn't, so settle that before timing
+    try:
+        await buckets.take("bench:probe", 1000, 1000)
+    except Exception:
+        pass
+    await buckets.take("bench:probe", 1000, 1000)
+    return buckets, RedisSlots(client)
+
+
+async def check_buckets(buckets):
+    # A burst of 5 at 10/s: 5 straight away, then one per 100ms
+    waits = [await buckets.take("check", 10, 5) for _ in range(6)]
+    assert waits[:5] == [0.0] * 5 and 0 < waits[5] <= 0.1, waits
+    await asyncio.sleep(0.11)
+    assert await buckets.take("check", 10, 5) == 0.0
+    assert await buckets.take("check", 10, 5) > 0
+    assert await buckets.take("other", 10, 5) == 0.0  # keys don't share a bucket
+
+
+async def take_us(buckets, rounds):
+    start = time.perf_counter()
+    for i in range(rounds):
+        await buckets.take(f"cost:{i % 1000}", 1e6, 1000)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+async def slot_us(slots, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await slots.release(await slots.acquire(1000))
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def client_for(app, ip):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=(ip, 4000)), base_url="http://bench")
+
+
+async def request_ms(client, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        response = await client.get(ORDERS[0], params=ORDERS[1])
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.text
+    return statistics.median(samples)
+
+
+async def greedy(app, requests, seconds):
+    """One client sending `requests` at once every 100ms, another sending 5 requests a second."""
+    async with client_for(app, "10.0.0.1") as hog, client_for(app, "10.0.0.2") as polite:
+        statuses, latencies, deadline = [], [], time.perf_counter() + seconds
+
+        async def hammer():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                responses = await asyncio.gather(*(hog.get(ORDERS[0], params=ORDERS[1]) for _ in range(requests)))
+                statuses.extend(r.status_code for r in responses)
+                await asyncio.sleep(max(0.0, 0.1 - (time.perf_counter() - started)))
+
+        async def behave():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await polite.get(ORDERS[0], params=ORDERS[1])
+                latencies.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200, response.status_code
+                await asyncio.sleep(0.2)
+
+        await asyncio.gather(hammer(), behave())
+    return statuses.count(200), statuses.count(429), latencies
+
+
+async def flood(app, requests):
+    async with client_for(app, "10.0.0.3") as client:
+        async def one():
+            start = time.perf_counter()
+            response = await client.get(ORDERS[0], params=ORDERS[1])
+            return response.status_code, (time.perf_counter() - start) * 1000
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+    served = [ms for status, ms in results if status == 200]
+    shed = [ms for status, ms in results if status == 503]
+    return served, shed, elapsed
+
+
+def line(label, served, shed=(), elapsed=None):
+    text = f"  {label:28s} served {len(served):4d} p50 {statistics.median(served):7.1f}ms p99 {percentile(served, 99):7.1f}ms"
+    if shed:
+        text += f" | 503 {len(shed):4d} p50 {statistics.median(shed):6.1f}ms"
+    if elapsed is not None:
+        text += f" | {elapsed:.2f}s"
+    print(text)
+
+
+async def main_bench(args):
+    backends = {"memory": (MemoryBuckets(), MemorySlots())}
+    redis = await redis_backends()
+    if redis:
+        backends["redis"] = redis
+    for name, (buckets, slots) in backends.items():
+        await check_buckets(buckets)
+        print(f"  {name:6s} bucket take {await take_us(buckets, args.rounds):7.1f}us"
+              f"  slot acquire+release {await slot_us(slots, args.rounds):7.1f}us  ({buckets.name})")
+
+    rules = Rules(f"GET {ORDERS[0]}=5:20")
+    async with main.app.router.lifespan_context(main.app):
+        async with client_for(main.app, "10.0.0.9") as client:
+            plain = await request_ms(client, args.rounds // 10)
+        for name, (buckets, slots) in backends.items():
+            app = ConcurrencyLimitMiddleware(RateLimitMiddleware(main.app, backend=buckets, rules=Rules("")),
+                                             backend=slots, limit=10_000)
+            async with client_for(app, "10.0.0.9") as client:
+                print(f"  GET {ORDERS[0]} p50: bare {plain:.3f}ms, both middlewares ({name}) {await request_ms(client, args.rounds // 10):.3f}ms")
+
+        print(f"  greedy client, {args.burst} every 100ms for {args.seconds:.0f}s, next to one sending 5/s:")
+        ok, _, latencies = await greedy(main.app, args.burst, args.seconds)
+        line(f"no limit (greedy {ok} ok)", latencies)
+        for name, (buckets, _) in backends.items():
+            ok, limited, latencies = await greedy(RateLimitMiddleware(main.app, backend=buckets, rules=rules), args.burst, args.seconds)
+            line(f"5/s burst 20, {name} ({ok} ok, {limited} 429)", latencies)
+
+        print(f"  {args.flood} concurrent requests:")
+        line("no shedding", *(await flood(main.app, args.flood)))
+        for name, (_, slots) in backends.items():
+            app = ConcurrencyLimitMiddleware(main.app, backend=slots, limit=args.limit)
+            line(f"shed past {args.limit}, {name}", *(await flood(app, args.flood)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5000, help="bucket checks timed per backend")
+    parser.add_argument("--burst", type=int, default=50, help="greedy client's requests per 100ms")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--flood", type=int, default=400)
+    parser.add_argument("--limit", type=int, default=30, help="in-flight requests before shedding")
+    args = parser.parse_args()
+    seed(2000, orders_per_buyer=50)
+    asyncio.run(main_bench(args))
@@ -0,0 +1,138 @@
+# backend/bench/rollups.py
+# Admin sales analytics from the hourly/daily rollups (GET /api/admin/analytics/transactions)
+# versus aggregating transactions on request, and what refreshing the rollups costs. Wipes
+# "Products", transactions and the rollups, so point DATABASE_URL at a throwaway database:
+#
+#   python -m bench.rollups --sales 1000000 --days 90
+#
+# Reads: median latency of the endpoint for a few ranges against one GROUPING SETS query
+# computing the same series, per-category and total figures (exact distinct counts) from the
+# raw rows. Refresh: the first full build, then an incremental refresh after new sales.
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from datetime import timedelta
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("IMAGE_PIPELINE", "false")
+os.environ.setdefault("S3_DELETE_WORKER", "false")
+os.environ.setdefault("ROLLUP_WORKER", "false")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")  # one client firing the whole load
+os.environ.setdefault("CONCURRENCY_LIMIT", "0")
+
+import httpx  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+import main  # noqa: E402
+from analytics.rollups import refresh_now, floor, ceil  # noqa: E402
+from auth.middleware import require_identity  # noqa: E402
+from auth.tokens import Identity  # noqa: E402
+from models import engine  # noqa: E402
+
+# The admin endpoints want a signed-in caller; stand in for the Cognito token
+main.app.dependency_overrides[require_identity] = lambda: Identity("bench-admin", "bench-admin", ["admin"], {})
+
+CATEGORIES = ["home", "office", "electronics", "sports", "fashion", "books", "music", "outdoor"]
+
+RAW = text(
+    "SELECT date_trunc(:bucket, t.created_at) AS bucket_start, coalesce(p.category, '') AS category, "
+    "count(*), sum(t.amount), count(DISTINCT t.buyer_id), count(DISTINCT t.seller_id) "
+    "FROM transactions t LEFT JOIN \"Products\" p ON p.product_id = t.product_id "
+    "WHERE t.status = 'completed' AND t.created_at >= :start AND t.created_at < :end "
+    "GROUP BY GROUPING SETS ((1), (2), ())"
+)
+
+
+def seed(products, sales, days, buyers, sellers):
+    with engine.begin() as conn:
+        conn.exec_driver_sql('TRUNCATE "Products", transaction_rollups, rollup_watermarks RESTART IDENTITY CASCADE')
+        conn.execute(text(
+            "INSERT INTO \"Products\" (name, category, price, seller_id, status) "
+            "SELECT 'item ' || i, (:categories)[1 + i % 8], 1 + i % 1000, 'seller' || i % :sellers, 'sold' "
+            "FROM generate_series(1, :products) i"
+        ), {"categories": CATEGORIES, "sellers": sellers, "products": products})
+        # Spread evenly over the last `days` days, ending a little before now
+        conn.execute(text(
+            "INSERT INTO transactions (buyer_id, seller_id, product_id, status, amount, created_at) "
+            "SELECT 'buyer' || (i::bigint * 7919) % :buyers, 'seller' || (i % :products + 1) % :sellers, i % :products + 1, "
+            "'completed', 1 + i % 1000, LOCALTIMESTAMP - make_interval(secs => :span * (1 - i::float8 / :sales) + 600) "
+            "FROM generate_series(1, :sales) i"
+        ), {"buyers": buyers, "products": products, "sellers": sellers, "sales": sales, "span": days * 86400})
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE transactions")
+        conn.exec_driver_sql('ANALYZE "Products"')
+        return conn.execute(text("SELECT LOCALTIMESTAMP")).scalar()
+
+
+def add_sales(count, products, buyers, sellers):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO transactions (buyer_id, seller_id, product_id, status, amount) "
+            "SELECT 'buyer' || i % :buyers, 'seller' || i % :sellers, i % :products + 1, 'completed', 10 "
+            "FROM generate_series(1, :count) i"
+        ), {"buyers": buyers, "sellers": sellers, "products": products, "count": count})
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+async def main_bench(products, sales, days, buyers, sellers, rounds, new_sales):
+    async with main.app.router.lifespan_context(main.app):
+        now = seed(products, sales, days, buyers, sellers)
+        print(f"{sales} sales over {days} days, {buyers} buyers, {sellers} sellers, {len(CATEGORIES)} categories")
+
+        report, elapsed = timed(lambda: refresh_now())
+        print(f"  first refresh (full build)        {elapsed:8.2f}s  {report['transactions']} transactions, {report['days']} days")
+        add_sales(new_sales, products, buyers, sellers)
+        report, elapsed = timed(lambda: refresh_now())
+        print(f"  incremental refresh, {new_sales} new     {elapsed * 1000:8.1f}ms  {report['transactions']} transactions re-read")
+        _, elapsed = timed(lambda: refresh_now())
+        print(f"  incremental refresh, nothing new  {elapsed * 1000:8.1f}ms")
+
+        ranges = [("hour", timedelta(days=2)), ("day", timedelta(days=7)), ("day", timedelta(days=30)),
+                  ("day", timedelta(days=days))]
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for bucket, span in ranges:
+                params = {"start": (now - span).isoformat(), "end": now.isoformat(), "bucket": bucket}
+                samples = []
+                for _ in range(rounds):
+                    start = time.perf_counter()
+                    response = await client.get("/api/admin/analytics/transactions", params=params)
+                    samples.append((time.perf_counter() - start) * 1000)
+                    assert response.status_code == 200, response.text
+                totals = response.json()["totals"]
+
+                # The same figures from the raw rows, over the same whole buckets
+                args = {"bucket": bucket, "start": floor(now - span, bucket), "end": ceil(now, bucket)}
+                raw_samples = []
+                with engine.connect() as conn:
+                    for _ in range(max(1, rounds // 10)):
+                        start = time.perf_counter()
+                        rows = conn.execute(RAW, args).all()
+                        raw_samples.append((time.perf_counter() - start) * 1000)
+                exact = next(row for row in rows if row.bucket_start is None and row.category is None)
+                print(f"  {bucket:4s} x {span.days:3d} days: rollups {statistics.median(samples):8.2f}ms, "
+                      f"raw SQL {statistics.median(raw_samples):9.2f}ms  "
+                      f"({totals['transactions']} sales; buyers {totals['buyers']} vs exact {exact[4]}, "
+                      f"sellers {totals['sellers']} vs {exact[5]})")
+                assert totals["transactions"] == exact[2]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--sales", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--buyers", type=int, default=50_000)
+    parser.add_argument("--sellers", type=int, default=2_000)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--new-sales", type=int, default=1_000, help="sales added before the incremental refresh")
+    args = parser.parse_args()
+    asyncio.run(main_bench(args.products, args.sales, args.days, args.buyers, args.sellers, args.rounds, args.new_sales))
@@ -0,0 +1,141 @@
+# backend/bench/s3_deletions.py
+# The deferred S3 deletion queue end to end, against moto's in-process S3 (needs
+# `pip install moto`) and a throwaway database in DATABASE_URL:
+#
+#   DATABASE_URL=postgresql://postgres@localhost/market python -m bench.s3_deletions --products 2500
+#
+#   deletes: DELETE /api/products/{id} for products whose images exist in the bucket, with
+#            S3 slowed down; reports request latency, DeleteObjects calls and the time until
+#            the queue is empty and the bucket holds none of the images
+#   retry:   the next DeleteObjects call fails; the keys stay queued and go on the retry
+#   orphans: unreferenced uploads are found by sweep_orphans() and deleted
+# Exits 1 if any image is left behind.
+import os
+
+os.environ.setdefault("S3_DELETE_RETRY_BASE", "1")  # retry within the bench, not in 30s
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")  # one client firing the whole load
+os.environ.setdefault("CONCURRENCY_LIMIT", "0")
+
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+
+from bench.s3_latency import _mock, seed, summary
+import main
+from config import AWS_S3_BUCKET
+from products import routes as product_routes
+from storage.deletions import pending_stats, sweep_orphans
+
+
+class S3Calls:
+    """Counts DeleteObjects calls, adds latency to every S3 call and can fail the next delete."""
+
+    def __init__(self, client, delay):
+        self.delay = delay
+        self.delete_calls = 0
+        self.fail_next_delete = False
+        client.meta.events.register_first("before-send.s3", self._before_send)
+        client.meta.events.register("before-call.s3.DeleteObjects", self._before_delete)
+
+    def _before_send(self, **kwargs):
+        time.sleep(self.delay)
+
+    def _before_delete(self, **kwargs):
+        self.delete_calls += 1
+        if self.fail_next_delete:
+            self.fail_next_delete = False
+            raise ConnectionError("injected S3 outage")
+
+
+def upload(client, keys):
+    for key in keys:
+        client.put_object(Bucket=AWS_S3_BUCKET, Key=key, Body=b"jpeg")
+
+
+def remaining(client, keys):
+    wanted, left = set(keys), 0
+    for page in client.get_paginator("list_objects_v2").paginate(Bucket=AWS_S3_BUCKET, Prefix="products/"):
+        left += sum(1 for obj in page.get("Contents", []) if obj["Key"] in wanted)
+    return left
+
+
+async def wait_until_drained(timeout=60):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if (await pending_stats())["pending"] == 0:
+            return time.perf_counter() - started
+        await asyncio.sleep(0.05)
+    raise TimeoutError("deletion queue did not drain")
+
+
+async def run(client, calls, product_ids, keys, orphan_keys, concurrency):
+    failures = 0
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        limit = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def delete(pid):
+            async with limit:
+                start = time.perf_counter()
+                response = await http.request("DELETE", f"/api/products/{pid}", data={"seller_id": "s3-seller"})
+                latencies.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200, response.text
+
+        retry_ids, delete_ids = product_ids[:50], product_ids[50:]
+        started = time.perf_counter()
+        await asyncio.gather(*(delete(pid) for pid in delete_ids))
+        requests_done = time.perf_counter() - started
+        drained = await wait_until_drained()
+        left = remaining(client, keys[50:])
+        print(f"deletes: {len(delete_ids)} requests in {requests_done:.2f}s, latency {summary(latencies)}")
+        print(f"         queue empty {drained:.2f}s later after {calls.delete_calls} DeleteObjects calls, "
+              f"{left} of {len(delete_ids)} images left in the bucket")
+        failures += bool(left)
+
+        calls.delete_calls, calls.fail_next_delete = 0, True
+        await asyncio.gather(*(delete(pid) for pid in retry_ids))
+        drained = await wait_until_drained()
+        left = remaining(client, keys[:50])
+        print(f"retry:   first DeleteObjects failed; queue empty after {drained:.2f}s and "
+              f"{calls.delete_calls} calls, {left} of {len(retry_ids)} images left")
+        failures += bool(left)
+
+        calls.delete_calls = 0
+        result = await sweep_orphans(grace_hours=0)
+        main.deletion_worker.wake()
+        drained = await wait_until_drained()
+        left = remaining(client, orphan_keys)
+        print(f"orphans: sweep scanned {result['scanned']} objects and queued {result['queued']}; "
+              f"queue empty {drained:.2f}s later after {calls.delete_calls} calls, {left} of {len(orphan_keys)} left")
+        failures += bool(left)
+    return failures
+
+
+def main_bench(products, orphans, delay, concurrency):
+    client = product_routes.s3.client
+    client.create_bucket(Bucket=AWS_S3_BUCKET)
+    product_ids = seed(products)
+    keys = [f"products/bench-{i}.jpg" for i in range(products)]
+    orphan_keys = [f"products/orphan-{i}.jpg" for i in range(orphans)]
+    upload(client, keys + orphan_keys)
+    calls = S3Calls(client, delay)  # after the uploads, so only the measured calls are slowed down
+    print(f"S3 delay {delay * 1000:.0f}ms per call, {concurrency} deletes in flight")
+    return asyncio.run(run(client, calls, product_ids, keys, orphan_keys, concurrency))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=2500)
+    parser.add_argument("--orphans", type=int, default=300)
+    parser.add_argument("--s3-delay", type=float, default=0.1, help="seconds added to every S3 call")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    try:
+        sys.exit(1 if main_bench(args.products, args.orphans, args.s3_delay, args.concurrency) else 0)
+    finally:
+        _mock.stop()
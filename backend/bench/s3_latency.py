@@ -0,0 +1,113 @@
+# backend/bench/s3_latency.py
+# How much a slow S3 hurts unrelated requests. S3 is moto's in-process stand-in with an
+# artificial delay injected before every call; needs `pip install moto` and a throwaway
+# database in DATABASE_URL:
+#
+#   DATABASE_URL=postgresql://postgres@localhost/market python -m bench.s3_latency --s3-delay 0.5
+#
+# Runs product deletes and upload-URL requests (both touch S3) concurrently with plain
+# GET /api/products/ requests (which don't), and reports the latency of each kind.
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("IMAGE_PIPELINE", "false")  # the seeded image keys aren't real images
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")  # one client firing the whole load
+os.environ.setdefault("CONCURRENCY_LIMIT", "0")
+
+from moto import mock_aws  # noqa: E402
+
+# S3 clients are created at import time, so the stand-in has to be in place first
+_mock = mock_aws()
+_mock.start()
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from config import AWS_S3_BUCKET  # noqa: E402
+from db.migrations import migrate  # noqa: E402
+from models import Product, SessionLocal, engine  # noqa: E402
+from products import routes as product_routes  # noqa: E402
+
+
+def inject_delay(delay):
+    client = getattr(product_routes.s3, "client", product_routes.s3)
+    client.create_bucket(Bucket=AWS_S3_BUCKET)
+
+    def slow_s3(**kwargs):
+        time.sleep(delay)  # blocks whichever thread made the call, like a slow network would
+
+    client.meta.events.register_first("before-send.s3", slow_s3)
+    return client
+
+
+def seed(count):
+    migrate(engine)
+    db = SessionLocal()
+    try:
+        products = [Product(name=f"S3 item {i}", price=1, seller_id="s3-seller", image_key=f"products/bench-{i}.jpg") for i in range(count)]
+        db.add_all(products)
+        db.commit()
+        return [p.product_id for p in products]
+    finally:
+        db.close()
+
+
+def summary(samples):
+    ordered = sorted(samples)
+    return f"n={len(samples):4d} p50={statistics.median(samples):8.1f}ms p99={ordered[int(0.99 * (len(ordered) - 1))]:8.1f}ms max={ordered[-1]:8.1f}ms"
+
+
+async def run(product_ids, uploads, reads):
+    latencies = {"delete (S3)": [], "upload-url (S3)": [], "list (no S3)": []}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def timed(kind, method, url, **kwargs):
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies[kind].append((time.perf_counter() - start) * 1000)
+            return response.status_code
+
+        async def reader():
+            for _ in range(reads):
+                await timed("list (no S3)", "GET", "/api/products/", params={"limit": 10})
+                await asyncio.sleep(0.01)
+
+        tasks = [timed("delete (S3)", "DELETE", f"/api/products/{pid}", data={"seller_id": "s3-seller"}) for pid in product_ids]
+        tasks += [timed("upload-url (S3)", "GET", "/api/products/upload-url", params={"filename": f"f{i}.jpg"}) for i in range(uploads)]
+        tasks += [reader() for _ in range(4)]
+        started = time.perf_counter()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    return latencies, elapsed
+
+
+def main_bench(deletes, uploads, reads, delay):
+    inject_delay(delay)
+    product_ids = seed(deletes)
+    latencies, elapsed = asyncio.run(_with_lifespan(run(product_ids, uploads, reads)))
+    print(f"S3 delay {delay * 1000:.0f}ms, {deletes} deletes + {uploads} upload URLs + {4 * reads} lists, wall {elapsed:.2f}s")
+    for kind, samples in latencies.items():
+        print(f"  {kind:16s} {summary(samples)}")
+
+
+async def _with_lifespan(coro):
+    async with main.app.router.lifespan_context(main.app):
+        return await coro
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--deletes", type=int, default=20)
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--reads", type=int, default=25, help="list requests per reader (4 readers)")
+    parser.add_argument("--s3-delay", type=float, default=0.5, help="seconds added to every S3 call")
+    args = parser.parse_args()
+    try:
+        main_bench(args.deletes, args.uploads, args.reads, args.s3_delay)
+    finally:
+        _mock.stop()
@@ -0,0 +1,98 @@
+# backend/bench/search_bench.py
+# Search latency at growing catalogue sizes: the old ILIKE query vs the search backends.
+# Wipes and re-seeds "Products", so point DATABASE_URL at a throwaway database:
+#
+#   DATABASE_URL=postgresql://postgres@localhost/market python -m bench.search_bench --sizes 10000 100000 1000000
+#
+# The postgres backend is skipped when pg_trgm is not installed on the server.
+import argparse
+import io
+import random
+import statistics
+import time
+
+from sqlalchemy import select
+
+from db.migrations import migrate
+from models import Product, SessionLocal, engine
+from search.engine import InMemorySearchBackend, PostgresSearchBackend, ensure_search_schema
+
+WORDS = (
+    "lamp desk chair table sofa laptop phone camera lens bike helmet guitar piano drum "
+    "jacket shoes boots watch ring necklace book novel comic poster frame mirror rug "
+    "kettle toaster blender mixer oven fridge monitor keyboard mouse speaker headphones "
+    "tent backpack stove lantern racket ball glove bat skates board vintage wooden "
+    "leather steel glass ceramic gaming office kitchen garden outdoor portable wireless"
+).split()
+CATEGORIES = ["home", "office", "electronics", "sports", "fashion", "books", "music", "outdoor"]
+QUERIES = ["lam", "desk", "gaming lap", "wireles", "vintage leather jacket", "x4521", "zzz"]
+
+
+def seed(size):
+    rng = random.Random(size)
+    buf = io.StringIO()
+    for i in range(size):
+        # A model code per listing keeps the vocabulary realistically large
+        name = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))) + f" {rng.choice('abcdefghkmxz')}{rng.randint(1, 9999)}"
+        buf.write(f"{name}\t{rng.choice(CATEGORIES)}\t{rng.randint(1, 1000)}\tseller{i % 500}\tunsold\n")
+    buf.seek(0)
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute('TRUNCATE "Products" RESTART IDENTITY CASCADE')
+        cur.copy_expert('COPY "Products" (name, category, price, seller_id, status) FROM STDIN', buf)
+        conn.commit()
+        cur.execute('ANALYZE "Products"')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def legacy_search(db, name, limit):
+    # What search_products did before: unranked ILIKE, sequential scan
+    query = select(Product.product_id).where(Product.name.ilike(f"%{name}%")).limit(limit)
+    return db.execute(query).all()
+
+
+def time_queries(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        for q in QUERIES:
+            start = time.perf_counter()
+            fn(q)
+            samples.append((time.perf_counter() - start) * 1000)
+    ordered = sorted(samples)
+    return statistics.median(samples), ordered[int(0.99 * (len(ordered) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    migrate(engine)
+    has_trgm = ensure_search_schema(engine)
+    for size in args.sizes:
+        seed(size)
+        db = SessionLocal()
+        try:
+            results = {"ilike (before)": time_queries(lambda q: legacy_search(db, q, args.limit), args.repeats)}
+            if has_trgm:
+                backend = PostgresSearchBackend()
+                results["postgres fts+trgm"] = time_queries(lambda q: backend.search(db, name=q, limit=args.limit), args.repeats)
+            memory = InMemorySearchBackend()
+            start = time.perf_counter()
+            memory.rebuild()
+            build = time.perf_counter() - start
+            results[f"memory (build {build:.1f}s)"] = time_queries(lambda q: memory.search(db, name=q, limit=args.limit), args.repeats)
+        finally:
+            db.close()
+        print(f"{size} products")
+        for label, (p50, p99) in results.items():
+            print(f"  {label:24s} p50={p50:8.2f}ms p99={p99:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# backend/bench/upload_urls.py
+# What it costs a browser to get upload targets for a multi-image listing: one
+# GET /api/products/upload-url per image versus a single GET /api/products/upload-urls
+# (presigned PUTs or one POST policy). Each request pays a simulated client round trip,
+# since that, not signing, is what the browser waits on:
+#
+#   python -m bench.upload_urls --images 8 --rtt 0.08 --rounds 20
+#
+# Signing is local, so any AWS credentials will do (dummy ones are set if none are).
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("AWS_S3_BUCKET", "bench-bucket")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+
+
+async def main_bench(images, rtt, rounds):
+    filenames = [f"photo{i}.jpg" for i in range(images)]
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def get(url, params):
+            await asyncio.sleep(rtt)  # the browser <-> API round trip
+            response = await client.get(url, params=params)
+            assert response.status_code == 200, response.text
+            return response.json()
+
+        async def one_by_one():
+            return [await get("/api/products/upload-url", {"filename": name}) for name in filenames]
+
+        async def parallel():
+            return await asyncio.gather(*(get("/api/products/upload-url", {"filename": name}) for name in filenames))
+
+        async def batch(mode):
+            return (await get("/api/products/upload-urls", [("filename", name) for name in filenames] + [("mode", mode)]))["uploads"]
+
+        cases = [
+            (f"{images} x /upload-url, sequential", one_by_one, images),
+            (f"{images} x /upload-url, parallel", parallel, images),
+            ("1 x /upload-urls?mode=put", lambda: batch("put"), 1),
+            ("1 x /upload-urls?mode=post", lambda: batch("post"), 1),
+        ]
+        print(f"{images} images, simulated round trip {rtt * 1000:.0f}ms, median of {rounds} rounds")
+        for label, fn, requests in cases:
+            await fn()  # warm up
+            samples = []
+            for _ in range(rounds):
+                start = time.perf_counter()
+                targets = await fn()
+                samples.append((time.perf_counter() - start) * 1000)
+            assert len(targets) == images
+            print(f"  {label:34s} {requests:3d} requests  {statistics.median(samples):8.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--rtt", type=float, default=0.08, help="seconds per browser round trip")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main_bench(args.images, args.rtt, args.rounds))
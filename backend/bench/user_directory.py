@@ -0,0 +1,117 @@
+# backend/bench/user_directory.py
+# GET /api/admin/users against a local fake of the Cognito ListUsers API.
+#
+#   python -m bench.user_directory --users 5000 --page-latency 0.05
+#
+# FakeCognitoClient pages like the real API (<= 60 users per call, PaginationToken) and
+# sleeps page_latency per call. The bench compares the old handler's single capped call
+# with the directory: users returned, cold load, cached request latency, and whether
+# requests stall while the TTL turns over (refresh-ahead should keep them from it).
+import os
+
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")  # one client firing the whole load
+os.environ.setdefault("CONCURRENCY_LIMIT", "0")
+
+import argparse
+import statistics
+import time
+
+from botocore.exceptions import ClientError
+from fastapi.testclient import TestClient
+
+import main
+from admin.user_directory import UserDirectory, get_user_directory
+from auth.middleware import require_identity
+from auth.tokens import Identity
+
+
+class FakeCognitoClient:
+    def __init__(self, users, page_latency=0.0, fail=False):
+        self.users = [
+            {"Username": f"user{i:06d}", "Attributes": [
+                {"Name": "email", "Value": f"user{i}@example.com"},
+                {"Name": "custom:role", "Value": "admin" if i % 50 == 0 else "buyer"},
+            ]}
+            for i in range(users)
+        ]
+        self.page_latency = page_latency
+        self.fail = fail
+        self.calls = 0
+
+    def list_users(self, UserPoolId, Limit=60, PaginationToken=None):
+        self.calls += 1
+        time.sleep(self.page_latency)
+        if self.fail:
+            raise ClientError({"Error": {"Code": "InternalErrorException", "Message": "fake outage"}}, "ListUsers")
+        start = int(PaginationToken or 0)
+        response = {"Users": self.users[start:start + min(Limit, 60)]}
+        if start + Limit < len(self.users):
+            response["PaginationToken"] = str(start + Limit)
+        return response
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main_bench(users, page_latency, requests, ttl):
+    fake = FakeCognitoClient(users, page_latency)
+
+    # What the old handler did on every admin page load
+    old, old_ms = timed(lambda: fake.list_users(UserPoolId="pool", Limit=60))
+    print(f"old handler:  {len(old['Users'])} of {users} users, {old_ms:.0f}ms per request, every request")
+
+    directory = UserDirectory(client=fake, ttl=ttl, refresh_ahead=0.5)
+    main.app.dependency_overrides[get_user_directory] = lambda: directory
+    # An admin caller, standing in for a Cognito token
+    main.app.dependency_overrides[require_identity] = lambda: Identity("bench-admin", "bench-admin", ["admin"], {})
+    try:
+        with TestClient(main.app) as client:
+            def fetch_all():
+                seen, after = 0, None
+                while True:
+                    response = client.get("/api/admin/users",
+                                          params={"limit": 1000, **({"after": after} if after else {})})
+                    seen += len(response.json())
+                    after = response.headers.get("x-next-cursor")
+                    if not after:
+                        return seen
+
+            calls_before = fake.calls
+            seen, cold_ms = timed(fetch_all)
+            print(f"directory:    {seen} of {users} users, cold load {cold_ms:.0f}ms ({fake.calls - calls_before} ListUsers calls)")
+
+            latencies = [timed(lambda: client.get("/api/admin/users", params={"q": "user00", "role": "admin"}))[1]
+                         for _ in range(requests)]
+            ordered = sorted(latencies)
+            print(f"cached:       p50={statistics.median(latencies):.2f}ms p99={ordered[int(0.99 * (len(ordered) - 1))]:.2f}ms "
+                  f"over {requests} filtered requests")
+
+            # Keep requesting across two TTLs: refresh-ahead reloads in the background
+            calls_before, worst, deadline = fake.calls, 0.0, time.monotonic() + 2 * ttl
+            while time.monotonic() < deadline:
+                worst = max(worst, timed(lambda: client.get("/api/admin/users"))[1])
+                time.sleep(0.01)
+            print(f"across TTLs:  worst request {worst:.1f}ms while {fake.calls - calls_before} ListUsers calls ran in the background")
+
+            fake.fail = True
+            directory._loaded_at -= ttl  # force the next request to reload
+            response, _ = timed(lambda: client.get("/api/admin/users", params={"limit": 5}))
+            _, retry_ms = timed(lambda: client.get("/api/admin/users", params={"limit": 5}))
+            print(f"outage:       HTTP {response.status_code}, served {len(response.json())} cached users; "
+                  f"next request {retry_ms:.1f}ms (retries continue in the background)")
+    finally:
+        main.app.dependency_overrides.pop(get_user_directory, None)
+        main.app.dependency_overrides.pop(require_identity, None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--page-latency", type=float, default=0.05, help="seconds per ListUsers call")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--ttl", type=float, default=20.0)
+    args = parser.parse_args()
+    main_bench(args.users, args.page_latency, args.requests, args.ttl)
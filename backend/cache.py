@@ -0,0 +1,212 @@
+# backend/cache.py
+# Read-through cache for the product catalogue.
+#
+# Keys:
+#   product:{id}                   -> get_product response
+#   products:{version}:{kind}:...  -> list_products / search_products responses
+#
+# {version} is the products change counter from the database (db/versions.py), bumped in
+# the same transaction as every product write, so list/search pages cached by any
+# instance stop being looked up as soon as the write commits and age out through LRU/TTL.
+# Product writes also call invalidate_product() to drop the product's own entry.
+#
+# CACHE_BACKEND=memory (default) keeps an LRU per process; CACHE_BACKEND=redis shares
+# entries between instances through any Redis-protocol server at CACHE_URL (redis-server,
+# Valkey, ElastiCache, or a local stand-in).
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from config import CACHE_BACKEND, CACHE_URL, CACHE_TTL, CACHE_MAX_ENTRIES
+from metrics import collector
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def incr(self, field: str, amount: int = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class LRUCache:
+    name = "memory"
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: int = CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                self.stats.incr("evictions")
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.incr("evictions")
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def info(self):
+        return {"backend": self.name, "entries": len(self._entries), "max_entries": self.max_entries, **self.stats.as_dict()}
+
+
+class RedisCache:
+    name = "redis"
+
+    def __init__(self, url: str = CACHE_URL, ttl: int = CACHE_TTL):
+        import redis  # optional dependency, only needed for CACHE_BACKEND=redis
+
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._client.get(key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        self._client.set(key, json.dumps(value, default=str), ex=ttl or self.ttl)
+
+    def delete(self, *keys: str):
+        if keys:
+            self._client.delete(*keys)  # one DEL, however many keys
+
+    def info(self):
+        result = {"backend": self.name, "entries": self._client.dbsize(), **self.stats.as_dict()}
+        try:
+            # Redis does its own LRU/TTL eviction, so report the server's counters
+            server = self._client.info("stats")
+            result["evictions"] = server.get("evicted_keys", 0)
+            result["expired"] = server.get("expired_keys", 0)
+        except Exception as e:
+            logger.debug("Cache server stats unavailable: %s", e)
+        return result
+
+
+class NullCache:
+    name = "none"
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def info(self):
+        return {"backend": self.name, **self.stats.as_dict()}
+
+
+def _build_cache():
+    if CACHE_BACKEND == "redis":
+        return RedisCache()
+    if CACHE_BACKEND == "none":
+        return NullCache()
+    return LRUCache()
+
+
+cache = _build_cache()
+
+
+def get_or_load(key: str, loader: Callable[[], Any], ttl: Optional[int] = None) -> Any:
+    """Return the cached value for key, or call loader() and cache its result.
+
+    Cache backend errors never fail the request: the loader result is served uncached.
+    """
+    try:
+        value = cache.get(key)
+    except Exception as e:
+        logger.warning("Cache read failed for %s: %s", key, e)
+        return loader()
+    if value is not None:
+        cache.stats.incr("hits")
+        return value
+    cache.stats.incr("misses")
+    value = loader()
+    if value is not None:
+        try:
+            cache.set(key, value, ttl)
+        except Exception as e:
+            logger.warning("Cache write failed for %s: %s", key, e)
+    return value
+
+
+def product_key(product_id: int) -> str:
+    return f"product:{product_id}"
+
+
+def catalogue_key(kind: str, version, **params) -> str:
+    # Sorted so the same query always maps to the same key
+    parts = "&".join(f"{k}={params[k]}" for k in sorted(params) if params[k] is not None)
+    return f"products:{version}:{kind}:{parts}"
+
+
+def invalidate_product(*product_ids: int):
+    """Call after any write that changes what a product detail shows."""
+    try:
+        cache.delete(*(product_key(product_id) for product_id in product_ids))
+        cache.stats.incr("invalidations")
+    except Exception as e:
+        # Entries still expire after CACHE_TTL, so a failed invalidation is bounded staleness
+        logger.error("Cache invalidation failed for products %s: %s", product_ids, e, exc_info=True)
+
+
+def cache_stats():
+    try:
+        return cache.info()
+    except Exception as e:
+        return {"backend": cache.name, "error": str(e), **cache.stats.as_dict()}
+
+
+@collector
+def _cache_metrics():
+    # This process's lookups only; no round trip to a shared cache per scrape
+    stats = cache.stats
+    yield ("cache_lookups_total", "counter", "Cache lookups by cache and result.",
+           [({"cache": "products", "result": "hit"}, stats.hits), ({"cache": "products", "result": "miss"}, stats.misses)])
+    yield ("cache_evictions_total", "counter", "Product cache entries evicted or expired (memory backend).",
+           [({"cache": "products"}, stats.evictions)])
+    yield ("cache_invalidations_total", "counter", "Product cache invalidations after writes.",
+           [({"cache": "products"}, stats.invalidations)])
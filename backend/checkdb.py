@@ -5,9 +5,13 @@ from sqlalchemy import (
 )
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
-from urllib.parse import urlparse
+from urllib.parse import urlparse, parse_qs
+import os
+import sys
 # Your DATABASE_URL
-DATABASE_URL = "DB_URL"
+DATABASE_URL = os.getenv("DATABASE_URL", "DB_URL")
+# Rows to print per table (first argument); 0 prints them all, streamed rather than loaded at once
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
 
 # Parse the DATABASE_URL
 url = urlparse(DATABASE_URL)
@@ -51,19 +55,25 @@ url = urlparse(DATABASE_URL)
 # Check table contents
 conn = psycopg2.connect(
     dbname=url.path[1:], user=url.username, password=url.password,
-    host=url.hostname, port=url.port
+    host=url.hostname or parse_qs(url.query).get("host", [None])[0], port=url.port
 )
 cur = conn.cursor()
 
 for table in ['Products', 'transactions']:
-    cur.execute(f'SELECT * FROM "{table}";')
-    rows = cur.fetchall()
-    if not rows:
+    cur.execute(f'SELECT count(*) FROM "{table}";')
+    count = cur.fetchone()[0]
+    if not count:
         print(f"📭 '{table}' table is empty.")
-    else:
-        print(f"📄 '{table}' table has {len(rows)} rows:")
+        continue
+    shown = count if ROWS == 0 else min(ROWS, count)
+    print(f"📄 '{table}' table has {count} rows" + (f", first {shown}:" if shown < count else ":"))
+    # A named (server-side) cursor fetches itersize rows at a time instead of the whole table
+    with conn.cursor(name=f"checkdb_{table.lower()}") as rows:
+        rows.itersize = 1000
+        rows.execute(f'SELECT * FROM "{table}"' + (f" LIMIT {ROWS};" if ROWS else ";"))
         for row in rows:
             print(row)
+    conn.rollback()  # close the named cursor's transaction before the next table
 
 cur.close()
 conn.close()
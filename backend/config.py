@@ -4,4 +4,166 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 AWS_S3_BUCKET = os.getenv("AWS_S3_BUCKET")
-AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
\ No newline at end of file
+AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
+
+# Connection pool settings for the shared engine (db/db.py).
+# Size these against the RDS max_connections divided by the number of EC2 instances.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds before a connection is replaced
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# GET /api/products/ paging (keyset on product_id) and streamed export batch size
+PRODUCTS_PAGE_SIZE = int(os.getenv("PRODUCTS_PAGE_SIZE", "100"))
+PRODUCTS_MAX_PAGE_SIZE = int(os.getenv("PRODUCTS_MAX_PAGE_SIZE", "500"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Bulk product import (POST /api/products/import): rows per INSERT/commit, and how many
+# per-row errors the report lists (all are counted)
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+
+# Most product ids one POST /api/products/bulk-update or bulk-delete may name
+BULK_MAX_PRODUCTS = int(os.getenv("BULK_MAX_PRODUCTS", "1000"))
+
+# Admin transactions report paging (keyset on created_at, transaction_id)
+REPORT_PAGE_SIZE = int(os.getenv("REPORT_PAGE_SIZE", "100"))
+REPORT_MAX_PAGE_SIZE = int(os.getenv("REPORT_MAX_PAGE_SIZE", "1000"))
+
+# Admin sales analytics (analytics/rollups.py): completed transactions folded into hourly and
+# daily buckets per category by a background refresh that starts from its last watermark
+ROLLUP_WORKER = os.getenv("ROLLUP_WORKER", "true").lower() == "true"  # false = refresh from another process
+ROLLUP_INTERVAL = float(os.getenv("ROLLUP_INTERVAL", "60"))  # seconds between refreshes
+ROLLUP_GRACE = int(os.getenv("ROLLUP_GRACE", "300"))  # seconds before the watermark re-read for late commits
+ROLLUP_MAX_BUCKETS = int(os.getenv("ROLLUP_MAX_BUCKETS", "1000"))  # per analytics request
+ROLLUP_MAX_REFRESH_DAYS = int(os.getenv("ROLLUP_MAX_REFRESH_DAYS", "31"))  # how far back POST /admin/analytics/refresh may recompute
+
+# Product search: "auto" uses PostgreSQL full-text + pg_trgm when the extension is available,
+# otherwise the in-process index; "postgres"/"memory" force one backend.
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+SEARCH_INDEX_TTL = int(os.getenv("SEARCH_INDEX_TTL", "300"))  # seconds between in-process index rebuilds
+SEARCH_SIMILARITY_THRESHOLD = float(os.getenv("SEARCH_SIMILARITY_THRESHOLD", "0.3"))  # pg_trgm default
+SEARCH_RESULT_LIMIT = int(os.getenv("SEARCH_RESULT_LIMIT", "100"))
+
+# Product cache (cache.py): "memory" = per-process LRU, "redis" = shared via CACHE_URL, "none" = off
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+CACHE_TTL = int(os.getenv("CACHE_TTL", "60"))  # seconds
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# Edge protection (ratelimit.py): token buckets per user (or client IP) and route, and load
+# shedding once too many requests are in flight. "memory" = per process, "redis" = shared
+# between instances through RATE_LIMIT_URL, "none" = off.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", CACHE_URL)
+# "METHOD PATH=rate:burst", comma-separated; rate is requests per second, PATH ending in * is a
+# prefix, and "*" is the budget of every other /api route. Each rule is a separate bucket.
+RATE_LIMITS = os.getenv("RATE_LIMITS", (
+    "GET /api/search=5:20,"
+    "GET /api/products=5:20,"
+    "POST /api/orders/create-checkout-session=0.5:5,"
+    "POST /api/products/*=5:20,"
+    "*=20:100"
+))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))  # buckets kept per process (memory)
+RATE_LIMIT_PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", "0"))  # trusted proxies in front (1 behind an ALB): the client is that far from the end of X-Forwarded-For
+CONCURRENCY_LIMIT = int(os.getenv("CONCURRENCY_LIMIT", str(2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW))))  # in-flight /api requests (all instances with redis) before 503s; 0 = off
+CONCURRENCY_LEASE = int(os.getenv("CONCURRENCY_LEASE", "60"))  # seconds a slot of a crashed instance stays counted (redis)
+
+# Cache-Control sent with ETag/Last-Modified on the catalogue endpoints (http_cache.py).
+# "no-cache" lets browsers and CloudFront store responses but revalidate every time.
+CATALOGUE_CACHE_CONTROL = os.getenv("CATALOGUE_CACHE_CONTROL", "public, no-cache")
+
+# Logging (logging_config.py). LOG_LEVELS overrides per logger, i.e. per router module,
+# e.g. "products.routes=DEBUG,search=WARNING". LOG_SAMPLE_RATE keeps INFO/DEBUG records for
+# that fraction of requests; WARNING and above are always kept.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "json" = one object per line for CloudWatch Insights
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_SLOW_REQUEST_MS = int(os.getenv("LOG_SLOW_REQUEST_MS", "1000"))  # access line at WARNING above this
+
+# Prometheus metrics on GET /metrics (metrics.py): request latency per route, SQL time per
+# request, pool checkout waits, S3/Stripe call latency, cache hit counters. Per process; keep
+# the path off the public listener.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"  # false = no middleware or SQL timing hooks
+METRICS_BUCKETS = os.getenv("METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10")  # seconds, latency histograms
+
+# SQL profiling (db/profiler.py), opt-in: each response carries its statement count and SQL
+# time in X-SQL-Queries / X-SQL-Time-Ms, the slowest statements are logged, and endpoints are
+# held to query budgets, "endpoint=max statements" by handler name (or module.name)
+SQL_PROFILE = os.getenv("SQL_PROFILE", "false").lower() == "true"
+SQL_PROFILE_TOP = int(os.getenv("SQL_PROFILE_TOP", "5"))  # slowest statements logged per request
+SQL_QUERY_BUDGETS = os.getenv("SQL_QUERY_BUDGETS", (
+    "get_user_orders=1,"
+    "get_product=2,"
+    "list_products=3,"
+    "search_products=2,"
+    "get_transactions_last_week=1,"
+    "seller_stats=1,"
+    "category_stats=1,"
+    "category_stats_list=1,"
+    "get_transaction_analytics=2"
+))
+SQL_BUDGET_MODE = os.getenv("SQL_BUDGET_MODE", "warn")  # "raise" = an endpoint over budget fails with QueryBudgetExceeded (tests, CI)
+SQL_REPEAT_WARN = int(os.getenv("SQL_REPEAT_WARN", "10"))  # one statement run this often in a request is logged as a likely N+1
+
+# Cognito user directory behind GET /api/admin/users (admin/user_directory.py)
+COGNITO_USER_POOL_ID = os.getenv("COGNITO_USER_POOL_ID", "us-east-1_IPqipLOoX")
+COGNITO_REGION = os.getenv("COGNITO_REGION", "us-east-1")
+COGNITO_ENDPOINT_URL = os.getenv("COGNITO_ENDPOINT_URL")  # e.g. a local Cognito emulator; unset = AWS
+USER_DIRECTORY_TTL = int(os.getenv("USER_DIRECTORY_TTL", "300"))  # seconds a copy of the pool may be served
+USER_DIRECTORY_REFRESH_AHEAD = float(os.getenv("USER_DIRECTORY_REFRESH_AHEAD", "0.8"))  # refresh in the background after this fraction of the TTL
+USERS_PAGE_SIZE = int(os.getenv("USERS_PAGE_SIZE", "100"))
+USERS_MAX_PAGE_SIZE = int(os.getenv("USERS_MAX_PAGE_SIZE", "1000"))
+
+# Bearer tokens (auth/): Cognito JWTs verified in-process against the pool's JWKS, which is
+# cached in memory and refreshed in the background, plus an LRU of already-verified tokens
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "false").lower() == "true"  # false = ids from the form are trusted when no token is sent
+ADMIN_GROUP = os.getenv("ADMIN_GROUP", "admin")  # Cognito group (cognito:groups claim) allowed into /api/admin
+APP_ENV = os.getenv("APP_ENV", "production")  # "local" on a developer machine: no startup warning about AUTH_REQUIRED=false
+COGNITO_APP_CLIENT_ID = os.getenv("COGNITO_APP_CLIENT_ID")  # aud (id tokens) / client_id (access tokens); unset = any client of the pool
+COGNITO_ISSUER = os.getenv("COGNITO_ISSUER", f"https://cognito-idp.{COGNITO_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}")
+JWKS_URL = os.getenv("JWKS_URL", f"{COGNITO_ISSUER}/.well-known/jwks.json")
+JWKS_REFRESH_INTERVAL = float(os.getenv("JWKS_REFRESH_INTERVAL", "3600"))  # seconds between background refreshes
+JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "30"))  # an unknown kid refetches at most this often
+JWKS_TIMEOUT = float(os.getenv("JWKS_TIMEOUT", "3"))  # seconds per JWKS request
+JWT_LEEWAY = int(os.getenv("JWT_LEEWAY", "30"))  # seconds of clock skew allowed on exp/nbf
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))  # verified tokens remembered per process
+
+# S3 calls (storage/s3.py): a dedicated bounded thread pool, an overall deadline per call,
+# and botocore's own timeouts and retry policy underneath
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. a local S3 stand-in; unset = AWS
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "16"))  # worker threads = client connection pool size
+S3_CALL_TIMEOUT = float(os.getenv("S3_CALL_TIMEOUT", "10"))  # seconds, including retries and queueing
+S3_CONNECT_TIMEOUT = float(os.getenv("S3_CONNECT_TIMEOUT", "2"))
+S3_READ_TIMEOUT = float(os.getenv("S3_READ_TIMEOUT", "5"))
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", "3"))
+S3_RETRY_MODE = os.getenv("S3_RETRY_MODE", "standard")  # botocore: legacy | standard | adaptive
+
+# Deferred image deletion (storage/deletions.py): product deletes queue the key in s3_deletions
+# and a background worker drains the queue with delete_objects
+S3_DELETE_WORKER = os.getenv("S3_DELETE_WORKER", "true").lower() == "true"  # false = drain from another process
+S3_DELETE_BATCH_SIZE = int(os.getenv("S3_DELETE_BATCH_SIZE", "1000"))  # delete_objects takes at most 1000 keys
+S3_DELETE_INTERVAL = float(os.getenv("S3_DELETE_INTERVAL", "30"))  # seconds between polls when nothing wakes the worker
+S3_DELETE_LEASE = int(os.getenv("S3_DELETE_LEASE", "120"))  # seconds a claimed batch is hidden from other workers
+S3_DELETE_RETRY_BASE = int(os.getenv("S3_DELETE_RETRY_BASE", "30"))  # seconds; doubles per failed attempt
+S3_DELETE_MAX_BACKOFF = int(os.getenv("S3_DELETE_MAX_BACKOFF", "3600"))
+S3_IMAGE_PREFIX = os.getenv("S3_IMAGE_PREFIX", "products/")  # where get_upload_url puts product images
+S3_ORPHAN_GRACE_HOURS = int(os.getenv("S3_ORPHAN_GRACE_HOURS", "24"))  # unreferenced uploads younger than this are kept
+
+# Browser uploads straight to S3 (GET /api/products/upload-url[s])
+UPLOAD_URL_EXPIRES = int(os.getenv("UPLOAD_URL_EXPIRES", "3600"))  # seconds a presigned URL/policy is valid
+UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", "10"))  # per upload-urls request
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))  # enforced by S3 for POST policies
+
+# Image variants (images/): resized WebP/AVIF copies of every product image, rendered on a
+# process pool after create-product and stored under IMAGE_VARIANT_PREFIX
+IMAGE_PIPELINE = os.getenv("IMAGE_PIPELINE", "true").lower() == "true"  # false = render from another process
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))  # render processes
+IMAGE_VARIANT_SIZES = os.getenv("IMAGE_VARIANT_SIZES", "thumb=320,medium=800")  # name=longest edge in px
+IMAGE_FORMATS = os.getenv("IMAGE_FORMATS", "avif,webp")  # formats Pillow can't write are skipped
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "70"))
+IMAGE_VARIANT_PREFIX = os.getenv("IMAGE_VARIANT_PREFIX", "variants/")  # outside S3_IMAGE_PREFIX, so the orphan sweep leaves them alone
+IMAGE_BACKFILL_INTERVAL = float(os.getenv("IMAGE_BACKFILL_INTERVAL", "300"))  # seconds between scans for images still without variants
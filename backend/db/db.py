@@ -1,18 +1,153 @@
-import psycopg2
-import os
-from dotenv import load_dotenv
-from urllib.parse import urlparse
+# backend/db/db.py
+# Single shared engine and session factory for the whole backend.
+# Every router imports its session dependency from here (via models.py) so each
+# process holds exactly one connection pool against RDS.
+#
+# Both engines report to metrics.py: how long each checkout waited for a connection, and
+# (when METRICS_ENABLED or SQL_PROFILE) every statement's time, added to the request that ran
+# it, with the statement itself while db/profiler.py is profiling the request.
+import time
 
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from config import (
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+    METRICS_ENABLED,
+    SQL_PROFILE,
+)
+from metrics import collector, current_request, pool_checkout, pool_timeouts
+
+
+class _TimedCheckout:
+    label = ""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeout:
+            pool_timeouts.labels(self.label).inc()
+            raise
+        finally:
+            pool_checkout.labels(self.label).observe(time.perf_counter() - started)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    label = "sync"
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    label = "async"
+
+
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=TimedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+
+def _async_url(url):
+    # DATABASE_URL is written for psycopg2; the async engine talks asyncpg to the same database.
+    url = make_url(url)
+    if url.drivername in ("postgresql", "postgresql+psycopg2"):
+        url = url.set(drivername="postgresql+asyncpg")
+    return url
+
+
+# Used by the `async def` handlers so database I/O never blocks the event loop.
+# It keeps its own pool with the same limits, so budget 2x these settings per process.
+async_engine = create_async_engine(
+    _async_url(DATABASE_URL),
+    poolclass=TimedAsyncQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+# expire_on_commit=False: attributes stay readable after commit without an implicit (sync) reload
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    request = current_request()
+    if request is not None:
+        elapsed = time.perf_counter() - context._metrics_started
+        request.queries += 1
+        request.db_seconds += elapsed
+        if request.statements is not None:
+            request.statements.append((elapsed, statement))
+
+
+if METRICS_ENABLED or SQL_PROFILE:
+    for _engine in (engine, async_engine.sync_engine):
+        event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def get_db():
+    db: Session = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
 
-load_dotenv()
-DATABASE_URL = "DB_URL_HERE"
-url = urlparse(DATABASE_URL)
 
 def get_connection():
-    return psycopg2.connect(
-    dbname=url.path[1:],
-    user=url.username,
-    password=url.password,
-    host=url.hostname,
-    port=url.port
-)
\ No newline at end of file
+    # Raw DBAPI (psycopg2) connection checked out from the shared pool.
+    # Calling close() on it returns it to the pool instead of closing the socket.
+    return engine.raw_connection()
+
+
+def _pool_usage(pool):
+    return {
+        "pool_size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
+
+
+def pool_stats():
+    return {
+        "sync": _pool_usage(engine.pool),
+        "async": _pool_usage(async_engine.pool),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "timeout": DB_POOL_TIMEOUT,
+        "recycle": DB_POOL_RECYCLE,
+        "pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+@collector
+def _pool_metrics():
+    usage = {"sync": _pool_usage(engine.pool), "async": _pool_usage(async_engine.pool)}
+    yield ("db_pool_connections", "gauge", "Pooled connections by state.",
+           [({"pool": pool, "state": state}, stats[state])
+            for pool, stats in usage.items() for state in ("checked_out", "checked_in")])
+    yield ("db_pool_overflow", "gauge", "Connections beyond pool_size (negative: pool not yet full).",
+           [({"pool": pool}, stats["overflow"]) for pool, stats in usage.items()])
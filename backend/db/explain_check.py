@@ -0,0 +1,131 @@
+# backend/db/explain_check.py
+# Fails (exit code 1) when a hot endpoint's SQL is planned as a sequential scan.
+#
+#   DATABASE_URL=postgresql://postgres@localhost/scratch python -m db.explain_check
+#
+# Seeds a throwaway database with enough rows that the planner prefers indexes when
+# they exist, calls each endpoint in-process and EXPLAINs every SELECT it issues, on
+# the same connection and with the same parameters. Point it at a scratch database:
+# it truncates Products and transactions.
+import argparse
+import io
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import main
+from db.db import engine, async_engine
+from db.migrations import migrate
+
+CHECKED_TABLES = {"Products", "transactions"}
+
+# (label, path, query params)
+ENDPOINTS = [
+    ("list_products by category", "/api/products/", {"category": "cat3"}),
+    ("list_products next page", "/api/products/", {"after": 150000}),
+    ("get_product", "/api/products/1234", {}),
+    ("get_user_orders buyer", "/api/orders/", {"buyer_id": "buyer7", "userRole": "buyer"}),
+    ("get_user_orders seller", "/api/orders/", {"buyer_id": "seller7", "userRole": "seller"}),
+    ("transactions last week", "/api/admin/transactions/last_week", {}),
+    ("transactions report deep page", "/api/admin/transactions",
+     {"start": (datetime.utcnow() - timedelta(days=90)).isoformat(),
+      "cursor": f"{(datetime.utcnow() - timedelta(days=60)).isoformat()}_1000000000"}),
+    ("search by seller", "/api/search/", {"seller_id": "seller3"}),
+    ("search by price range", "/api/search/", {"min_price": 990, "max_price": 1000}),
+]
+
+
+def seed(products, transactions):
+    rng = random.Random(5)
+    product_rows = io.StringIO()
+    for i in range(products):
+        product_rows.write(f"item {i}\tcat{i % 20}\t{rng.randint(1, 1000)}\tseller{i % 300}\tunsold\n")
+    now = datetime.utcnow()
+    transaction_rows = io.StringIO()
+    for i in range(transactions):
+        created = now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+        transaction_rows.write(f"buyer{i % 2000}\tseller{i % 300}\t{1 + i % products}\tcompleted\t{created.isoformat()}\n")
+    product_rows.seek(0)
+    transaction_rows.seek(0)
+
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute('TRUNCATE "Products", transactions RESTART IDENTITY CASCADE')
+        cur.copy_expert('COPY "Products" (name, category, price, seller_id, status) FROM STDIN', product_rows)
+        cur.copy_expert("COPY transactions (buyer_id, seller_id, product_id, status, created_at) FROM STDIN", transaction_rows)
+        conn.commit()
+        cur.execute('ANALYZE "Products"')
+        cur.execute("ANALYZE transactions")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def seq_scans(plan):
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in CHECKED_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", ()):
+        found.extend(seq_scans(child))
+    return found
+
+
+class PlanRecorder:
+    def __init__(self):
+        self.active = False
+        self.plans = []
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not self.active or executemany or not statement.lstrip().upper().startswith("SELECT"):
+            return
+        cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):  # asyncpg hands json back undecoded
+            plan = json.loads(plan)
+        self.plans.append((statement, plan[0]["Plan"]))
+
+
+def main_check(products, transactions):
+    migrate(engine)
+    seed(products, transactions)
+
+    recorder = PlanRecorder()
+    for target in (engine, async_engine.sync_engine):
+        event.listen(target, "before_cursor_execute", recorder.before_cursor_execute)
+
+    failures = 0
+    with TestClient(main.app) as client:
+        client.get("/api/search/")  # builds the in-process search index, if that backend is active
+        for label, path, params in ENDPOINTS:
+            recorder.active, recorder.plans = True, []
+            response = client.get(path, params=params)
+            recorder.active = False
+            if response.status_code >= 500:
+                print(f"ERROR {label}: HTTP {response.status_code}")
+                failures += 1
+                continue
+            for statement, plan in recorder.plans:
+                scans = seq_scans(plan)
+                status = "SEQ SCAN" if scans else "ok"
+                print(f"{status:8s} {label}: {plan['Node Type']} (cost {plan['Total Cost']})")
+                if scans:
+                    failures += 1
+                    print(f"         seq scan on {', '.join(scans)} in: {' '.join(statement.split())}")
+            if not recorder.plans:
+                print(f"{'ok':8s} {label}: no SQL issued")
+
+    print(f"{failures} regression(s)" if failures else "All hot queries use indexes.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=200000)
+    parser.add_argument("--transactions", type=int, default=50000)
+    args = parser.parse_args()
+    sys.exit(main_check(args.products, args.transactions))
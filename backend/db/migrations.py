@@ -0,0 +1,389 @@
+# backend/db/migrations.py
+# Versioned schema migrations, applied in order at startup (see main.py) or by hand:
+#
+#   python -m db.migrations            # apply pending migrations
+#   python -m db.migrations --status   # list applied / pending versions
+#
+# Each migration runs in its own transaction and is recorded in schema_migrations.
+# A PostgreSQL advisory lock serialises instances that start at the same time.
+# Never edit a migration that has shipped; append a new one instead.
+import argparse
+from sqlalchemy import text
+import logging
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK_ID = 7339001  # arbitrary, just has to be unique to this app
+
+
+# Formerly Base.metadata.create_all in products/routes.py and admin/routes.py
+BASELINE = [
+    '''CREATE TABLE IF NOT EXISTS "Products" (
+        product_id SERIAL PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        category VARCHAR,
+        price DOUBLE PRECISION NOT NULL,
+        seller_id VARCHAR NOT NULL,
+        image_key VARCHAR,
+        status VARCHAR DEFAULT 'unsold'
+    )''',
+    '''CREATE TABLE IF NOT EXISTS transactions (
+        transaction_id SERIAL PRIMARY KEY,
+        buyer_id VARCHAR NOT NULL,
+        seller_id VARCHAR NOT NULL,
+        product_id INTEGER NOT NULL REFERENCES "Products" (product_id),
+        status VARCHAR,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+]
+
+# The generated tsvector column behind search (search/engine.py). The optional pg_trgm
+# indexes are not a migration: ensure_search_schema() adds them whenever the extension
+# can be installed.
+SEARCH_SCHEMA = [
+    '''ALTER TABLE "Products" ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+                             setweight(to_tsvector('simple', coalesce(category, '')), 'B')) STORED''',
+    'CREATE INDEX IF NOT EXISTS ix_products_search_vector ON "Products" USING GIN (search_vector)',
+]
+
+# Composite indexes matching the hot query shapes:
+#   get_user_orders            WHERE buyer_id|seller_id = ? ORDER BY created_at DESC
+#   get_transactions_last_week WHERE created_at >= ?
+#   list_products              WHERE category = ? AND product_id > ? ORDER BY product_id
+#   search_products            seller_id = ?, price BETWEEN ?, status = ?
+HOT_PATH_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_transactions_buyer_id_created_at ON transactions (buyer_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_seller_id_created_at ON transactions (seller_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_created_at ON transactions (created_at)",
+    'CREATE INDEX IF NOT EXISTS ix_products_category_product_id ON "Products" (category, product_id)',
+    'CREATE INDEX IF NOT EXISTS ix_products_seller_id_product_id ON "Products" (seller_id, product_id)',
+    'CREATE INDEX IF NOT EXISTS ix_products_status_product_id ON "Products" (status, product_id)',
+    'CREATE INDEX IF NOT EXISTS ix_products_price ON "Products" (price)',
+]
+
+# Validators for conditional GET (http_cache.py): a catalogue-wide change counter bumped in
+# the same transaction as every product write, and a per-row updated_at kept by a trigger
+# so set-based UPDATEs cannot forget it.
+CATALOGUE_VERSIONS = [
+    """CREATE TABLE IF NOT EXISTS catalogue_versions (
+        name VARCHAR PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )""",
+    "INSERT INTO catalogue_versions (name) VALUES ('products') ON CONFLICT (name) DO NOTHING",
+    'ALTER TABLE "Products" ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP',
+    """CREATE OR REPLACE FUNCTION products_touch_updated_at() RETURNS trigger AS $$
+    BEGIN
+        NEW.updated_at := CURRENT_TIMESTAMP;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql""",
+    'DROP TRIGGER IF EXISTS products_touch_updated_at ON "Products"',
+    """CREATE TRIGGER products_touch_updated_at BEFORE UPDATE ON "Products"
+        FOR EACH ROW EXECUTE FUNCTION products_touch_updated_at()""",
+]
+
+# finalize_order idempotency: the Stripe checkout session id, unique so a retried
+# OrderSuccess page can never record a second sale (NULLs - legacy rows - don't collide)
+ORDER_IDEMPOTENCY = [
+    "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_transactions_idempotency_key ON transactions (idempotency_key)",
+]
+
+# Deferred S3 image deletion (storage/deletions.py): keys are queued in the same transaction
+# that deletes their product and drained in delete_objects batches; next_attempt_at is both
+# the retry backoff and the lease a draining worker holds on a claimed key
+S3_DELETION_QUEUE = [
+    """CREATE TABLE IF NOT EXISTS s3_deletions (
+        key VARCHAR PRIMARY KEY,
+        enqueued_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error VARCHAR
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_s3_deletions_next_attempt_at ON s3_deletions (next_attempt_at)",
+]
+
+# Resized WebP/AVIF copies of each product image (images/pipeline.py); NULL until rendered,
+# and the partial index is the pipeline's to-do list
+IMAGE_VARIANTS = [
+    'ALTER TABLE "Products" ADD COLUMN IF NOT EXISTS image_variants JSONB',
+    """CREATE INDEX IF NOT EXISTS ix_products_pending_variants ON "Products" (product_id)
+        WHERE image_key IS NOT NULL AND image_variants IS NULL""",
+]
+
+# Every image of a product, in display order (create-product used to keep only the first).
+# Products.image_key/image_variants stay as a copy of position 0, the cover the grid shows.
+# Variants are now rendered per image, so the pipeline's to-do index moves here.
+PRODUCT_IMAGES = [
+    """CREATE TABLE IF NOT EXISTS product_images (
+        image_id SERIAL PRIMARY KEY,
+        product_id INTEGER NOT NULL REFERENCES "Products" (product_id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        image_key VARCHAR NOT NULL,
+        image_variants JSONB,
+        CONSTRAINT ux_product_images_product_id_position UNIQUE (product_id, position)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_product_images_pending_variants ON product_images (image_id) WHERE image_variants IS NULL",
+    """INSERT INTO product_images (product_id, position, image_key, image_variants)
+        SELECT product_id, 0, image_key, image_variants FROM "Products" p
+        WHERE image_key IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM product_images i WHERE i.product_id = p.product_id)""",
+    "DROP INDEX IF EXISTS ix_products_pending_variants",
+]
+
+# Per-seller and per-category counters (stats/aggregates.py). Statement-level triggers on
+# "Products" and transactions apply each statement's net change in one grouped upsert, in
+# the writing transaction: a bulk import or bulk update costs one upsert per seller and
+# category touched, not one per row, and statements that change no counted column (image
+# variants, updated_at) write nothing. The *_expected views recount everything from scratch:
+# recount_stats() backfills the tables from them, and --check/--rebuild compare against them.
+# transactions.amount records the sale price, which revenue sums (backfilled from the product).
+STATS_ACTIVE = "status IS DISTINCT FROM 'sold'"  # a listing counts as active until it is sold
+AGGREGATES = [
+    "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS amount DOUBLE PRECISION",
+    '''UPDATE transactions t SET amount = p.price FROM "Products" p
+        WHERE p.product_id = t.product_id AND t.amount IS NULL''',
+    "CREATE INDEX IF NOT EXISTS ix_transactions_product_id ON transactions (product_id)",
+    """CREATE TABLE IF NOT EXISTS seller_stats (
+        seller_id VARCHAR PRIMARY KEY,
+        active_listings INTEGER NOT NULL DEFAULT 0,
+        listed_value NUMERIC NOT NULL DEFAULT 0,
+        sold_count INTEGER NOT NULL DEFAULT 0,
+        revenue NUMERIC NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS category_stats (
+        category VARCHAR PRIMARY KEY,
+        active_listings INTEGER NOT NULL DEFAULT 0,
+        listed_value NUMERIC NOT NULL DEFAULT 0,
+        sold_count INTEGER NOT NULL DEFAULT 0,
+        revenue NUMERIC NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )""",
+    f"""CREATE OR REPLACE VIEW seller_stats_expected AS
+        SELECT seller_id, sum(listings)::int AS active_listings, sum(listed_value) AS listed_value,
+               sum(sold)::int AS sold_count, sum(revenue) AS revenue
+        FROM (
+            SELECT seller_id, 1 AS listings, price::numeric AS listed_value, 0 AS sold, 0::numeric AS revenue
+                FROM "Products" WHERE {STATS_ACTIVE}
+            UNION ALL
+            SELECT seller_id, 0, 0, 1, coalesce(amount, 0)::numeric FROM transactions WHERE status = 'completed'
+        ) s
+        GROUP BY seller_id""",
+    f"""CREATE OR REPLACE VIEW category_stats_expected AS
+        SELECT coalesce(category, '') AS category, sum(listings)::int AS active_listings,
+               sum(listed_value) AS listed_value, sum(sold)::int AS sold_count, sum(revenue) AS revenue
+        FROM (
+            SELECT category, 1 AS listings, price::numeric AS listed_value, 0 AS sold, 0::numeric AS revenue
+                FROM "Products" WHERE {STATS_ACTIVE}
+            UNION ALL
+            SELECT p.category, 0, 0, 1, coalesce(t.amount, 0)::numeric
+                FROM transactions t JOIN "Products" p ON p.product_id = t.product_id WHERE t.status = 'completed'
+        ) c
+        GROUP BY coalesce(category, '')""",
+    # Replaces the counters with a recount: the backfill, after a TRUNCATE, and --rebuild
+    """CREATE OR REPLACE FUNCTION recount_stats() RETURNS void AS $$
+        DELETE FROM seller_stats;
+        INSERT INTO seller_stats (seller_id, active_listings, listed_value, sold_count, revenue)
+            SELECT * FROM seller_stats_expected;
+        DELETE FROM category_stats;
+        INSERT INTO category_stats (category, active_listings, listed_value, sold_count, revenue)
+            SELECT * FROM category_stats_expected;
+    $$ LANGUAGE sql""",
+    "SELECT recount_stats()",
+    # One row of change: seller_id NULL for changes that only move between categories
+    """CREATE TYPE stats_delta AS (
+        seller_id VARCHAR, category VARCHAR, listings INTEGER, listed_value NUMERIC, sold INTEGER, revenue NUMERIC
+    )""",
+    # Ordered upserts, so concurrent statements lock counter rows in the same order.
+    # plpgsql rather than sql: it caches the plans, which halves the cost per write statement
+    """CREATE OR REPLACE FUNCTION apply_stats_deltas(deltas stats_delta[]) RETURNS void AS $$
+    BEGIN
+        INSERT INTO seller_stats AS s (seller_id, active_listings, listed_value, sold_count, revenue)
+            SELECT seller_id, sum(listings), sum(listed_value), sum(sold), sum(revenue)
+            FROM unnest(deltas) WHERE seller_id IS NOT NULL
+            GROUP BY seller_id
+            HAVING sum(listings) <> 0 OR sum(listed_value) <> 0 OR sum(sold) <> 0 OR sum(revenue) <> 0
+            ORDER BY seller_id
+        ON CONFLICT (seller_id) DO UPDATE SET
+            active_listings = s.active_listings + EXCLUDED.active_listings,
+            listed_value = s.listed_value + EXCLUDED.listed_value,
+            sold_count = s.sold_count + EXCLUDED.sold_count,
+            revenue = s.revenue + EXCLUDED.revenue,
+            updated_at = CURRENT_TIMESTAMP;
+        INSERT INTO category_stats AS c (category, active_listings, listed_value, sold_count, revenue)
+            SELECT coalesce(category, ''), sum(listings), sum(listed_value), sum(sold), sum(revenue)
+            FROM unnest(deltas)
+            GROUP BY coalesce(category, '')
+            HAVING sum(listings) <> 0 OR sum(listed_value) <> 0 OR sum(sold) <> 0 OR sum(revenue) <> 0
+            ORDER BY 1
+        ON CONFLICT (category) DO UPDATE SET
+            active_listings = c.active_listings + EXCLUDED.active_listings,
+            listed_value = c.listed_value + EXCLUDED.listed_value,
+            sold_count = c.sold_count + EXCLUDED.sold_count,
+            revenue = c.revenue + EXCLUDED.revenue,
+            updated_at = CURRENT_TIMESTAMP;
+    END;
+    $$ LANGUAGE plpgsql""",
+    f"""CREATE OR REPLACE FUNCTION products_stats() RETURNS trigger AS $$
+    DECLARE
+        deltas stats_delta[];
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            deltas := ARRAY(SELECT ROW(seller_id, category, 1, price::numeric, 0, 0)::stats_delta
+                FROM new_rows WHERE {STATS_ACTIVE});
+        ELSIF TG_OP = 'DELETE' THEN
+            deltas := ARRAY(SELECT ROW(seller_id, category, -1, -price::numeric, 0, 0)::stats_delta
+                FROM old_rows WHERE {STATS_ACTIVE});
+        ELSE
+            deltas := ARRAY(
+                SELECT ROW(seller_id, category, -1, -price::numeric, 0, 0)::stats_delta FROM old_rows WHERE {STATS_ACTIVE}
+                UNION ALL
+                SELECT ROW(seller_id, category, 1, price::numeric, 0, 0)::stats_delta FROM new_rows WHERE {STATS_ACTIVE}
+                UNION ALL
+                -- A product that changes category takes its sales along
+                SELECT ROW(NULL, d.category, 0, 0, d.sign, d.sign * coalesce(t.amount, 0)::numeric)::stats_delta
+                FROM old_rows o
+                JOIN new_rows n ON n.product_id = o.product_id AND n.category IS DISTINCT FROM o.category
+                JOIN transactions t ON t.product_id = o.product_id AND t.status = 'completed'
+                CROSS JOIN LATERAL (VALUES (o.category, -1), (n.category, 1)) AS d (category, sign)
+            );
+        END IF;
+        PERFORM apply_stats_deltas(deltas);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION transactions_stats() RETURNS trigger AS $$
+    DECLARE
+        deltas stats_delta[];
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            deltas := ARRAY(SELECT ROW(t.seller_id, p.category, 0, 0, -1, -coalesce(t.amount, 0)::numeric)::stats_delta
+                FROM old_rows t JOIN "Products" p ON p.product_id = t.product_id WHERE t.status = 'completed');
+        END IF;
+        IF TG_OP IN ('UPDATE', 'INSERT') THEN
+            deltas := coalesce(deltas, '{}') || ARRAY(SELECT ROW(t.seller_id, p.category, 0, 0, 1, coalesce(t.amount, 0)::numeric)::stats_delta
+                FROM new_rows t JOIN "Products" p ON p.product_id = t.product_id WHERE t.status = 'completed');
+        END IF;
+        PERFORM apply_stats_deltas(deltas);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql""",
+    # Transition tables allow one event per trigger
+    """CREATE TRIGGER products_stats_insert AFTER INSERT ON "Products"
+        REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION products_stats()""",
+    """CREATE TRIGGER products_stats_update AFTER UPDATE ON "Products"
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION products_stats()""",
+    """CREATE TRIGGER products_stats_delete AFTER DELETE ON "Products"
+        REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION products_stats()""",
+    """CREATE TRIGGER transactions_stats_insert AFTER INSERT ON transactions
+        REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION transactions_stats()""",
+    """CREATE TRIGGER transactions_stats_update AFTER UPDATE ON transactions
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION transactions_stats()""",
+    """CREATE TRIGGER transactions_stats_delete AFTER DELETE ON transactions
+        REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION transactions_stats()""",
+    # TRUNCATE fires no DELETE triggers
+    """CREATE OR REPLACE FUNCTION stats_truncated() RETURNS trigger AS $$
+    BEGIN
+        PERFORM recount_stats();
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER products_stats_truncate AFTER TRUNCATE ON "Products"
+        FOR EACH STATEMENT EXECUTE FUNCTION stats_truncated()""",
+    """CREATE TRIGGER transactions_stats_truncate AFTER TRUNCATE ON transactions
+        FOR EACH STATEMENT EXECUTE FUNCTION stats_truncated()""",
+]
+
+# Sales analytics rollups (analytics/rollups.py): completed transactions per hour and per day
+# and category ('' for products without one). buyers/sellers are HyperLogLog sketches
+# (analytics/hll.py), so distinct counts over any run of buckets come from merging them.
+# rollup_watermarks records how far each rollup has been refreshed.
+TRANSACTION_ROLLUPS = [
+    """CREATE TABLE IF NOT EXISTS transaction_rollups (
+        bucket VARCHAR(4) NOT NULL,
+        bucket_start TIMESTAMP NOT NULL,
+        category VARCHAR NOT NULL,
+        transactions INTEGER NOT NULL,
+        gmv NUMERIC NOT NULL,
+        buyers BYTEA NOT NULL,
+        sellers BYTEA NOT NULL,
+        PRIMARY KEY (bucket, bucket_start, category)
+    )""",
+    """CREATE TABLE IF NOT EXISTS rollup_watermarks (
+        name VARCHAR PRIMARY KEY,
+        watermark TIMESTAMP NOT NULL,
+        refreshed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )""",
+]
+
+
+MIGRATIONS = [
+    (1, "baseline Products and transactions tables", BASELINE),
+    (2, "product search tsvector column", SEARCH_SCHEMA),
+    (3, "composite indexes for order, report, listing and search queries", HOT_PATH_INDEXES),
+    (4, "catalogue version counter and Products.updated_at", CATALOGUE_VERSIONS),
+    (5, "transactions.idempotency_key with a unique index", ORDER_IDEMPOTENCY),
+    (6, "s3_deletions queue for deferred image deletion", S3_DELETION_QUEUE),
+    (7, "Products.image_variants for resized image copies", IMAGE_VARIANTS),
+    (8, "product_images table for multi-image products", PRODUCT_IMAGES),
+    (9, "seller_stats/category_stats counters and transactions.amount", AGGREGATES),
+    (10, "transaction_rollups and rollup_watermarks for sales analytics", TRANSACTION_ROLLUPS),
+]
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+
+
+def applied_versions(engine):
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return {row.version for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def migrate(engine):
+    """Apply every pending migration. Returns the versions applied by this call."""
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            _ensure_version_table(conn)
+            done = conn.execute(
+                text("SELECT 1 FROM schema_migrations WHERE version = :v"), {"v": version}
+            ).first()
+            if done:
+                continue
+            logger.info("Applying migration %s: %s", version, description)
+            for statement in statements:
+                conn.execute(text(statement))
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:v, :d)"),
+                {"v": version, "d": description},
+            )
+            applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    from db.db import engine
+
+    parser = argparse.ArgumentParser(description="Apply or inspect schema migrations")
+    parser.add_argument("--status", action="store_true", help="only list applied and pending migrations")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.status:
+        done = applied_versions(engine)
+        for version, description, _ in MIGRATIONS:
+            print(f"{version:4d} {'applied' if version in done else 'pending':8s} {description}")
+    else:
+        applied = migrate(engine)
+        print(f"Applied migrations: {applied}" if applied else "Schema is up to date.")
@@ -0,0 +1,104 @@
+# backend/db/profiler.py
+# Opt-in SQL profiling per request (SQL_PROFILE=true), from the cursor events both engines
+# already send for metrics (db/db.py).
+#
+# Each profiled response carries X-SQL-Queries (statements run) and X-SQL-Time-Ms (time in
+# them); the SQL_PROFILE_TOP slowest statements are logged at DEBUG. Counts are taken when the
+# response starts, so a streamed body's later statements (the export) aren't in them.
+#
+# Query budgets (SQL_QUERY_BUDGETS) hold an endpoint to a fixed number of statements however
+# many rows it returns: an N+1 shows up as the count growing with the data. Over budget is a
+# WARNING, or with SQL_BUDGET_MODE=raise a QueryBudgetExceeded in place of the response, so a
+# test client (or bench/query_budget.py in CI) fails on it. Independently, a statement repeated
+# SQL_REPEAT_WARN times in one request is logged as a likely N+1.
+import heapq
+from collections import Counter
+from typing import Dict, Optional
+
+from config import SQL_PROFILE_TOP, SQL_QUERY_BUDGETS, SQL_BUDGET_MODE, SQL_REPEAT_WARN
+from metrics import RequestStats, request_stats
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def parse_budgets(spec: str) -> Dict[str, int]:
+    budgets = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, limit = item.partition("=")
+        budgets[name.strip()] = int(limit)
+    return budgets
+
+
+def endpoint_name(scope) -> Optional[str]:
+    endpoint = scope.get("endpoint")
+    return getattr(endpoint, "__name__", None)
+
+
+def budget_for(budgets: Dict[str, int], scope) -> Optional[int]:
+    # module.name first, for handlers that share a name (products and admin delete_product)
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return None
+    qualified = f"{endpoint.__module__}.{endpoint.__name__}"
+    return budgets.get(qualified, budgets.get(endpoint.__name__))
+
+
+def slowest(stats: RequestStats, top: int = SQL_PROFILE_TOP):
+    return heapq.nlargest(top, stats.statements or (), key=lambda entry: entry[0])
+
+
+def repeated(stats: RequestStats, threshold: int = SQL_REPEAT_WARN):
+    """Statements run at least threshold times: {sql: times}."""
+    if threshold <= 0:
+        return {}
+    counts = Counter(sql for _, sql in stats.statements or ())
+    return {sql: times for sql, times in counts.items() if times >= threshold}
+
+
+class SQLProfileMiddleware:
+    def __init__(self, app, budgets: Optional[Dict[str, int]] = None, mode: str = SQL_BUDGET_MODE):
+        self.app = app
+        self.budgets = parse_budgets(SQL_QUERY_BUDGETS) if budgets is None else budgets
+        self.mode = mode
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with request_stats() as stats:
+            stats.statements = []
+
+            async def send_with_profile(message):
+                if message["type"] == "http.response.start":
+                    self._check(scope, stats)
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"x-sql-queries", str(stats.queries).encode("latin-1")),
+                        (b"x-sql-time-ms", f"{stats.db_seconds * 1000:.2f}".encode("latin-1")),
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_profile)
+
+    def _check(self, scope, stats: RequestStats):
+        name = endpoint_name(scope) or scope["path"]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s: %d statements, %.2fms in SQL; slowest: %s", name, stats.queries, stats.db_seconds * 1000,
+                         [(round(seconds * 1000, 2), sql) for seconds, sql in slowest(stats)])
+        for sql, times in repeated(stats).items():
+            logger.warning("%s ran the same statement %d times (likely N+1): %s", name, times, sql)
+
+        budget = budget_for(self.budgets, scope)
+        if budget is None or stats.queries <= budget:
+            return
+        message = f"{name} ran {stats.queries} SQL statements, budget {budget}"
+        if self.mode == "raise":
+            # Raised before the response starts, so the client gets a 500 (or the test client the error)
+            raise QueryBudgetExceeded(f"{message}: {[sql for _, sql in stats.statements]}")
+        logger.warning("%s; slowest: %s", message, [sql for _, sql in slowest(stats)])
@@ -0,0 +1,94 @@
+# backend/db/versions.py
+# The catalogue change counter (catalogue_versions, migration 4).
+#
+# Every ORM flush that inserts, modifies or deletes a Product bumps the "products" row in
+# the same transaction, so the counter can never disagree with committed data. It backs
+# the ETags in http_cache.py, the list/search cache keys in cache.py and the freshness
+# check of the in-process search index. Set-based writes that bypass the unit of work
+# (UPDATE/DELETE statements, COPY) must bump it themselves.
+#
+# Lock order: the counter row first, then Products / product_images rows (and the
+# seller/category stats rows their triggers write). Every catalogue write holds the counter
+# row until commit anyway, and the flush hook bumps before the flush writes anything; a
+# writer that touched a product row first and bumped second could deadlock against it. So
+# set-based writes (and FOR UPDATE reads of products) go through write_products() /
+# awrite_products(), which bump and then run the statement, or take lock_version() first
+# when they may not change anything the caches show.
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+PRODUCTS = "products"
+
+_BUMP = text(
+    "UPDATE catalogue_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP "
+    "WHERE name = :name RETURNING version"
+)
+_READ = text("SELECT version, updated_at FROM catalogue_versions WHERE name = :name")
+_LOCK = text("SELECT version FROM catalogue_versions WHERE name = :name FOR UPDATE")
+
+
+def bump_version(db, name: str = PRODUCTS):
+    """Bump the counter inside db's current transaction; returns the new version."""
+    version = db.execute(_BUMP, {"name": name}).scalar()
+    if isinstance(db, Session):
+        db.info[f"{name}_version"] = version
+    return version
+
+
+async def abump_version(db, name: str = PRODUCTS):
+    """bump_version() for an AsyncSession. Call it before touching any product row (see the lock order)."""
+    return await db.run_sync(bump_version, name)
+
+
+def lock_version(db, name: str = PRODUCTS):
+    """Take the counter row's lock without bumping it, for a write that may turn out not to need a bump."""
+    db.execute(_LOCK, {"name": name})
+
+
+async def alock_version(db, name: str = PRODUCTS):
+    """lock_version() for an AsyncSession."""
+    await db.run_sync(lock_version, name)
+
+
+def write_products(db, statement, params=None):
+    """Bump the counter, then run a set-based statement on the catalogue tables: the flush hook's lock order."""
+    bump_version(db)
+    return db.execute(statement, params)
+
+
+async def awrite_products(db, statement, params=None):
+    """write_products() for an AsyncSession."""
+    await abump_version(db)
+    return await db.execute(statement, params)
+
+
+def read_version(db, name: str = PRODUCTS):
+    """(version, updated_at) of the last committed write; (0, None) before migration 4."""
+    row = db.execute(_READ, {"name": name}).first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+
+def written_version(db, name: str = PRODUCTS):
+    """The version bumped by db's last write to the collection, for index/cache updates after commit."""
+    return db.info.get(f"{name}_version")
+
+
+def snapshot(db: Session):
+    # Version and rows read afterwards come from one snapshot, so a body cached under a
+    # version never contains writes from a later one. Must run before any other statement.
+    db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+
+@event.listens_for(Session, "before_flush")
+def _bump_on_product_writes(session, flush_context, instances):
+    from models import Product, ProductImage  # models imports this module
+
+    # Listings embed each product's images, so image rows count as product writes
+    catalogue = (Product, ProductImage)
+    touched = (
+        any(isinstance(obj, catalogue) for obj in session.new)
+        or any(isinstance(obj, catalogue) for obj in session.deleted)
+        or any(isinstance(obj, catalogue) and session.is_modified(obj) for obj in session.dirty)
+    )
+    if touched:
+        bump_version(session)
@@ -0,0 +1,60 @@
+# backend/http_cache.py
+# Conditional GET for the catalogue endpoints.
+#
+# Validators come from versions kept in the database (db/versions.py), never from
+# per-process state, so every instance behind the load balancer hands out the same ETag
+# for the same data and CloudFront/browsers can revalidate against any of them:
+#   list/search  -> the products change counter + the query parameters
+#   detail       -> the row's updated_at
+# A matching If-None-Match (or, without one, If-Modified-Since) gets an empty 304.
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+from config import CATALOGUE_CACHE_CONTROL
+
+
+def make_etag(*parts) -> str:
+    # Weak: the JSON is semantically identical across instances but may be re-encoded
+    # (gzip) on the way out, so byte-for-byte equality is not promised
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _as_utc(value: datetime) -> datetime:
+    # TIMESTAMP columns are naive and written by the database in UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def validators(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": CATALOGUE_CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # RFC 9110: If-None-Match uses weak comparison and takes precedence over If-Modified-Since
+        if if_none_match.strip() == "*":
+            return True
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag.removeprefix("W/") in candidates
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return _as_utc(last_modified).replace(microsecond=0) <= since
+    return False
+
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,47 @@
+# backend/images/gallery.py
+# A product's images (product_images, migration 8) as the API returns them.
+#
+# Endpoints that return many products load the images of the whole page with one query
+# (load_images) and attach them to each product, never one query per product.
+from typing import Dict, Iterable, List
+
+from sqlalchemy import select
+
+from models import ProductImage
+from images.pipeline import public_variants, variant_keys
+
+IMAGE_COLUMNS = (ProductImage.product_id, ProductImage.image_key, ProductImage.image_variants)
+
+
+def load_images(db, product_ids: Iterable[int]) -> Dict[int, List[Dict]]:
+    """{product_id: [{"imageKey", "imageVariants"}, ...] in display order} in one query."""
+    product_ids = list(product_ids)
+    images = {product_id: [] for product_id in product_ids}
+    if not product_ids:
+        return images
+    rows = db.execute(
+        select(*IMAGE_COLUMNS)
+        .where(ProductImage.product_id.in_(product_ids))
+        .order_by(ProductImage.product_id, ProductImage.position)
+    )
+    for product_id, image_key, variants in rows:
+        images[product_id].append({"imageKey": image_key, "imageVariants": public_variants(variants)})
+    return images
+
+
+async def aload_images(db, product_ids: Iterable[int]) -> Dict[int, List[Dict]]:
+    """load_images() for an AsyncSession."""
+    return await db.run_sync(load_images, list(product_ids))
+
+
+def stored_keys(db, product_ids: Iterable[int]) -> List[str]:
+    """Every S3 key the products' images occupy (originals and variants), for the deletion queue."""
+    rows = db.execute(
+        select(ProductImage.image_key, ProductImage.image_variants).where(ProductImage.product_id.in_(list(product_ids)))
+    )
+    return [key for image_key, variants in rows for key in (image_key, *variant_keys(variants))]
+
+
+async def astored_keys(db, product_ids: Iterable[int]) -> List[str]:
+    """stored_keys() for an AsyncSession."""
+    return await db.run_sync(stored_keys, list(product_ids))
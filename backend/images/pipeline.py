@@ -0,0 +1,267 @@
+# backend/images/pipeline.py
+# Renders thumbnails and web-optimised copies of product images.
+#
+# create-product (and an update that changes image_key) calls image_pipeline.submit() for
+# each product_images row after commit. The original is fetched from S3, resized and encoded
+# on a process pool of IMAGE_WORKERS (images/render.py, CPU-bound, so not threads), and every
+# variant is stored at IMAGE_VARIANT_PREFIX<image path>/<size>.<format> with a year-long
+# immutable Cache-Control. The keys go to product_images.image_variants (and, for the cover,
+# Products.image_variants), which the product endpoints return so the grid loads a 320px
+# WebP/AVIF instead of the multi-megabyte upload.
+#
+# Image rows without image_variants are the to-do list (migration 8 indexes it): the pipeline
+# scans it at startup and every IMAGE_BACKFILL_INTERVAL, so images submitted before a restart,
+# or whose S3 calls failed, are picked up again. Two instances may render the same image; the
+# result is the same keys with the same bytes.
+#
+#   python -m images.pipeline --backfill    # render everything outstanding once, e.g. from cron
+import argparse
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from botocore.exceptions import ClientError
+from sqlalchemy import func, select, update
+from starlette.concurrency import run_in_threadpool
+
+from config import (
+    IMAGE_WORKERS, IMAGE_VARIANT_SIZES, IMAGE_FORMATS, IMAGE_QUALITY, IMAGE_VARIANT_PREFIX,
+    IMAGE_BACKFILL_INTERVAL, S3_IMAGE_PREFIX,
+)
+from models import Product, ProductImage, AsyncSessionLocal
+from db.versions import abump_version, alock_version
+from cache import invalidate_product
+from images.render import UNREADABLE, available_formats, parse_sizes, render_variants
+from storage.s3 import s3
+from storage.deletions import aenqueue_deletions, deletion_worker
+import logging
+
+logger = logging.getLogger(__name__)
+
+VARIANT_CACHE_CONTROL = "public, max-age=31536000, immutable"  # a variant's key changes with its image
+
+
+def variant_keys(variants: Optional[Dict]) -> List[str]:
+    """Every S3 key in an image_variants value (nothing for NULL or an error)."""
+    if not variants or "error" in variants:
+        return []
+    return [key for by_format in variants.values() for key in by_format.values()]
+
+
+def public_variants(variants: Optional[Dict]) -> Optional[Dict]:
+    """image_variants as the API returns it: None until rendered, or if rendering failed."""
+    return None if not variants or "error" in variants else variants
+
+
+def variant_key(image_key: str, size: str, fmt: str) -> str:
+    path = image_key.rsplit(".", 1)[0]
+    if path.startswith(S3_IMAGE_PREFIX):
+        path = path[len(S3_IMAGE_PREFIX):]
+    return f"{IMAGE_VARIANT_PREFIX}{path}/{size}.{fmt}"
+
+
+class ImagePipeline:
+    def __init__(self, storage=s3, session_factory=AsyncSessionLocal, workers: int = IMAGE_WORKERS,
+                 sizes: str = IMAGE_VARIANT_SIZES, formats: str = IMAGE_FORMATS, quality: int = IMAGE_QUALITY,
+                 interval: float = IMAGE_BACKFILL_INTERVAL):
+        self.storage = storage
+        self.session_factory = session_factory
+        self.workers = workers
+        self.sizes = parse_sizes(sizes)
+        self.formats = available_formats([f.strip() for f in formats.split(",") if f.strip()])
+        self.quality = quality
+        self.interval = interval
+        self._executor = None
+        self._slots = None  # created in start(), on the serving event loop
+        self._inflight = set()  # image ids being rendered by this process
+        self._tasks = set()
+        self._backfill_task = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.formats and self.sizes)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: forking a process that already runs the event loop, S3 and DB
+            # pool threads can deadlock the child on a lock one of them held
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def render(self, data: bytes) -> Dict[str, Dict[str, bytes]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool(), render_variants, data, self.sizes, self.formats, self.quality)
+
+    async def process(self, image_id: int, product_id: int, image_key: str) -> Optional[Dict]:
+        """Render and store the variants of one product image; returns the saved image_variants."""
+        try:
+            data = await self.storage.get_object_bytes(image_key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+                raise
+            # The browser never finished the upload: record it rather than retry forever
+            return await self._save(image_id, product_id, image_key, {"error": "original not found"})
+
+        try:
+            rendered = await self.render(data)
+        except UNREADABLE as e:  # corrupt, not an image, or a decompression bomb: failed for good
+            logger.warning("Product %s image %s could not be rendered: %s", product_id, image_key, e)
+            return await self._save(image_id, product_id, image_key, {"error": f"unreadable image: {e}"[:200]})
+
+        variants, uploads = {}, []
+        for size, by_format in rendered.items():
+            for fmt, body in by_format.items():
+                key = variant_key(image_key, size, fmt)
+                variants.setdefault(size, {})[fmt] = key
+                uploads.append(self.storage.put_object(key, body, f"image/{fmt}", VARIANT_CACHE_CONTROL))
+        await asyncio.gather(*uploads)
+        return await self._save(image_id, product_id, image_key, variants)
+
+    async def _save(self, image_id: int, product_id: int, image_key: str, variants: Dict) -> Optional[Dict]:
+        async with self.session_factory() as db:
+            # The catalogue version's lock first, as every writer takes it (db/versions.py): this
+            # save may bump it below, and must not hold product rows while waiting for it.
+            # The product's row lock orders the saves of its images, so the last one to finish
+            # sees every other one done (below)
+            await alock_version(db)
+            await db.execute(select(Product.product_id).where(Product.product_id == product_id).with_for_update())
+            # Only if the row still holds this image: it may have been deleted or re-imaged meanwhile
+            result = await db.execute(
+                update(ProductImage)
+                .where(ProductImage.image_id == image_id, ProductImage.image_key == image_key)
+                .values(image_variants=variants)
+            )
+            if result.rowcount:
+                # The cover's copy on Products, if this image is (still) the cover. Otherwise the
+                # row is still touched: its updated_at (trigger) is the product page's ETag, and
+                # that page embeds every image's variants
+                cover = await db.execute(
+                    update(Product)
+                    .where(Product.product_id == product_id, Product.image_key == image_key)
+                    .values(image_variants=variants)
+                )
+                if not cover.rowcount:
+                    await db.execute(
+                        update(Product).where(Product.product_id == product_id).values(updated_at=func.now())
+                    )
+                # Listings embed every image's variants, so their cache keys and ETags move on, but
+                # once per product when its last image is done, not once per image: the version is
+                # one row every writer locks, and each bump invalidates the whole catalogue
+                pending = await db.scalar(
+                    select(ProductImage.image_id)
+                    .where(ProductImage.product_id == product_id, ProductImage.image_variants.is_(None))
+                    .limit(1)
+                )
+                if pending is None:
+                    await abump_version(db)
+            else:
+                await aenqueue_deletions(db, variant_keys(variants))
+            await db.commit()
+        if not result.rowcount:
+            deletion_worker.wake()
+            logger.debug("Product %s no longer has image %s; queued its variants for deletion", product_id, image_key)
+            return None
+        await run_in_threadpool(invalidate_product, product_id)
+        logger.debug("Product %s image variants: %s", product_id, variants)
+        return variants
+
+    async def _run(self, image_id: int, product_id: int, image_key: str):
+        try:
+            async with self._slots:
+                await self.process(image_id, product_id, image_key)
+        except Exception as e:
+            # Left as image_variants IS NULL; the next backfill retries it
+            logger.error("Rendering variants for product %s image %s failed: %s", product_id, image_id, e, exc_info=True)
+        finally:
+            self._inflight.discard(image_id)
+
+    def submit(self, image_id: int, product_id: int, image_key: Optional[str]):
+        """Render in the background; a no-op before start() (the backfill catches it then)."""
+        if not image_key or self._slots is None or image_id in self._inflight:
+            return
+        self._inflight.add(image_id)
+        task = asyncio.create_task(self._run(image_id, product_id, image_key), name=f"image-variants-{image_id}")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def pending(self, after: int = 0, limit: int = 1000):
+        """(image_id, product_id, image_key) of images still without variants, by image_id after `after`."""
+        async with self.session_factory() as db:
+            rows = await db.execute(
+                select(ProductImage.image_id, ProductImage.product_id, ProductImage.image_key)
+                .where(ProductImage.image_variants.is_(None), ProductImage.image_id > after)
+                .order_by(ProductImage.image_id)
+                .limit(limit)
+            )
+            return rows.all()
+
+    async def backfill(self) -> int:
+        """Submit every image still without variants; returns how many were submitted."""
+        submitted, after = 0, 0
+        while rows := await self.pending(after):
+            for image_id, product_id, image_key in rows:
+                if image_id not in self._inflight:
+                    self.submit(image_id, product_id, image_key)
+                    submitted += 1
+            after = rows[-1].image_id
+        if submitted:
+            logger.info("Image pipeline: %d images queued for variants", submitted)
+        return submitted
+
+    async def drain(self):
+        """Wait for every submitted render to finish."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+    def start(self, backfill: bool = True):
+        if not self.enabled:
+            logger.warning("Image pipeline disabled: no encoder for %s (is Pillow installed?)", IMAGE_FORMATS)
+            return
+        # Enough in flight to keep every render process busy while others wait on S3
+        self._slots = asyncio.Semaphore(2 * self.workers)
+        if backfill:
+            self._backfill_task = asyncio.create_task(self._backfill_loop(), name="image-variants-backfill")
+
+    async def stop(self):
+        if self._backfill_task:
+            self._backfill_task.cancel()
+            self._backfill_task = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._slots = None
+
+    async def _backfill_loop(self):
+        while self._slots is not None:  # cleared by stop(), in case its cancel() is swallowed
+            try:
+                await self.backfill()
+            except Exception as e:
+                logger.error("Image pipeline backfill failed: %s", e, exc_info=True)
+            await asyncio.sleep(self.interval)
+
+
+image_pipeline = ImagePipeline()
+
+
+async def _main():
+    image_pipeline.start(backfill=False)
+    if image_pipeline.enabled:
+        submitted = await image_pipeline.backfill()
+        await image_pipeline.drain()
+        left = len(await image_pipeline.pending())
+        print(f"Rendered variants for {submitted - left} images, {left} failed and are left for the next run.")
+    await image_pipeline.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render product image variants")
+    parser.add_argument("--backfill", action="store_true", help="render every image that has no variants yet")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.backfill:
+        asyncio.run(_main())
@@ -0,0 +1,78 @@
+# backend/images/render.py
+# Pure image work for the variant pipeline: bytes in, encoded variants out. Runs in the
+# render processes (images/pipeline.py), so it imports nothing from the app.
+#
+# Pillow is optional: without it (or without its AVIF/WebP codecs) available_formats()
+# returns fewer formats and the pipeline stays off when there are none.
+import warnings
+from io import BytesIO
+from typing import Dict, List
+
+try:
+    from PIL import Image, ImageOps, features
+    # What rendering raises for bytes it will never render: corrupt or not an image, or a
+    # decompression bomb (past Image.MAX_IMAGE_PIXELS). Retrying those only decodes them again
+    UNREADABLE = (OSError, ValueError, Image.DecompressionBombError, Image.DecompressionBombWarning)
+except ImportError:
+    Image = None
+    UNREADABLE = (OSError, ValueError)
+
+# Pillow plugin name and Save options per output format; "speed" trades AVIF encode time for size
+_ENCODERS = {
+    "avif": ("AVIF", {"speed": 8}),
+    "webp": ("WEBP", {"method": 4}),
+    "jpeg": ("JPEG", {"optimize": True, "progressive": True}),
+}
+
+
+def available_formats(wanted: List[str]) -> List[str]:
+    """The formats of `wanted` this Pillow build can encode, in the same order."""
+    if Image is None:
+        return []
+    return [fmt for fmt in wanted if fmt in _ENCODERS and features.check(fmt if fmt != "jpeg" else "jpg")]
+
+
+def parse_sizes(spec: str) -> Dict[str, int]:
+    """'thumb=320,medium=800' -> {"thumb": 320, "medium": 800}"""
+    sizes = {}
+    for part in spec.split(","):
+        if part.strip():
+            name, _, edge = part.partition("=")
+            sizes[name.strip()] = int(edge)
+    return sizes
+
+
+def render_variants(data: bytes, sizes: Dict[str, int], formats: List[str], quality: int) -> Dict[str, Dict[str, bytes]]:
+    """{size: {format: encoded bytes}} for every size (longest edge, never upscaled) and format.
+
+    Raises one of UNREADABLE for data Pillow can't or won't decode.
+    """
+    with warnings.catch_warnings():
+        # Past MAX_IMAGE_PIXELS Pillow only warns (up to twice that): refuse those as well
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        return _render(data, sizes, formats, quality)
+
+
+def _render(data: bytes, sizes: Dict[str, int], formats: List[str], quality: int) -> Dict[str, Dict[str, bytes]]:
+    with Image.open(BytesIO(data)) as original:
+        largest = max(sizes.values())
+        # JPEG only: decode straight at 1/2..1/8 scale when the largest variant allows it,
+        # which is most of the work for a camera photo
+        original.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+        out = {}
+        # Largest first, each size resized from the previous one rather than from the original
+        for name, edge in sorted(sizes.items(), key=lambda item: -item[1]):
+            image = image.copy()
+            image.thumbnail((edge, edge), Image.LANCZOS, reducing_gap=3.0)
+            out[name] = {}
+            for fmt in formats:
+                plugin, options = _ENCODERS[fmt]
+                frame = image.convert("RGB") if fmt == "jpeg" and image.mode != "RGB" else image
+                buffer = BytesIO()
+                frame.save(buffer, plugin, quality=quality, **options)
+                out[name][fmt] = buffer.getvalue()
+        return out
@@ -0,0 +1,122 @@
+# backend/logging_config.py
+# Logging for the API process. main.py calls setup_logging() once, before the routers are
+# imported, and installs RequestLogMiddleware.
+#
+# - Levels: LOG_LEVEL for everything, LOG_LEVELS for per-logger (per-router) overrides.
+# - Sampling: each request is sampled in or out (LOG_SAMPLE_RATE) when it arrives. Records
+#   below WARNING logged while handling an unsampled request are dropped; warnings, errors
+#   and slow requests (LOG_SLOW_REQUEST_MS) always get through.
+# - Format: "text" for humans, "json" for CloudWatch Insights. Fields passed with
+#   extra={...} become JSON keys; every record carries the request id.
+#
+# Handlers log with %-style arguments (logger.info("x=%s", x)), never f-strings, so nothing
+# is formatted for records that are filtered out. Payload dumps go behind
+# logger.isEnabledFor(logging.DEBUG) so they are not even built unless debug is on.
+import contextvars
+import json
+import logging
+import random
+import sys
+import time
+import uuid
+
+from config import LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, LOG_SAMPLE_RATE, LOG_SLOW_REQUEST_MS
+
+access_logger = logging.getLogger("access")
+
+# (request_id, sampled) for the request being handled; None outside requests
+_request_context = contextvars.ContextVar("request_context", default=None)
+
+# LogRecord attributes that are not user-supplied extras
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class RequestContextFilter(logging.Filter):
+    def filter(self, record):
+        context = _request_context.get()
+        if context is None:
+            record.request_id = "-"
+            return True
+        record.request_id, sampled = context
+        return sampled or record.levelno >= logging.WARNING
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _parse_levels(spec: str):
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    root = logging.getLogger()
+    if any(isinstance(f, RequestContextFilter) for h in root.handlers for f in h.filters):
+        return  # already configured (e.g. main imported twice by a reloader)
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.addFilter(RequestContextFilter())
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+
+class RequestLogMiddleware:
+    """Sets the request context for log records and writes one access line per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        request_id = (headers.get(b"x-request-id") or b"").decode("latin-1") or uuid.uuid4().hex[:16]
+        sampled = LOG_SAMPLE_RATE >= 1 or random.random() < LOG_SAMPLE_RATE
+        token = _request_context.set((request_id, sampled))
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            level = logging.WARNING if duration_ms >= LOG_SLOW_REQUEST_MS or status >= 500 else logging.INFO
+            if access_logger.isEnabledFor(level):
+                access_logger.log(
+                    level, "%s %s %s %.1fms", scope["method"], scope["path"], status, duration_ms,
+                    extra={"method": scope["method"], "path": scope["path"], "status": status, "duration_ms": round(duration_ms, 1)},
+                )
+            _request_context.reset(token)
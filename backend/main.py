@@ -1,31 +1,130 @@
 # backend/main.py
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from logging_config import setup_logging, RequestLogMiddleware
+
+# Before the routers are imported, so their module-level loggers log through it
+setup_logging()
 
 # import the routers you defined
 from orders.routes   import router as order_router
 from products.routes import router as product_router
 from search.routes import router as search_router
 from admin.routes    import router as admin_router
+from stats.routes    import router as stats_router
+from db.db import engine, pool_stats
+from db.migrations import migrate
+from cache import cache_stats
+from search.engine import setup_search
+from storage.deletions import deletion_worker, pending_stats
+from images.pipeline import image_pipeline
+from analytics.rollups import rollup_worker
+from auth.jwks import jwks
+from auth.middleware import AuthMiddleware
+from auth.tokens import token_verifier
+from ratelimit import RateLimitMiddleware, ConcurrencyLimitMiddleware, edge_stats
+from metrics import MetricsMiddleware, METRICS_PATH, render as render_metrics
+from db.profiler import SQLProfileMiddleware
+from config import (
+  S3_DELETE_WORKER, IMAGE_PIPELINE, ROLLUP_WORKER, RATE_LIMIT_BACKEND, CONCURRENCY_LIMIT, METRICS_ENABLED, SQL_PROFILE,
+  AUTH_REQUIRED, APP_ENV,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+  # Bring the schema up to date, then pick the search backend, before the first request
+  await run_in_threadpool(migrate, engine)
+  await run_in_threadpool(setup_search)
+  jwks.start()  # loads the signing keys now, then refreshes them in the background
+  if not AUTH_REQUIRED and APP_ENV != "local":
+    logger.warning("AUTH_REQUIRED is off in %s: a request without a bearer token acts as whatever "
+                   "buyer_id/seller_id it sends. Set AUTH_REQUIRED=true (or APP_ENV=local for development).", APP_ENV)
+  if S3_DELETE_WORKER:
+    deletion_worker.start()
+  if IMAGE_PIPELINE:
+    image_pipeline.start()
+  if ROLLUP_WORKER:
+    rollup_worker.start()
+  yield
+  await rollup_worker.stop()
+  await jwks.stop()
+  await image_pipeline.stop()
+  await deletion_worker.stop()
+
 
 app = FastAPI(
   title="AWSBuySell API",
   version="0.1.0",
+  lifespan=lifespan,
 )
 
+# Added innermost first. A request passes CORS, metrics, the access log, load shedding
+# (cheapest, so before token checks), token verification, then the per-caller rate limit
+# (which needs the caller), and the SQL profiler around the routes; metrics, the access log
+# and CORS headers cover every request they reject.
+if SQL_PROFILE:
+  app.add_middleware(SQLProfileMiddleware)
+if RATE_LIMIT_BACKEND != "none":
+  app.add_middleware(RateLimitMiddleware)
+app.add_middleware(AuthMiddleware)
+if CONCURRENCY_LIMIT > 0:
+  app.add_middleware(ConcurrencyLimitMiddleware)
+app.add_middleware(RequestLogMiddleware)
+if METRICS_ENABLED:
+  app.add_middleware(MetricsMiddleware)
 app.add_middleware(
   CORSMiddleware,
   allow_origins=["*"],
   allow_credentials=True,
   allow_methods=["*"],
   allow_headers=["*"],
+  expose_headers=["X-Next-Cursor", "ETag", "Last-Modified", "X-Request-ID", "Retry-After", "X-SQL-Queries", "X-SQL-Time-Ms"],
 )
 
 app.include_router(product_router, prefix="/api/products", tags=["Products"])
 app.include_router(search_router, prefix="/api/search", tags=["Search"])
 app.include_router(order_router,   prefix="/api/orders",  tags=["Orders"])
 app.include_router(admin_router, prefix="/api/admin", tags=["Admin"])
-# In your main.py, right after all include_router() calls:
-import pprint
-pprint.pprint([route.path for route in app.router.routes])
+app.include_router(stats_router, prefix="/api/stats", tags=["Stats"])
+
+# Connection pool usage for this process, scraped to size RDS connections per instance
+@app.get("/api/db/pool", tags=["Health"])
+def get_pool_stats():
+  return pool_stats()
+
+# Product cache hit/miss/eviction counters for this process (or the shared Redis)
+@app.get("/api/cache/stats", tags=["Health"])
+def get_cache_stats():
+  return cache_stats()
+
+# Verified-token LRU hits/misses and the signing keys in use (auth/)
+@app.get("/api/auth/stats", tags=["Health"])
+def get_auth_stats():
+  return {**token_verifier.stats(), "keys": sorted(jwks.keys)}
+
+# Requests rejected by the rate limits (429) and shed under load (503), and those in flight
+@app.get("/api/edge/stats", tags=["Health"])
+async def get_edge_stats():
+  return await edge_stats()
+
+# Images waiting in the S3 deletion queue (storage/deletions.py); a growing backlog or
+# max_attempts means deletes are failing
+@app.get("/api/storage/deletions", tags=["Health"])
+async def get_deletion_queue_stats():
+  return await pending_stats()
+
+# Prometheus scrape target (metrics.py); not under /api, so no rate limit or load shedding
+if METRICS_ENABLED:
+  @app.get(METRICS_PATH, include_in_schema=False)
+  def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+logger.debug("Routes: %s", [route.path for route in app.router.routes])
 # http://localhost:8000/docs
\ No newline at end of file
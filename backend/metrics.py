@@ -0,0 +1,266 @@
+# backend/metrics.py
+# Prometheus metrics for this process, served in the text exposition format on GET /metrics
+# (main.py). Recording is a dict lookup, a bisect and a locked add, so it stays on for every
+# request; prometheus_client isn't needed for that much.
+#
+#   http_request_duration_seconds{method,route,status}   MetricsMiddleware; route is the
+#                                                        template, e.g. /api/products/{id}
+#   http_request_db_seconds / _db_queries{method,route}  SQL time and statements per request
+#                                                        (cursor events in db/db.py)
+#   db_pool_checkout_seconds{pool}, db_pool_timeouts_total  waits for a pooled connection
+#   external_call_duration_seconds{service,operation,outcome}  S3 (storage/s3.py), Stripe
+#
+# Gauges and counters kept elsewhere (pool usage, cache hits) are read at scrape time by
+# functions registered with @collector. Each worker process has its own registry.
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import METRICS_BUCKETS
+import logging
+
+logger = logging.getLogger(__name__)
+
+METRICS_PATH = "/metrics"
+UNMATCHED = "unmatched"  # route label of requests no route handled (404s, rejected before routing)
+LATENCY_BUCKETS = tuple(sorted(float(b) for b in METRICS_BUCKETS.split(",") if b.strip()))
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_metrics: List = []
+_collectors: List[Callable[[], Iterable[Tuple]]] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._child())
+        return child
+
+    def render(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        for values, child in list(self._children.items()):
+            self._render_child(lines, values, child)
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self):
+        return _CounterChild()
+
+    def _render_child(self, lines, values, child):
+        lines.append(f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}")
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # per bucket, not cumulative; the last is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(buckets)
+
+    def _child(self):
+        return _HistogramChild(self.bounds)
+
+    def _render_child(self, lines, values, child):
+        counts, total = child.snapshot()
+        cumulative = 0
+        for bound, count in zip((*self.bounds, math.inf), counts):
+            cumulative += count
+            le = 'le="%s"' % _number(float(bound))
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+
+
+def collector(fn):
+    """Register fn() -> [(name, kind, help, [(labels dict, value), ...]), ...], called per scrape.
+
+    Collectors may share a family name (with different labels); the first help text wins.
+    """
+    _collectors.append(fn)
+    return fn
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _metrics:
+        metric.render(lines)
+    families: Dict[str, Tuple[str, str, List]] = {}
+    for fn in _collectors:
+        try:
+            for name, kind, documentation, samples in fn():
+                families.setdefault(name, (kind, documentation, []))[2].extend(samples)
+        except Exception as e:
+            logger.warning("Metrics collector %s failed: %s", fn.__name__, e)
+    for name, (kind, documentation, samples) in families.items():
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time to respond, by route template and status.", ("method", "route", "status"))
+request_db_seconds = Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request.", ("method", "route"))
+request_db_queries = Histogram(
+    "http_request_db_queries", "SQL statements executed per request.", ("method", "route"), buckets=QUERY_COUNT_BUCKETS)
+pool_checkout = Histogram(
+    "db_pool_checkout_seconds", "Time to get a pooled connection, including pre-ping and new connects.", ("pool",))
+pool_timeouts = Counter(
+    "db_pool_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT.", ("pool",))
+external_call_duration = Histogram(
+    "external_call_duration_seconds", "Calls to AWS and Stripe, by outcome (ok, error, timeout).",
+    ("service", "operation", "outcome"))
+
+
+class RequestStats:
+    """What one request did in the database; filled in by the cursor events in db/db.py."""
+
+    __slots__ = ("queries", "db_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = None  # [(seconds, sql), ...] while db/profiler.py is profiling the request
+
+
+# The request being handled. A mutable object rather than counters in the contextvar, so
+# statements run from threadpool workers (which get a copy of the context) still add to it
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+def current_request() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+@contextmanager
+def request_stats():
+    """The current request's RequestStats, started here (and cleared after) if none is yet."""
+    stats = _request_stats.get()
+    if stats is not None:
+        yield stats
+        return
+    stats = RequestStats()
+    token = _request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_stats.reset(token)
+
+
+@contextmanager
+def timed_call(service: str, operation: str):
+    """Record the duration and outcome of the call made inside the block."""
+    outcome = "error"
+    started = time.perf_counter()
+    try:
+        yield
+        outcome = "ok"
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        raise
+    finally:
+        external_call_duration.labels(service, operation, outcome).observe(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == METRICS_PATH:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with request_stats() as stats:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                elapsed = time.perf_counter() - started
+                # The router leaves the matched route in the scope
+                route = getattr(scope.get("route"), "path", None) or UNMATCHED
+                method = scope["method"]
+                request_duration.labels(method, route, status).observe(elapsed)
+                request_db_seconds.labels(method, route).observe(stats.db_seconds)
+                request_db_queries.labels(method, route).observe(stats.queries)
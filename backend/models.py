@@ -1,23 +1,18 @@
 # backend/models.py
 
-from sqlalchemy import Column, Integer, String, Float, create_engine, TIMESTAMP
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.orm import relationship
-from datetime import datetime
-from config import DATABASE_URL
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Numeric, LargeBinary, ForeignKey, TIMESTAMP, Computed, FetchedValue, Index, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import declarative_base, deferred
+from db.db import engine, SessionLocal, get_db, async_engine, AsyncSessionLocal, get_async_db
+import db.versions  # registers the products change-counter flush hook
 
 Base = declarative_base()
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
-
-def get_db():
-    db: Session = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Weighted full-text document for product search: name ranks above category
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(category, '')), 'B')"
+)
 
 
 class Product(Base):
@@ -27,18 +22,134 @@ class Product(Base):
     name = Column(String, nullable=False)
     category = Column(String)
     price = Column(Float, nullable=False)
-    location = Column(String)
     seller_id = Column(String, nullable=False)
-    seller_rating = Column(Float)
     image_key = Column(String)
-    
+    status = Column(String, server_default=text("'unsold'"))
+    # The cover: a copy of the position-0 row of product_images, so the grid needs no join
+    image_variants = Column(JSONB)
+    # Set by the products_touch_updated_at trigger on every UPDATE (see db/migrations.py)
+    updated_at = Column(TIMESTAMP, nullable=False, server_default=text('CURRENT_TIMESTAMP'), server_onupdate=FetchedValue())
+    # Maintained by PostgreSQL, only read by search queries (deferred so listings never load it)
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)))
+
+    # Created by db/migrations.py; declared here so the metadata matches the database
+    __table_args__ = (
+        Index("ix_products_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_products_category_product_id", "category", "product_id"),
+        Index("ix_products_seller_id_product_id", "seller_id", "product_id"),
+        Index("ix_products_status_product_id", "status", "product_id"),
+        Index("ix_products_price", "price"),
+    )
+
+
 class Transaction(Base):
-        __tablename__ = "transactions" # Matches the table name
-
-        transaction_id = Column(Integer, primary_key=True, index=True) # Primary key
-        buyer_id = Column(String, nullable=False) # Not nullable
-        seller_id = Column(String, nullable=False) # Not nullable
-        # Foreign key linking to the Product table
-        product_id = Column(Integer, ForeignKey("Products.product_id"), nullable=False) # Links to Products.product_id, not nullable
-        status = Column(String) # Status column
-        created_at = Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP')) # Timestamp with default
\ No newline at end of file
+    __tablename__ = "transactions" # Matches the table name
+
+    transaction_id = Column(Integer, primary_key=True, index=True) # Primary key
+    buyer_id = Column(String, nullable=False) # Not nullable
+    seller_id = Column(String, nullable=False) # Not nullable
+    # Foreign key linking to the Product table
+    product_id = Column(Integer, ForeignKey("Products.product_id"), nullable=False) # Links to Products.product_id, not nullable
+    status = Column(String) # Status column
+    created_at = Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP')) # Timestamp with default
+    # Stripe checkout session id; a replayed finalize returns the transaction holding it
+    idempotency_key = Column(String, nullable=True)
+    # The product's price when it sold; what revenue in seller_stats/category_stats sums
+    amount = Column(Float)
+
+    __table_args__ = (
+        Index("ix_transactions_buyer_id_created_at", "buyer_id", "created_at"),
+        Index("ix_transactions_seller_id_created_at", "seller_id", "created_at"),
+        Index("ix_transactions_created_at", "created_at"),
+        Index("ux_transactions_idempotency_key", "idempotency_key", unique=True),
+        Index("ix_transactions_product_id", "product_id"),
+    )
+
+
+class CatalogueVersion(Base):
+    # One row per cached collection ("products"); version is bumped by every write to it
+    __tablename__ = "catalogue_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, server_default=text('0'))
+    updated_at = Column(TIMESTAMP, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
+
+
+class S3Deletion(Base):
+    # An S3 object waiting to be deleted by storage/deletions.py
+    __tablename__ = "s3_deletions"
+
+    key = Column(String, primary_key=True)
+    enqueued_at = Column(TIMESTAMP, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
+    # Earliest next try: the retry backoff after a failure, or the lease while a worker holds it
+    next_attempt_at = Column(TIMESTAMP, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
+    attempts = Column(Integer, nullable=False, server_default=text('0'))
+    last_error = Column(String)
+
+    __table_args__ = (
+        Index("ix_s3_deletions_next_attempt_at", "next_attempt_at"),
+    )
+
+
+class ProductImage(Base):
+    # One image of a product; position 0 is the cover mirrored on Products.image_key
+    __tablename__ = "product_images"
+
+    image_id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("Products.product_id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    image_key = Column(String, nullable=False)
+    # {"thumb": {"webp": key, "avif": key}, ...} once images/pipeline.py has rendered image_key;
+    # {"error": ...} if it can't be; NULL until then
+    image_variants = Column(JSONB)
+
+    __table_args__ = (
+        UniqueConstraint("product_id", "position", name="ux_product_images_product_id_position"),
+        Index("ix_product_images_pending_variants", "image_id", postgresql_where=text("image_variants IS NULL")),
+    )
+
+
+class SellerStats(Base):
+    # Counters maintained by triggers (migration 9, stats/aggregates.py); never written by the ORM
+    __tablename__ = "seller_stats"
+
+    seller_id = Column(String, primary_key=True)
+    active_listings = Column(Integer, nullable=False, server_default=text('0'))
+    listed_value = Column(Numeric, nullable=False, server_default=text('0'))  # sum of active listings' prices
+    sold_count = Column(Integer, nullable=False, server_default=text('0'))
+    revenue = Column(Numeric, nullable=False, server_default=text('0'))
+    updated_at = Column(TIMESTAMP, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
+
+
+class CategoryStats(Base):
+    # As SellerStats, per Products.category ('' for products without one)
+    __tablename__ = "category_stats"
+
+    category = Column(String, primary_key=True)
+    active_listings = Column(Integer, nullable=False, server_default=text('0'))
+    listed_value = Column(Numeric, nullable=False, server_default=text('0'))
+    sold_count = Column(Integer, nullable=False, server_default=text('0'))
+    revenue = Column(Numeric, nullable=False, server_default=text('0'))
+    updated_at = Column(TIMESTAMP, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
+
+
+class TransactionRollup(Base):
+    # Completed transactions of one hour or day in one category (migration 10, analytics/rollups.py)
+    __tablename__ = "transaction_rollups"
+
+    bucket = Column(String(4), primary_key=True)  # "hour" | "day"
+    bucket_start = Column(TIMESTAMP, primary_key=True)
+    category = Column(String, primary_key=True)  # '' for products without one
+    transactions = Column(Integer, nullable=False)
+    gmv = Column(Numeric, nullable=False)
+    buyers = Column(LargeBinary, nullable=False)  # HyperLogLog sketch (analytics/hll.py)
+    sellers = Column(LargeBinary, nullable=False)
+
+
+class RollupWatermark(Base):
+    # How far a rollup has been refreshed: rows created before watermark are folded in
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String, primary_key=True)
+    watermark = Column(TIMESTAMP, nullable=False)
+    refreshed_at = Column(TIMESTAMP, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
@@ -1,132 +1,90 @@
 from fastapi import APIRouter, HTTPException, Depends,Query
 from fastapi.responses import JSONResponse
-from db.db import get_connection # Assuming this provides necessary connection details or objects
 import stripe
-import uuid
-import boto3 # Although imported, boto3 is not used in the provided routes
-import json
-from typing import List, Optional, Dict, Any
-from sqlalchemy import Column, TIMESTAMP, Integer, String, text, Float, create_engine, ForeignKey # Import ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy import and_
+from typing import Optional
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from models import Product, Transaction, get_async_db
+from search.engine import index_product, SEARCH_COLUMNS
+from cache import invalidate_product
+from db.versions import awrite_products, written_version
+from auth.tokens import Identity
+from auth.middleware import get_identity, caller_id
+from metrics import timed_call
 import logging
 
 stripe.api_key = "STRIPE_API"
 
+SOLD = "sold"
+
 router = APIRouter()
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+# Configured centrally by logging_config.setup_logging()
 logger = logging.getLogger(__name__)
 
-# Database setup
-try:
-    # Assuming config.py exists and contains DATABASE_URL
-    from config import DATABASE_URL
-
-    Base = declarative_base()
-
-    # Define the Transaction model
-    class Transaction(Base):
-        __tablename__ = "transactions" # Matches the table name
-
-        transaction_id = Column(Integer, primary_key=True, index=True) # Primary key
-        buyer_id = Column(String, nullable=False) # Not nullable
-        seller_id = Column(String, nullable=False) # Not nullable
-        product_id = Column(Integer, ForeignKey("Products.product_id"), nullable=False) # Links to Products.product_id, not nullable
-        status = Column(String) # Status column
-        created_at = Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP')) # Timestamp with default
-
-    # Define the Product model
-    class Product(Base):
-        __tablename__ = "Products" # Matches the table name
-
-        product_id = Column(Integer, primary_key=True, index=True) # Primary key
-        name = Column(String, nullable=False) # Not nullable
-        category = Column(String) # Category column
-        price = Column(Float, nullable=False) # Not nullable
-        seller_id = Column(String, nullable=False) # Not nullable
-        image_key = Column(String) # Image key column
-        status = Column(String, server_default=text("'unsold'")) # Status with default 'unsold'
-
-    # Create database engine and session factory
-    engine = create_engine(DATABASE_URL)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-    # Dependency to get database session
-    def get_db():
-        db = SessionLocal()
-        try:
-            yield db
-        finally:
-            db.close()
-
-except ImportError as e:
-    logger.error(f"Could not import necessary modules (e.g., config). Error: {e}")
-    # Re-raise the exception to stop the application if config is missing
-    raise
-except Exception as e:
-    logger.error(f"Database setup failed: {e}", exc_info=True)
-    # Re-raise the exception if database setup fails
-    raise
-
 @router.post("/create-checkout-session")
 async def create_checkout_session(
-    buyer_id: str,
     seller_id: str,
     product_id: int,
-    db: Session = Depends(get_db)
+    buyer_id: Optional[str] = None,  # the token's user when there is one
+    identity: Optional[Identity] = Depends(get_identity),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    logger.info(f"Trying to create session - Buyer Id: {buyer_id}, Seller Id: {seller_id}, Product Id: {product_id}")
+    buyer_id = caller_id(identity, buyer_id, "buyer_id")
+    logger.debug("Creating checkout session - buyer_id=%s, seller_id=%s, product_id=%s", buyer_id, seller_id, product_id)
     try:
-        product = db.query(Product).filter(
-            Product.product_id == product_id
-            # Uncomment below line to only allow checkout for unsold items
-            # Product.status == 'unsold'
-        ).first()
+        result = await db.execute(select(Product).filter(Product.product_id == product_id))
+        product = result.scalars().first()
 
         if not product:
-            logger.warning(f"Product {product_id} not found.")
+            logger.warning("Product %s not found.", product_id)
             raise HTTPException(404, "Product not found")
-        # If the status check is commented out, you might want to add a check here
-        # if product.status != 'unsold':
-        #     logger.warning(f"Product {product_id} is not available for purchase (status: {product.status}).")
-        #     raise HTTPException(400, "Product not available for purchase")
+        # Don't take a payment finalize-order would refuse (it still settles races between buyers)
+        if product.status == SOLD:
+            logger.warning("Product %s already sold; no checkout for buyer %s", product_id, buyer_id)
+            raise HTTPException(409, "Product already sold")
 
-
-        logger.info(f"[DEBUG] Found product: {product.name} at price {product.price} at status {product.status}")
+        logger.debug("Found product: %s at price %s at status %s", product.name, product.price, product.status)
 
         # Create Stripe checkout session
         # Ensure product.name is clean and does not contain problematic characters
         # A simple cleaning example (consider more robust methods if needed):
         product_name_safe = ''.join(c for c in product.name if ord(c) < 128 or c in ' .,-') # Keep ASCII, space, comma, period, hyphen
 
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=[{
-                "price_data": {
-                    "currency": "usd",
-                    # Use the potentially cleaned product name
-                    "product_data": {"name": product_name_safe},
-                    "unit_amount": int(product.price * 100),  # Stripe expects amount in cents
-                },
-                "quantity": 1,
-            }],
-            mode="payment",
-            success_url=(
-                # f"https://d2ihswn7xidcr6.cloudfront.net/ordersuccess"
-                # f"?buyer_id={buyer_id}&seller_id={seller_id}&product_id={product_id}"
-                f"http://localhost:5173/ordersuccess"
-                f"?buyer_id={buyer_id}&seller_id={seller_id}&product_id={product_id}"
-            ),
-            cancel_url="http://localhost:5173/ordercancel",
-        )
-
-        logger.info(f"[DEBUG] Stripe session created: {session.url}")
+        # The Stripe SDK is blocking, so run it off the event loop
+        with timed_call("stripe", "checkout.Session.create"):
+            session = await run_in_threadpool(
+                stripe.checkout.Session.create,
+                payment_method_types=["card"],
+                line_items=[{
+                    "price_data": {
+                        "currency": "usd",
+                        # Use the potentially cleaned product name
+                        "product_data": {"name": product_name_safe},
+                        "unit_amount": int(product.price * 100),  # Stripe expects amount in cents
+                    },
+                    "quantity": 1,
+                }],
+                mode="payment",
+                success_url=(
+                    # f"https://d2ihswn7xidcr6.cloudfront.net/ordersuccess"
+                    # f"?buyer_id={buyer_id}&seller_id={seller_id}&product_id={product_id}"
+                    f"http://localhost:5173/ordersuccess"
+                    f"?buyer_id={buyer_id}&seller_id={seller_id}&product_id={product_id}"
+                    # Filled in by Stripe; finalize-order uses it as the idempotency key
+                    f"&session_id={{CHECKOUT_SESSION_ID}}"
+                ),
+                cancel_url="http://localhost:5173/ordercancel",
+            )
+
+        logger.info("Stripe checkout session created for product %s", product_id)
         return JSONResponse({"checkout_url": session.url})
 
-    except Exception as e:
+    except HTTPException:
+        raise
+    except Exception:
         logger.error("[ERROR creating checkout session]:", exc_info=True)
         # Provide a generic error message to the client for security
         raise HTTPException(500, "Failed to create Stripe checkout session")
@@ -138,49 +96,92 @@ async def create_checkout_session(
 
 @router.post("/finalize-order")
 async def finalize_order(
-    buyer_id: str,
-    seller_id: str,
     product_id: int,
-    db: Session = Depends(get_db)
+    seller_id: Optional[str] = Query(None, description="Optional; must match the product's seller, who is credited with the sale"),
+    buyer_id: Optional[str] = None,
+    session_id: Optional[str] = Query(None, description="Stripe checkout session id; retries with the same id return the original transaction"),
+    identity: Optional[Identity] = Depends(get_identity),
+    db: AsyncSession = Depends(get_async_db)
 ):
+    buyer_id = caller_id(identity, buyer_id, "buyer_id")
     try:
-        # Check if product is available (status is 'unsold')
-        product = db.query(Product).filter(
-            and_(Product.product_id == product_id)
-        ).first()
+        # A retried OrderSuccess page gets the sale it already made
+        existing = await _transaction_for_session(db, session_id)
+        if existing:
+            return _replayed(existing, product_id)
+
+        # Claim the product with one conditional UPDATE: however many buyers race, exactly
+        # one gets the row back, and its row lock is held until the sale below commits.
+        # awrite_products bumps the catalogue version first, the order every writer locks in
+        claimed = (await awrite_products(
+            db,
+            update(Product)
+            .where(Product.product_id == product_id, or_(Product.status.is_(None), Product.status != SOLD))
+            .values(status=SOLD)
+            .returning(*SEARCH_COLUMNS)
+        )).first()
+        if claimed is None:
+            await db.rollback()
+            # Lost the race - possibly to a concurrent retry of this same session
+            existing = await _transaction_for_session(db, session_id)
+            if existing:
+                return _replayed(existing, product_id)
+            if await db.get(Product, product_id) is None:
+                logger.warning("Product %s not found.", product_id)
+                raise HTTPException(404, "Product not found")
+            logger.warning("Product %s already sold; rejected finalize for buyer %s (session %s)", product_id, buyer_id, session_id)
+            raise HTTPException(409, "Product already sold")
+        if seller_id and seller_id != claimed.seller_id:
+            # The sale (and the seller stats triggers) go to the product's seller, never the client's pick
+            await db.rollback()
+            logger.warning("Finalize for product %s named seller %s, but it belongs to %s", product_id, seller_id, claimed.seller_id)
+            raise HTTPException(400, "seller_id does not match the product's seller")
 
-        if not product:
-            logger.warning(f"Product {product_id} not found or not available for sale.")
-            raise HTTPException(404, "Product not available or already sold")
-
-        # Create a new transaction
         transaction = Transaction(
             buyer_id=buyer_id,
-            seller_id=seller_id,
+            seller_id=claimed.seller_id,
             product_id=product_id,
-            status='completed' # Set status to completed
+            status='completed', # Set status to completed
+            idempotency_key=session_id,
+            amount=claimed.price,  # the price it sold at, whatever the listing says later
         )
         db.add(transaction)
-        db.commit() # Commit the new transaction first
-        logger.info(f"Transaction created: {transaction.transaction_id}")
-        db.refresh(transaction) # Refresh the transaction object to get its ID and creation time
-
-        # Update the product status to 'sold'
-        product.status = 'sold'
-        logger.info(f"Updating product {product_id} status to 'sold'")
-        # --- ADDED: Commit the product status change to the database ---
-        db.commit()
-        logger.info(f"Product {product_id} status committed to 'sold'")
-        db.refresh(product) # Optional: Refresh the product object from the DB after commit
+        await db.commit() # Product status and transaction commit together
+        logger.info("Transaction %s created; product %s marked as sold", transaction.transaction_id, product_id)
+        index_product(claimed, written_version(db))
+        await run_in_threadpool(invalidate_product, product_id)
 
         return {"message": "✅ Order completed and product marked as sold.", "transaction_id": transaction.transaction_id}
 
-    except Exception as e:
+    except HTTPException:
+        raise
+    except IntegrityError:
+        # The session id was committed by a concurrent request for a different product
+        await db.rollback()
+        existing = await _transaction_for_session(db, session_id)
+        if existing:
+            return _replayed(existing, product_id)
+        raise HTTPException(500, "Failed to finalize order")
+    except Exception:
         logger.error("[ERROR in finalize_order]:", exc_info=True)
-        db.rollback() # Rollback changes in case of error
+        await db.rollback() # Rollback changes in case of error
         # Provide a generic error message to the client for security
         raise HTTPException(500, "Failed to finalize order")
 
+
+async def _transaction_for_session(db: AsyncSession, session_id: Optional[str]) -> Optional[Transaction]:
+    if not session_id:
+        return None
+    result = await db.execute(select(Transaction).where(Transaction.idempotency_key == session_id))
+    return result.scalars().first()
+
+
+def _replayed(transaction: Transaction, product_id: int):
+    if transaction.product_id != product_id:
+        raise HTTPException(409, "Checkout session already used for another product")
+    logger.info("Replayed finalize for session %s: transaction %s", transaction.idempotency_key, transaction.transaction_id)
+    return {"message": "✅ Order completed and product marked as sold.", "transaction_id": transaction.transaction_id}
+
 # -------------------------------
 # GET USER ORDERS
 # -------------------------------
@@ -190,16 +191,15 @@ async def get_user_orders(
     buyer_id: str = Query(None),
     seller_id: str = Query(None),
     userRole: str = Query(...),
-    db: Session = Depends(get_db)
+    identity: Optional[Identity] = Depends(get_identity),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    print("----- DEBUG START -----")
-    print("User Role:", userRole)
-    print("Buyer ID:", buyer_id)
-    print("Seller ID:", seller_id)
+    if identity is not None or buyer_id:
+        buyer_id = caller_id(identity, buyer_id, "buyer_id")  # both roles look orders up by buyer_id
+    logger.debug("get_user_orders userRole=%s buyer_id=%s seller_id=%s", userRole, buyer_id, seller_id)
 
     try:
-        print("Setting up base query...")
-        query = db.query(
+        query = select(
             Transaction.transaction_id,
             Transaction.created_at,
             Product.name,
@@ -209,26 +209,22 @@ async def get_user_orders(
         ).join(Product, Transaction.product_id == Product.product_id)
 
         if userRole == "buyer":
-            print("User is a buyer. Applying buyer_id filter...")
             if not buyer_id:
                 raise HTTPException(status_code=400, detail="buyer_id is required for userRole='buyer'")
-            query = query.filter(Transaction.buyer_id == buyer_id)
+            query = query.where(Transaction.buyer_id == buyer_id)
 
         elif userRole == "seller":
-            print("User is a seller. Applying seller_id filter...")
-            query = query.filter(Transaction.seller_id == buyer_id)
+            query = query.where(Transaction.seller_id == buyer_id)
 
         else:
-            print("Invalid userRole provided.")
             raise HTTPException(status_code=400, detail="Invalid userRole. Must be 'buyer' or 'seller'.")
 
-        print("Executing query to fetch orders...")
-        orders = query.order_by(Transaction.created_at.desc()).all()
-        print(f"Total orders fetched: {len(orders)}")
+        result = await db.execute(query.order_by(Transaction.created_at.desc()))
+        orders = result.all()
+        logger.debug("Total orders fetched: %d", len(orders))
 
         results = []
         for order in orders:
-            print("Fetched Order:", order)
             results.append({
                 "transaction_id": order.transaction_id,
                 "created_at": order.created_at,
@@ -238,12 +234,11 @@ async def get_user_orders(
                 "status": order.status
             })
 
-        print("Returning response.")
-        print("----- DEBUG END -----")
         return results
 
-    except Exception as e:
-        print("[EXCEPTION OCCURRED]", str(e))
+    except HTTPException:
+        raise  # the 400s above, not a server error
+    except Exception:
         logger.error("[ERROR in get_user_orders]:", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to fetch orders")
 
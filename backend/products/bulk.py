@@ -0,0 +1,191 @@
+# backend/products/bulk.py
+# Bulk product import and seller catalogue export.
+#
+# import_products() reads a CSV or NDJSON upload row by row, validates each row and inserts
+# the valid ones IMPORT_BATCH_SIZE at a time: one multi-row INSERT ... RETURNING for the
+# products, one for their product_images, one catalogue version bump and one commit per
+# batch, instead of a request, a commit and a refresh per product. Invalid rows are reported
+# and skipped; a batch the database rejects is reported row by row and the import goes on.
+#
+# Rows have the columns export_products() writes, so an export can be imported again:
+#   name (required), category, price (required, >= 0), image_keys ("|"-separated in CSV,
+#   a list in NDJSON; the first is the cover). product_id and status are ignored on import.
+import csv
+import io
+import json
+import math
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from config import IMPORT_BATCH_SIZE, IMPORT_MAX_ERRORS, EXPORT_BATCH_SIZE, UPLOAD_MAX_FILES
+from models import Product, ProductImage, SessionLocal
+from db.versions import write_products
+from search.engine import SEARCH_COLUMNS
+from images.gallery import load_images
+import logging
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ["product_id", "name", "category", "price", "status", "image_keys"]
+KEY_SEPARATOR = "|"
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, fmt: str) -> Iterator[Tuple[int, Dict]]:
+    """(line number, raw record) for every row of a binary CSV/NDJSON stream, without reading it all."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_no, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            record = RowError(f"invalid JSON: {e}")
+        yield line_no, record
+
+
+def validate(record, seller_id: str) -> Dict:
+    """The Products values for one record; raises RowError saying what is wrong with it."""
+    if isinstance(record, RowError):
+        raise record
+    if not isinstance(record, dict):
+        raise RowError("expected an object")
+    name = str(record.get("name") or "").strip()
+    if not name:
+        raise RowError("name is required")
+    try:
+        price = float(record.get("price"))
+    except (TypeError, ValueError):
+        raise RowError(f"invalid price: {record.get('price')!r}")
+    if not math.isfinite(price) or price < 0:
+        raise RowError(f"invalid price: {record.get('price')!r}")
+    category = str(record.get("category") or "").strip() or None
+
+    keys = record.get("image_keys") or []
+    if isinstance(keys, str):
+        keys = keys.split(KEY_SEPARATOR)
+    if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+        raise RowError("image_keys must be a list of strings")
+    keys = [key.strip() for key in keys if key.strip()]
+    if len(keys) > UPLOAD_MAX_FILES:
+        raise RowError(f"at most {UPLOAD_MAX_FILES} images per product")
+
+    return {"name": name, "category": category, "price": price, "seller_id": seller_id,
+            "image_key": keys[0] if keys else None, "status": "unsold", "image_keys": keys}
+
+
+def insert_batch(db: Session, batch: List[Dict]):
+    """Insert validated rows in one transaction; returns (search rows, [(image_id, product_id, key)])."""
+    # Core INSERTs on the tables (the ORM bulk layer costs as much as the database here);
+    # sort_by_parameter_order: RETURNING rows line up with batch, so images find their product.
+    # The flush hook doesn't see them, so the version is bumped here, first (db/versions.py)
+    products = write_products(
+        db,
+        insert(Product.__table__).returning(*SEARCH_COLUMNS, sort_by_parameter_order=True),
+        [{k: v for k, v in row.items() if k != "image_keys"} for row in batch],
+    ).all()
+    images = [
+        {"product_id": product.product_id, "position": position, "image_key": key}
+        for product, row in zip(products, batch)
+        for position, key in enumerate(row["image_keys"])
+    ]
+    renders = []
+    if images:
+        renders = db.execute(
+            insert(ProductImage.__table__).returning(ProductImage.image_id, ProductImage.product_id, ProductImage.image_key),
+            images,
+        ).all()
+    db.commit()
+    return products, renders
+
+
+def import_products(db: Session, stream, fmt: str, seller_id: str, batch_size: Optional[int] = None,
+                    on_commit: Optional[Callable] = None) -> Dict:
+    """Import every valid row of stream for seller_id; returns the report the endpoint sends.
+
+    on_commit(products, renders) runs after each batch commits, with insert_batch()'s result.
+    """
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    report = {"imported": 0, "failed": 0, "errors": []}
+
+    def fail(line_no, error):
+        report["failed"] += 1
+        if len(report["errors"]) < IMPORT_MAX_ERRORS:
+            report["errors"].append({"row": line_no, "error": error})
+
+    def flush(batch):
+        try:
+            products, renders = insert_batch(db, [row for _, row in batch])
+        except Exception as e:
+            db.rollback()
+            logger.warning("Import batch of rows %s-%s failed: %s", batch[0][0], batch[-1][0], e)
+            for line_no, _ in batch:
+                fail(line_no, f"database error: {getattr(e, 'orig', e)}"[:200])
+            return
+        report["imported"] += len(products)
+        if on_commit:
+            on_commit(products, renders)
+
+    batch = []
+    for line_no, record in read_rows(stream, fmt):
+        try:
+            batch.append((line_no, validate(record, seller_id)))
+        except RowError as e:
+            fail(line_no, str(e))
+            continue
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    logger.info("Imported %d products for seller %s (%d rows failed)", report["imported"], seller_id, report["failed"])
+    return report
+
+
+def _export_records(db: Session, seller_id: str) -> Iterator[List[Dict]]:
+    # Server-side cursor in EXPORT_BATCH_SIZE batches, with one product_images query per batch
+    rows = db.execute(
+        select(Product.product_id, Product.name, Product.category, Product.price, Product.status)
+        .where(Product.seller_id == seller_id)
+        .order_by(Product.product_id)
+        .execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+    )
+    for batch in rows.partitions():
+        images = load_images(db, [row.product_id for row in batch])
+        yield [
+            {**row._asdict(), "image_keys": [image["imageKey"] for image in images[row.product_id]]}
+            for row in batch
+        ]
+
+
+def export_products(seller_id: str, fmt: str) -> Iterable[str]:
+    """A seller's whole catalogue as CSV or NDJSON chunks, for a StreamingResponse."""
+    # Runs in the threadpool and owns its session: the request's may close before the body is done
+    db = SessionLocal()
+    try:
+        if fmt == "ndjson":
+            for batch in _export_records(db, seller_id):
+                yield "".join(json.dumps(record) + "\n" for record in batch)
+            return
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, FIELDS, lineterminator="\n")
+        writer.writeheader()
+        for batch in _export_records(db, seller_id):
+            for record in batch:
+                writer.writerow({**record, "image_keys": KEY_SEPARATOR.join(record["image_keys"])})
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    finally:
+        db.close()
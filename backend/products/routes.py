@@ -1,107 +1,135 @@
+import mimetypes
 import uuid
-import boto3
 import json # Import the json module
+from datetime import datetime
 from typing import List, Optional, Dict
 # Make sure Request is imported from fastapi
-from fastapi import APIRouter, HTTPException, Depends, Form, Body, Request
-from fastapi import UploadFile, File, Form
-from sqlalchemy import Column, Integer, String, Float, text,create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from fastapi import APIRouter, HTTPException, Depends, Form, Request
+from fastapi import UploadFile, File, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, update, delete, exists, or_
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 # Assuming config.py is in the same directory or accessible via PYTHONPATH
-from config import AWS_REGION, AWS_S3_BUCKET, DATABASE_URL
+from config import AWS_REGION, AWS_S3_BUCKET, PRODUCTS_PAGE_SIZE, PRODUCTS_MAX_PAGE_SIZE, EXPORT_BATCH_SIZE
+from config import S3_IMAGE_PREFIX, UPLOAD_URL_EXPIRES, UPLOAD_MAX_FILES, UPLOAD_MAX_BYTES, BULK_MAX_PRODUCTS
+from models import Product, ProductImage, Transaction, SessionLocal, get_db, get_async_db
+from search.engine import index_product, unindex_product, SEARCH_COLUMNS
+from cache import get_or_load, product_key, catalogue_key, invalidate_product
+from db.versions import read_version, snapshot, written_version, abump_version, awrite_products
+from http_cache import make_etag, validators, is_not_modified, not_modified
+from starlette.concurrency import run_in_threadpool
+from anyio import from_thread
+from storage.s3 import s3
+from storage.deletions import aenqueue_deletions, deletion_worker
+from images.pipeline import image_pipeline, public_variants, variant_keys
+from images.gallery import load_images, aload_images, astored_keys
+from products.bulk import import_products, export_products
+from auth.tokens import Identity
+from auth.middleware import get_identity, caller_id
 import logging # Use logging module
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configured centrally by logging_config.setup_logging(); LOG_LEVELS=products.routes=DEBUG for payloads
 logger = logging.getLogger(__name__)
 
 
 router = APIRouter()
-logger.info(f"AWS region: {AWS_REGION}")
-logger.info(f"S3 bucket: {AWS_S3_BUCKET}")
-logger.info(f"Database Url: {DATABASE_URL}")
+logger.info("AWS region: %s", AWS_REGION)
+logger.info("S3 bucket: %s", AWS_S3_BUCKET)
 
-# --- Database setup (remains the same) ---
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# --- S3 client (remains the same) ---
-s3 = boto3.client("s3", region_name=AWS_REGION)
+# --- Endpoints ---
 
-# --- Models (remains the same) ---
-class Product(Base):
-    __tablename__ = "Products"
-    # Define your columns matching the create_product parameters
-    product_id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=False)
-    category = Column(String) # Consider adding description if needed
-    price = Column(Float, nullable=False)
-    seller_id = Column(String, nullable=False)  # <-- change Integer ➔ String
-    image_key = Column(String)
-    status     = Column(String, server_default=text("'unsold'"))
-    # quantity = Column(Integer) # Add if you want to store quantity
 
+def _image_content_type(filename: str) -> str:
+    # What the browser will send as Content-Type (image/jpeg for .jpg), which the signature covers
+    ext = filename.split('.')[-1]
+    content_type = mimetypes.guess_type(filename)[0] or f'image/{ext.lower()}'
+    if not content_type.startswith('image/'):
+        raise HTTPException(400, f"{filename} is not an image")
+    return content_type
 
-Base.metadata.create_all(bind=engine) # Creates the table if it doesn't exist
 
-# --- Endpoints ---
+def _image_key(filename: str, prefix: str = S3_IMAGE_PREFIX) -> str:
+    ext = filename.split('.')[-1]
+    return f"{prefix}{uuid.uuid4()}.{ext}" # Define the key structure in S3
 
 
 @router.get('/upload-url')
-def get_upload_url(filename: str) -> Dict[str, str]:
-    logger.info(f"Received request for upload URL for filename: {filename}")
+async def get_upload_url(filename: str) -> Dict[str, str]:
+    logger.debug("Received request for upload URL for filename: %s", filename)
+    content_type = _image_content_type(filename)
     try:
-        ext = filename.split('.')[-1]
-        key = f"products/{uuid.uuid4()}.{ext}" # Define the key structure in S3
-        logger.info(f"Generated S3 key: {key}")
-        upload_url = s3.generate_presigned_url(
-            'put_object',
-            Params={'Bucket': AWS_S3_BUCKET, 'Key': key, 'ContentType': f'image/{ext}'}, # Add ContentType for direct browser upload
-            ExpiresIn=3600 # URL valid for 1 hour
-        )
-        logger.info(f"Generated presigned URL successfully for key: {key}")
+        key = _image_key(filename)
+        logger.debug("Generated S3 key: %s", key)
+        # ContentType for direct browser upload
+        upload_url = await s3.presigned_put_url(key, content_type, expires_in=UPLOAD_URL_EXPIRES)
+        logger.debug("Generated presigned URL successfully for key: %s", key)
         return {"upload_url": upload_url, "key": key}
     except Exception as e:
-        logger.error(f"Error generating presigned URL: {e}", exc_info=True)
+        logger.error("Error generating presigned URL: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Could not generate upload URL")
 
 
+@router.get('/upload-urls')
+async def get_upload_urls(
+    filename: List[str] = Query(..., description="repeat once per image"),
+    mode: str = Query("put", pattern="^(put|post)$"),
+) -> Dict:
+    """Upload targets for all of a listing's images in one round trip.
+
+    mode=put:  {"uploads": [{filename, key, content_type, upload_url}]}, one presigned PUT each.
+    mode=post: {"url", "fields", "max_bytes", "uploads": [{filename, key, content_type}]}, a
+               single POST policy shared by every upload; S3 rejects keys outside this batch,
+               non-image content types and bodies over max_bytes.
+    """
+    if len(filename) > UPLOAD_MAX_FILES:
+        raise HTTPException(400, f"At most {UPLOAD_MAX_FILES} images per request")
+    # Validate every name before signing anything
+    content_types = [_image_content_type(name) for name in filename]
+    try:
+        if mode == "put":
+            keys = [_image_key(name) for name in filename]
+            urls = await s3.presigned_put_urls(list(zip(keys, content_types)), expires_in=UPLOAD_URL_EXPIRES)
+            uploads = [
+                {"filename": name, "key": key, "content_type": content_type, "upload_url": url}
+                for name, key, content_type, url in zip(filename, keys, content_types, urls)
+            ]
+            return {"uploads": uploads}
+
+        prefix = f"{S3_IMAGE_PREFIX}{uuid.uuid4()}/"
+        policy = await s3.presigned_post(prefix, UPLOAD_MAX_BYTES, expires_in=UPLOAD_URL_EXPIRES)
+        fields = {k: v for k, v in policy["fields"].items() if k != "key"}  # each upload sends its own key
+        uploads = [
+            {"filename": name, "key": _image_key(name, prefix), "content_type": content_type}
+            for name, content_type in zip(filename, content_types)
+        ]
+        return {"url": policy["url"], "fields": fields, "max_bytes": UPLOAD_MAX_BYTES, "uploads": uploads}
+    except Exception as e:
+        logger.error("Error generating presigned upload targets: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Could not generate upload URLs")
+
+
 @router.post('/create-product')
-# Add Request to access raw request data for debugging
 async def create_product(
-    request: Request, # Inject Request object
     name: str = Form(...),
     category: Optional[str] = Form(None),
     price: float = Form(...),
-    seller_id: str = Form(...),
+    seller_id: Optional[str] = Form(None),  # the token's user when there is one
     image_keys: List[str] = Form([]),
-    db: Session = Depends(get_db)
+    identity: Optional[Identity] = Depends(get_identity),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict[str, int]:
-    # --- Debugging: Log Headers and Form Data ---
-    print("--- Received request for /create-product ---")
-    logger.info(f"Headers: {request.headers}")
-    try:
-        # Reading the form data here for logging *before* validation
-        form_data = await request.form()
-        logger.info(f"Raw Form Data Received: {form_data}")
-    except Exception as e:
-        logger.error(f"Error reading raw form data: {e}")
-    # --- End Debugging ---
-
-    logger.info(f"Validated Form Data: name={name}, category={category}, price={price}, seller_id={seller_id}, image_keys={image_keys}")
+    seller_id = caller_id(identity, seller_id)
+    logger.debug("Validated form data: name=%s, category=%s, price=%s, seller_id=%s, image_keys=%s",
+                 name, category, price, seller_id, image_keys)
+    image_keys = [key for key in image_keys if key]
+    if len(image_keys) > UPLOAD_MAX_FILES:
+        raise HTTPException(400, f"At most {UPLOAD_MAX_FILES} images per product")
 
     try:
+        # The first image is the cover, copied onto the product for the grid
         image_key_to_save = image_keys[0] if image_keys else None
-        logger.info(f"Using image key for DB: {image_key_to_save}")
+        logger.debug("Using image key for DB: %s", image_key_to_save)
 
         product = Product(
             name=name,
@@ -112,125 +140,319 @@ async def create_product(
             status="unsold"
         )
         db.add(product)
-        db.commit()
-        db.refresh(product)
-        logger.info(f"Successfully created product with ID: {product.product_id}")
+        await db.flush()
+        images = [ProductImage(product_id=product.product_id, position=i, image_key=key)
+                  for i, key in enumerate(image_keys)]
+        db.add_all(images)
+        await db.flush()
+        renders = [(image.image_id, image.image_key) for image in images]
+        await db.commit()
+        await db.refresh(product)
+        index_product(product, written_version(db))
+        await run_in_threadpool(invalidate_product, product.product_id)
+        for image_id, image_key in renders:
+            image_pipeline.submit(image_id, product.product_id, image_key)
+        logger.info("Created product %s", product.product_id)
         return {"product_id": product.product_id}
     except Exception as e:
-        logger.error(f"Error creating product in DB: {e}", exc_info=True)
-        db.rollback()
+        logger.error("Error creating product in DB: %s", e, exc_info=True)
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Failed to create product in database.")
 
 
+_BULK_FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", "text/csv": "csv", "application/x-ndjson": "ndjson"}
+
+
+def _upload_format(file: UploadFile) -> str:
+    ext = "." + (file.filename or "").rsplit(".", 1)[-1].lower()
+    fmt = _BULK_FORMATS.get(ext) or _BULK_FORMATS.get(file.content_type or "")
+    if not fmt:
+        raise HTTPException(400, "Upload a .csv or .ndjson file, or pass format=csv|ndjson")
+    return fmt
+
+
+def _submit_renders(product_renders):
+    for image_id, product_id, image_key in product_renders:
+        image_pipeline.submit(image_id, product_id, image_key)
+
+
+@router.post('/import')
+def import_product_file(
+    file: UploadFile = File(..., description="CSV with a header row, or NDJSON: name, category, price, image_keys"),
+    seller_id: Optional[str] = Form(None),
+    fmt: Optional[str] = Query(None, alias="format", pattern="^(csv|ndjson)$", description="Default: from the file name"),
+    identity: Optional[Identity] = Depends(get_identity),
+    db: Session = Depends(get_db),
+) -> Dict:
+    seller_id = caller_id(identity, seller_id)
+    # Sync, so parsing and the batched INSERTs run in the threadpool, off the event loop
+    fmt = fmt or _upload_format(file)
+    logger.debug("Importing %s (%s) for seller %s", file.filename, fmt, seller_id)
+
+    def on_commit(products, renders):
+        version = written_version(db)
+        for product in products:
+            index_product(product, version)
+        if renders:
+            # submit() schedules tasks, so it runs on the event loop
+            from_thread.run_sync(_submit_renders, renders)
+
+    return import_products(db, file.file, fmt, seller_id, on_commit=on_commit)
+
+
+@router.get('/export')
+def export_product_file(
+    seller_id: str,
+    fmt: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+):
+    # Streams the seller's whole catalogue in the format /import reads
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="products.{fmt}"'}
+    return StreamingResponse(export_products(seller_id, fmt), media_type=media_type, headers=headers)
+
+
+# Only the columns the listing needs, so rows come back as tuples instead of ORM objects
+LISTING_COLUMNS = (
+    Product.product_id,
+    Product.name,
+    Product.price,
+    Product.status,
+    Product.category,
+    Product.image_key,
+    Product.image_variants,
+    Product.seller_id,
+)
+
+
+def _listing_query(category: Optional[str], after: Optional[int]):
+    query = select(*LISTING_COLUMNS).order_by(Product.product_id)
+    if category:
+        query = query.where(Product.category == category)
+    if after is not None:
+        query = query.where(Product.product_id > after)
+    return query
+
+
+def _listing_dict(p, images: List[Dict]) -> Dict:
+    return {
+        # Map DB model fields to frontend expectations
+        "ProductID": p.product_id,
+        "title": p.name,
+        "price": p.price,
+        "status":p.status,
+        # Assuming quantity is not in DB, or default to 1. Add DB column if needed.
+        "quantity": 1,
+        # Mapping category to description for now. Add description column to DB if needed.
+        "description": p.category,
+        "imageKey": p.image_key,
+        # {"thumb": {"avif": key, "webp": key}, "medium": {...}}, or null until rendered
+        "imageVariants": public_variants(p.image_variants),
+        # Every image in display order, the cover first: [{"imageKey", "imageVariants"}, ...]
+        "images": images,
+        "seller_id": p.seller_id # Include seller_id for frontend checks/actions
+    }
+
+
+def _listing_dicts(db, rows) -> List[Dict]:
+    # One product_images query for the whole batch, not one per product
+    images = load_images(db, [row.product_id for row in rows])
+    return [_listing_dict(row, images[row.product_id]) for row in rows]
+
+
+def _stream_listing(category: Optional[str], after: Optional[int], fmt: str):
+    # Runs in the threadpool (sync generator). Owns its session because the request's
+    # dependencies may be torn down before the body has finished streaming.
+    db = SessionLocal()
+    try:
+        # stream_results + yield_per => psycopg2 server-side (named) cursor, fetched in batches;
+        # each batch's images come from one more query on the same transaction
+        rows = db.execute(
+            _listing_query(category, after).execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+        )
+        batches = (_listing_dicts(db, batch) for batch in rows.partitions())
+        if fmt == "ndjson":
+            for batch in batches:
+                yield "".join(json.dumps(item) + "\n" for item in batch)
+        else:
+            yield "["
+            first = True
+            for batch in batches:
+                for item in batch:
+                    yield ("" if first else ",") + json.dumps(item)
+                    first = False
+            yield "]"
+    finally:
+        db.close()
+
+
 @router.get('/')
 def list_products(
+    request: Request,
+    response: Response,
     category: Optional[str] = None,
+    limit: int = Query(PRODUCTS_PAGE_SIZE, ge=1, le=PRODUCTS_MAX_PAGE_SIZE, description="Page size"),
+    after: Optional[int] = Query(None, description="Cursor: only products with a product_id greater than this (use the X-Next-Cursor header of the previous page)"),
+    stream: Optional[str] = Query(None, pattern="^(ndjson|json)$", description="Stream every matching product (ignores limit) as NDJSON or a JSON array"),
     db: Session = Depends(get_db)
 ) -> List[Dict]:
-    logger.info(f"Received request for list_products with category: {category}")
+    logger.debug("list_products category=%s after=%s limit=%s stream=%s", category, after, limit, stream)
+    if stream:
+        media_type = "application/x-ndjson" if stream == "ndjson" else "application/json"
+        return StreamingResponse(_stream_listing(category, after, stream), media_type=media_type)
     try:
-        query = db.query(Product)
-        if category:
-            logger.info(f"Filtering by category: {category}")
-            query = query.filter(Product.category == category)
-        products = query.all()
-        logger.info(f"Found {len(products)} products.")
-        result_list = [
-            {
-                # Map DB model fields to frontend expectations
-                "ProductID": p.product_id,
-                "title": p.name,
-                "price": p.price,
-                "status":p.status,
-                # Assuming quantity is not in DB, or default to 1. Add DB column if needed.
-                "quantity": 1,
-                # Mapping category to description for now. Add description column to DB if needed.
-                "description": p.category,
-                "imageKey": p.image_key,
-                "seller_id": p.seller_id # Include seller_id for frontend checks/actions
+        snapshot(db)
+        version, changed_at = read_version(db)
+        etag = make_etag("list", version, category, after, limit)
+        headers = validators(etag, changed_at)
+        if is_not_modified(request, etag, changed_at):
+            return not_modified(headers)
+
+        def load_page():
+            # Fetch one extra row to know whether another page exists
+            rows = db.execute(_listing_query(category, after).limit(limit + 1)).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            logger.debug("Found %d products.", len(rows))
+            return {
+                "items": _listing_dicts(db, rows),
+                "next_cursor": rows[-1].product_id if has_more else None,
             }
-            for p in products
-            # print("All Products: ",products)
-        ]
-        return result_list
+
+        page = get_or_load(catalogue_key("list", version, category=category, after=after, limit=limit), load_page)
+        response.headers.update(headers)
+        if page["next_cursor"] is not None:
+            response.headers["X-Next-Cursor"] = str(page["next_cursor"])
+        return page["items"]
     except Exception as e:
-        logger.error(f"Error fetching products: {e}", exc_info=True)
+        logger.error("Error fetching products: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to fetch products.")
 
 
 @router.get('/{id}')
-def get_product(id: int, db: Session = Depends(get_db)): # Change id type to int
-    logger.info(f"Received request for get_product with ID: {id}")
-    try:
+def get_product(id: int, request: Request, response: Response, db: Session = Depends(get_db)): # Change id type to int
+    logger.debug("get_product id=%s", id)
+    def load_product():
         product = db.query(Product).filter(Product.product_id == id).first()
         if not product:
-            logger.warning(f"Product with ID {id} not found.")
-            raise HTTPException(status_code=404, detail="Product not found")
+            return None
         # Map DB model to frontend expected structure
-        result = {
-            "ProductID": product.product_id,
-            "title": product.name,
-            "price": product.price,
-             "quantity": 1, # Default or fetch if column exists
-            "description": product.category, # Or add description column
-            "imageKey": product.image_key,
-            "seller_id": product.seller_id
+        return {
+            "product": {
+                "ProductID": product.product_id,
+                "title": product.name,
+                "price": product.price,
+                 "quantity": 1, # Default or fetch if column exists
+                "description": product.category, # Or add description column
+                "imageKey": product.image_key,
+                "imageVariants": public_variants(product.image_variants),
+                "images": load_images(db, [id])[id],
+                "seller_id": product.seller_id
+            },
+            # Row version for the ETag/Last-Modified; a string so it survives the Redis round trip
+            "updated_at": product.updated_at.isoformat(),
         }
-        logger.info(f"Found product: {result}")
+
+    try:
+        cached = get_or_load(product_key(id), load_product)
+        if not cached:
+            logger.debug("Product with ID %s not found.", id)
+            raise HTTPException(status_code=404, detail="Product not found")
+        updated_at = datetime.fromisoformat(cached["updated_at"])
+        etag = make_etag("product", id, cached["updated_at"])
+        headers = validators(etag, updated_at)
+        if is_not_modified(request, etag, updated_at):
+            return not_modified(headers)
+        result = cached["product"]
+        response.headers.update(headers)
+        logger.debug("Found product: %s", result)
         return result
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error fetching product by ID {id}: {e}", exc_info=True)
+        logger.error("Error fetching product by ID %s: %s", id, e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to fetch product by ID.")
 
 
 @router.put('/{id}')
 async def update_product(
     id: int,
-    seller_id: str = Form(...),
+    seller_id: Optional[str] = Form(None),
     # Accept updates as a stringified JSON form field
-    updates_json_string: str = Form(...)
+    updates_json_string: str = Form(...),
+    identity: Optional[Identity] = Depends(get_identity),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    logger.info(f"Attempting update: product={id}, seller={seller_id}, updates_json_string={updates_json_string}")
-    db: Session = next(get_db())
-    product: Product = db.query(Product).get(id)
+    seller_id = caller_id(identity, seller_id)
+    logger.debug("Attempting update: product=%s, seller=%s, updates=%s", id, seller_id, updates_json_string)
+    product: Product = await db.get(Product, id)
     if not product:
-        logger.warning(f"Update failed: Product with ID {id} not found.")
+        logger.warning("Update failed: Product with ID %s not found.", id)
         raise HTTPException(404, "Product not found")
 
     if product.seller_id != seller_id:
-        logger.warning(f"Update failed for product {id}: Seller ID mismatch (provided: {seller_id}, owner: {product.seller_id})")
+        logger.warning("Update failed for product %s: Seller ID mismatch (provided: %s, owner: %s)", id, seller_id, product.seller_id)
         raise HTTPException(403, "You may only update your own products")
 
     # Parse the JSON string into a dictionary
     try:
         updates = json.loads(updates_json_string)
-        logger.info(f"Parsed updates: {updates}")
+        logger.debug("Parsed updates: %s", updates)
     except json.JSONDecodeError:
-        logger.error(f"Failed to parse updates JSON string: {updates_json_string}")
+        logger.warning("Failed to parse updates JSON string for product %s", id)
         raise HTTPException(400, "Invalid JSON format for updates")
 
     # Apply updates - *Warning: This is potentially unsafe if fields aren't validated*
     allowed_update_fields = ['name', 'category', 'price', 'image_key'] # Define allowed fields
     applied_updates = {}
+    old_image_key = product.image_key
     for field, val in updates.items():
         if field in allowed_update_fields:
             # Optional: Add type checking/validation here based on the expected type of each field
             setattr(product, field, val)
             applied_updates[field] = val
-            logger.info(f"Applied update: {field} = {val}")
+            logger.debug("Applied update: %s = %s", field, val)
         else:
-            logger.warning(f"Attempted to update disallowed field: {field}")
+            logger.warning("Attempted to update disallowed field: %s", field)
             # Optionally raise HTTPException or ignore
             # raise HTTPException(400, f"Invalid field '{field}' for update")
 
     if not applied_updates:
-        logger.info("No valid fields provided for update.")
+        logger.debug("No valid fields provided for update.")
         # Optionally return a message indicating nothing was updated
         # return {"updated": False, "detail": "No valid fields provided for update"}
 
-    db.commit()
-    db.refresh(product)
-    logger.info(f"Successfully updated product {id}.")
+    image_changed = product.image_key != old_image_key
+    cover_id = None
+    if image_changed:
+        # image_key is the cover: replace the position-0 image. Its old variants are stale:
+        # drop them and render the new image after commit
+        cover = (await db.execute(
+            select(ProductImage).where(ProductImage.product_id == id, ProductImage.position == 0)
+        )).scalar_one_or_none()
+        await aenqueue_deletions(db, variant_keys(cover.image_variants if cover else product.image_variants))
+        product.image_variants = None
+        if product.image_key is None:
+            if cover:
+                await db.delete(cover)
+        else:
+            if cover:
+                cover.image_key, cover.image_variants = product.image_key, None
+            else:
+                cover = ProductImage(product_id=id, position=0, image_key=product.image_key)
+                db.add(cover)
+            await db.flush()
+            cover_id = cover.image_id
+
+    await db.commit()
+    await db.refresh(product)
+    index_product(product, written_version(db))
+    await run_in_threadpool(invalidate_product, id)
+    if image_changed:
+        deletion_worker.wake()
+        if cover_id:
+            image_pipeline.submit(cover_id, product.product_id, product.image_key)
+    images = (await aload_images(db, [id]))[id]
+    logger.info("Updated product %s: %s", id, sorted(applied_updates))
 
     # Return the updated product details in the structure the frontend expects
     return {
@@ -242,6 +464,8 @@ async def update_product(
             "quantity": 1, # Default or fetch if column exists
             "description": product.category, # Or add description column
             "imageKey": product.image_key,
+            "imageVariants": public_variants(product.image_variants),
+            "images": images,
             "seller_id": product.seller_id
         }
     }
@@ -249,31 +473,148 @@ async def update_product(
 @router.delete('/{id}')
 async def delete_product(
     id: int,
-    seller_id: str = Form(...) # Expect seller_id as form data
+    seller_id: Optional[str] = Form(None), # Expect seller_id as form data (or a bearer token)
+    identity: Optional[Identity] = Depends(get_identity),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    logger.info(f"Attempting delete: product={id}, seller={seller_id}")
-    db: Session = next(get_db())
-    product: Product = db.query(Product).get(id)
+    seller_id = caller_id(identity, seller_id)
+    logger.debug("Attempting delete: product=%s, seller=%s", id, seller_id)
+    product: Product = await db.get(Product, id)
     if not product:
-        logger.warning(f"Delete failed: Product with ID {id} not found.")
+        logger.warning("Delete failed: Product with ID %s not found.", id)
         raise HTTPException(404, "Product not found")
 
     if product.seller_id != seller_id:
-        logger.warning(f"Delete failed for product {id}: Seller ID mismatch (provided: {seller_id}, owner: {product.seller_id})")
+        logger.warning("Delete failed for product %s: Seller ID mismatch (provided: %s, owner: %s)", id, seller_id, product.seller_id)
         raise HTTPException(403, "You may only delete your own products")
 
-    # Optional: Delete image from S3
-    if product.image_key:
+    # Every image and its variants are queued in the same transaction and deleted from S3 in the
+    # background; the product_images rows go with the product (ON DELETE CASCADE)
+    await aenqueue_deletions(db, [product.image_key, *await astored_keys(db, [id])])
+
+    await db.delete(product)
+    await db.commit()
+    deletion_worker.wake()
+    unindex_product(id, written_version(db))
+    await run_in_threadpool(invalidate_product, id)
+    logger.info("Deleted product %s", id)
+    return {"deleted": True}
+
+
+# Fields a seller may change on many listings at once, and the statuses they may set.
+# A sold product's status is final: setting it back to unsold would put it up for a second sale
+BULK_UPDATE_FIELDS = ("price", "category", "status")
+STATUSES = ("unsold", "sold")
+SOLD = "sold"
+
+
+def _bulk_ids(product_ids: List[int]) -> List[int]:
+    ids = sorted(set(product_ids))
+    if len(ids) > BULK_MAX_PRODUCTS:
+        raise HTTPException(400, f"At most {BULK_MAX_PRODUCTS} products per request")
+    return ids
+
+
+def _bulk_values(updates) -> Dict:
+    if not isinstance(updates, dict) or not updates:
+        raise HTTPException(400, "No fields to update")
+    for field in updates:
+        if field not in BULK_UPDATE_FIELDS:
+            raise HTTPException(400, f"Invalid field '{field}' for bulk update")
+    values = dict(updates)
+    if "price" in values:
         try:
-            s3.delete_object(Bucket=AWS_S3_BUCKET, Key=product.image_key)
-            logger.info(f"Deleted S3 object: {product.image_key}")
-        except Exception as e:
-            logger.error(f"Failed to delete S3 object {product.image_key}: {e}", exc_info=True)
-            # Decide if you want to raise an error or just log it
-            # raise HTTPException(500, "Failed to delete product image")
-
-
-    db.delete(product)
-    db.commit()
-    logger.info(f"Successfully deleted product {id}.")
-    return {"deleted": True}
\ No newline at end of file
+            values["price"] = float(values["price"])
+        except (TypeError, ValueError):
+            raise HTTPException(400, "Invalid price")
+        if not 0 <= values["price"] < float("inf"):
+            raise HTTPException(400, "Invalid price")
+    if "category" in values and values["category"] is not None and not isinstance(values["category"], str):
+        raise HTTPException(400, "Invalid category")
+    if "status" in values and values["status"] not in STATUSES:
+        raise HTTPException(400, f"status must be one of {', '.join(STATUSES)}")
+    return values
+
+
+@router.post('/bulk-update')
+async def bulk_update_products(
+    seller_id: Optional[str] = Form(None),
+    product_ids: List[int] = Form(...),
+    # The same stringified JSON as PUT /{id}, limited to BULK_UPDATE_FIELDS
+    updates_json_string: str = Form(...),
+    identity: Optional[Identity] = Depends(get_identity),
+    db: AsyncSession = Depends(get_async_db)
+):
+    seller_id = caller_id(identity, seller_id)
+    ids = _bulk_ids(product_ids)
+    try:
+        updates = json.loads(updates_json_string)
+    except json.JSONDecodeError:
+        raise HTTPException(400, "Invalid JSON format for updates")
+    values = _bulk_values(updates)
+    logger.debug("Bulk update: seller=%s, %d products, updates=%s", seller_id, len(ids), values)
+
+    # One UPDATE; ownership is part of the WHERE clause, so other sellers' (and missing) ids just don't match,
+    # and neither do sold products when the status is being set.
+    # It skips the flush hook, so awrite_products bumps the version, first (db/versions.py)
+    where = [Product.product_id.in_(ids), Product.seller_id == seller_id]
+    if "status" in values:
+        where.append(or_(Product.status.is_(None), Product.status != SOLD))
+    rows = (await awrite_products(
+        db,
+        update(Product).where(*where).values(**values).returning(*SEARCH_COLUMNS)
+    )).all()
+    if rows:
+        await db.commit()
+    else:
+        await db.rollback()  # nothing changed: undo the bump
+
+    version = written_version(db)
+    for row in rows:
+        index_product(row, version)
+    updated = sorted(row.product_id for row in rows)
+    if updated:
+        await run_in_threadpool(invalidate_product, *updated)
+    logger.info("Bulk-updated %d of %d products for seller %s: %s", len(updated), len(ids), seller_id, sorted(values))
+    return {"updated": updated, "skipped": sorted(set(ids) - set(updated))}
+
+
+@router.post('/bulk-delete')
+async def bulk_delete_products(
+    seller_id: Optional[str] = Form(None),
+    product_ids: List[int] = Form(...),
+    identity: Optional[Identity] = Depends(get_identity),
+    db: AsyncSession = Depends(get_async_db)
+):
+    seller_id = caller_id(identity, seller_id)
+    ids = _bulk_ids(product_ids)
+    logger.debug("Bulk delete: seller=%s, %d products", seller_id, len(ids))
+
+    # The seller's products among ids, locked so the images read below are the ones deleted.
+    # Products with a sale stay: the transaction history references them. The bulk DELETE
+    # skips the flush hook, so the version is bumped here, before any product row is locked
+    await abump_version(db)
+    owned = (await db.execute(
+        select(Product.product_id, Product.image_key)
+        .where(
+            Product.product_id.in_(ids),
+            Product.seller_id == seller_id,
+            ~exists().where(Transaction.product_id == Product.product_id),
+        )
+        .with_for_update()
+    )).all()
+    deleted = sorted(row.product_id for row in owned)
+    if not deleted:
+        await db.rollback()  # nothing to delete: undo the bump
+    else:
+        # Images are queued in the same transaction; their rows go with the products (ON DELETE CASCADE)
+        await aenqueue_deletions(db, [row.image_key for row in owned] + await astored_keys(db, deleted))
+        await db.execute(delete(Product).where(Product.product_id.in_(deleted)))
+        await db.commit()
+        deletion_worker.wake()
+        version = written_version(db)
+        for product_id in deleted:
+            unindex_product(product_id, version)
+        await run_in_threadpool(invalidate_product, *deleted)
+    logger.info("Bulk-deleted %d of %d products for seller %s", len(deleted), len(ids), seller_id)
+    return {"deleted": deleted, "skipped": sorted(set(ids) - set(deleted))}
@@ -0,0 +1,331 @@
+# backend/ratelimit.py
+# Edge protection for the API: per-caller rate limits and load shedding, as ASGI middleware
+# (registered in main.py).
+#
+# RateLimitMiddleware: a token bucket per caller and rule (RATE_LIMITS). The caller is the
+# token's user when AuthMiddleware verified one, else the client IP. An empty bucket gets 429
+# with Retry-After before the route runs. Buckets are kept as GCRA: one "theoretical arrival
+# time" per key instead of a token count and a timestamp, the same limits in one value.
+#
+# ConcurrencyLimitMiddleware: past CONCURRENCY_LIMIT requests in flight, more get 503 with
+# Retry-After straight away instead of queueing for a database connection (DB_POOL_TIMEOUT)
+# and tying up the worker and RDS further.
+#
+# RATE_LIMIT_BACKEND=memory keeps both per process. redis shares them between instances
+# through any Redis-protocol server at RATE_LIMIT_URL. Buckets update in one Lua script,
+# or in a WATCH/MULTI transaction on servers without scripting (e.g. a local stand-in).
+# In-flight requests are leases in a sorted set, so a crashed instance's slots expire after
+# CONCURRENCY_LEASE. Backend errors let the request through.
+import itertools
+import math
+import os
+import socket
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional
+
+from fastapi.responses import JSONResponse
+
+from config import (
+    RATE_LIMIT_BACKEND, RATE_LIMIT_URL, RATE_LIMITS, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_PROXY_HOPS,
+    CONCURRENCY_LIMIT, CONCURRENCY_LEASE,
+)
+import logging
+
+try:
+    from redis.exceptions import ResponseError, WatchError
+except ImportError:  # redis is only needed for RATE_LIMIT_BACKEND=redis
+    ResponseError = WatchError = None
+
+logger = logging.getLogger(__name__)
+
+# Health endpoints stay reachable however busy the API is
+EXEMPT_PATHS = {"/api/db/pool", "/api/cache/stats", "/api/auth/stats", "/api/storage/deletions", "/api/edge/stats"}
+SLOTS_KEY = "edge:inflight"
+
+
+class Rule(NamedTuple):
+    name: str
+    rate: float  # requests per second
+    burst: int
+
+
+class Rules:
+    """RATE_LIMITS parsed: the rule for a request is its exact route, else its longest prefix, else "*"."""
+
+    def __init__(self, spec: str):
+        self.exact: Dict = {}
+        self.prefixes: List = []
+        self.default: Optional[Rule] = None
+        for part in filter(None, (p.strip() for p in spec.split(","))):
+            target, _, budget = part.rpartition("=")
+            rate, _, burst = budget.partition(":")
+            rule = Rule(target, float(rate), int(burst or 1))
+            if target == "*":
+                self.default = rule
+                continue
+            method, _, path = target.partition(" ")
+            if path.endswith("*"):
+                self.prefixes.append((method.upper(), path[:-1], rule))
+            else:
+                self.exact[method.upper(), path.rstrip("/")] = rule
+        self.prefixes.sort(key=lambda entry: -len(entry[1]))
+
+    def match(self, method: str, path: str) -> Optional[Rule]:
+        rule = self.exact.get((method, path.rstrip("/")))
+        if rule:
+            return rule
+        for prefix_method, prefix, rule in self.prefixes:
+            if method == prefix_method and path.startswith(prefix):
+                return rule
+        return self.default
+
+
+class EdgeStats:
+    def __init__(self):
+        self.rate_limited = 0
+        self.shed = 0
+        self.errors = 0
+
+    def as_dict(self):
+        return {"rate_limited": self.rate_limited, "shed": self.shed, "backend_errors": self.errors}
+
+
+stats = EdgeStats()
+
+
+class MemoryBuckets:
+    name = "memory"
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        # key -> theoretical arrival time; only touched from the event loop, so no lock.
+        # Dropping the least recently used key refills that caller's bucket, nothing worse.
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take a token: 0 if the request may go ahead, else the seconds until it could."""
+        now = time.monotonic()
+        interval = 1.0 / rate
+        tat = max(self._tat.get(key, now), now)
+        wait = tat - now - (burst - 1) * interval
+        if wait > 0:
+            return wait
+        self._tat[key] = tat + interval
+        self._tat.move_to_end(key)
+        if len(self._tat) > self.max_keys:
+            self._tat.popitem(last=False)
+        return 0.0
+
+
+class MemorySlots:
+    name = "memory"
+
+    def __init__(self):
+        self.in_flight = 0
+
+    async def acquire(self, limit: int):
+        if self.in_flight >= limit:
+            return None
+        self.in_flight += 1
+        return True
+
+    async def release(self, slot):
+        self.in_flight -= 1
+
+    async def count(self) -> int:
+        return self.in_flight
+
+
+# The server's clock, so instances with skewed clocks share buckets correctly
+_GCRA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now)
+local wait = tat - now - tonumber(ARGV[2])
+if wait > 0 then
+    return tostring(wait)
+end
+redis.call('SET', KEYS[1], tostring(tat + interval), 'PX', math.ceil((tat + interval - now) * 1000))
+return '0'
+"""
+
+
+def _redis_client(url: str):
+    import redis.asyncio  # optional dependency, only needed for RATE_LIMIT_BACKEND=redis
+
+    return redis.asyncio.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+
+class RedisBuckets:
+    name = "redis"
+
+    def __init__(self, client):
+        self._client = client
+        self._script = client.register_script(_GCRA_SCRIPT)
+        self._scripting = True
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        interval = 1.0 / rate
+        if self._scripting:
+            try:
+                return float(await self._script(keys=[key], args=[interval, (burst - 1) * interval]))
+            except ResponseError as e:
+                if "unknown command" not in str(e):
+                    raise
+                logger.warning("Rate limit server has no scripting; using WATCH/MULTI: %s", e)
+                self._scripting = False
+        return await self._take_watched(key, interval, (burst - 1) * interval)
+
+    async def _take_watched(self, key: str, interval: float, tolerance: float) -> float:
+        async with self._client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    now = time.time()
+                    stored = await pipe.get(key)
+                    tat = max(float(stored) if stored else now, now)
+                    wait = tat - now - tolerance
+                    if wait > 0:
+                        return wait
+                    pipe.multi()
+                    pipe.set(key, tat + interval, px=math.ceil((tat + interval - now) * 1000))
+                    await pipe.execute()
+                    return 0.0
+                except WatchError:
+                    continue  # another request took a token from this bucket first
+
+
+class RedisSlots:
+    name = "redis"
+
+    def __init__(self, client, lease: int = CONCURRENCY_LEASE):
+        self._client = client
+        self.lease = lease
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._ids = itertools.count()
+
+    async def acquire(self, limit: int):
+        # Add a lease and count them in one MULTI; over the limit, give it back. Racing
+        # requests can both see the other's lease and both back off, never both get in.
+        slot = f"{self._owner}:{next(self._ids)}"
+        now = time.time()
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(SLOTS_KEY, "-inf", now)
+            pipe.zadd(SLOTS_KEY, {slot: now + self.lease})
+            pipe.zcard(SLOTS_KEY)
+            _, _, in_flight = await pipe.execute()
+        if in_flight > limit:
+            await self._client.zrem(SLOTS_KEY, slot)
+            return None
+        return slot
+
+    async def release(self, slot):
+        await self._client.zrem(SLOTS_KEY, slot)
+
+    async def count(self) -> int:
+        return await self._client.zcount(SLOTS_KEY, time.time(), "+inf")
+
+
+def _build_backends():
+    if RATE_LIMIT_BACKEND == "redis":
+        client = _redis_client(RATE_LIMIT_URL)
+        return RedisBuckets(client), RedisSlots(client)
+    return MemoryBuckets(), MemorySlots()
+
+
+buckets, slots = _build_backends()
+
+
+def client_ip(scope) -> str:
+    # Behind RATE_LIMIT_PROXY_HOPS trusted proxies, each appended the address it saw to
+    # X-Forwarded-For; anything further left was sent by the client and can't be trusted
+    if RATE_LIMIT_PROXY_HOPS:
+        header = next((value for name, value in scope["headers"] if name == b"x-forwarded-for"), b"")
+        hops = [hop.strip() for hop in header.decode("latin-1").split(",") if hop.strip()]
+        if len(hops) >= RATE_LIMIT_PROXY_HOPS:
+            return hops[-RATE_LIMIT_PROXY_HOPS]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _limited(path: str) -> bool:
+    return path.startswith("/api/") and path not in EXEMPT_PATHS
+
+
+def _reject(status: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse({"detail": detail}, status_code=status,
+                        headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, backend=None, rules: Optional[Rules] = None):
+        self.app = app
+        self.backend = backend or buckets
+        self.rules = rules or Rules(RATE_LIMITS)
+
+    async def __call__(self, scope, receive, send):
+        rule = None
+        if scope["type"] == "http" and _limited(scope["path"]):
+            rule = self.rules.match(scope["method"], scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Set by AuthMiddleware, which runs first
+        identity = scope.get("state", {}).get("identity")
+        caller = f"user:{identity.sub}" if identity is not None else f"ip:{client_ip(scope)}"
+        try:
+            wait = await self.backend.take(f"rl:{rule.name}:{caller}", rule.rate, rule.burst)
+        except Exception as e:
+            stats.errors += 1
+            logger.warning("Rate limit check failed, letting the request through: %s", e)
+            wait = 0.0
+        if wait > 0:
+            stats.rate_limited += 1
+            logger.debug("Rate limited %s on %r for %.2fs", caller, rule.name, wait)
+            await _reject(429, "Too many requests", wait)(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+class ConcurrencyLimitMiddleware:
+    def __init__(self, app, backend=None, limit: int = CONCURRENCY_LIMIT):
+        self.app = app
+        self.backend = backend or slots
+        self.limit = limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _limited(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            slot = await self.backend.acquire(self.limit)
+        except Exception as e:
+            stats.errors += 1
+            logger.warning("Concurrency limit check failed, letting the request through: %s", e)
+            await self.app(scope, receive, send)
+            return
+        if slot is None:
+            stats.shed += 1
+            logger.debug("Shed %s %s: %d requests in flight", scope["method"], scope["path"], self.limit)
+            await _reject(503, "Server busy, retry shortly", 1)(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            try:
+                await self.backend.release(slot)
+            except Exception as e:
+                logger.warning("Releasing a concurrency slot failed (it expires by itself): %s", e)
+
+
+async def edge_stats() -> Dict:
+    result = {"backend": buckets.name, "concurrency_limit": CONCURRENCY_LIMIT, **stats.as_dict()}
+    try:
+        result["in_flight"] = await slots.count()
+    except Exception as e:
+        result["error"] = str(e)
+    return result
@@ -0,0 +1,391 @@
+# backend/search/engine.py
+# Search backends for GET /api/search/.
+#
+# "postgres": a generated tsvector column (maintained by PostgreSQL on every write) with a
+#   GIN index for word/prefix matches, plus pg_trgm GIN indexes so partial (ILIKE '%x%') and
+#   fuzzy (name % 'x') matches are index scans instead of sequential scans. Ranked by
+#   ts_rank + trigram similarity.
+# "memory": used when the pg_trgm extension cannot be installed. An in-process inverted
+#   index (name words + a trigram index over the vocabulary) built from Products, kept
+#   current by the product write paths and rebuilt in the background whenever the
+#   products change counter shows writes it has not seen (made on other instances), and
+#   at least every SEARCH_INDEX_TTL seconds.
+#
+# content_version() names the data a backend's results reflect; search/routes.py uses it
+# for the ETag and the cache key so neither can run ahead of the index.
+import heapq
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, or_, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from config import SEARCH_BACKEND, SEARCH_INDEX_TTL, SEARCH_SIMILARITY_THRESHOLD
+from models import Product, SessionLocal, engine
+from db.versions import read_version, snapshot
+import logging
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Distinguishes this process's index in content versions once local writes have been
+# applied out of sequence (see InMemorySearchBackend._note_write)
+_PROCESS_TOKEN = uuid.uuid4().hex[:8]
+
+SEARCH_COLUMNS = (
+    Product.product_id,
+    Product.name,
+    Product.price,
+    Product.status,
+    Product.category,
+    Product.image_key,
+    Product.seller_id,
+)
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    return _WORD.findall(value.lower()) if value else []
+
+
+def trigrams(word: str) -> set:
+    # Same padding as pg_trgm: two spaces before, one after
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _price_filters(min_price, max_price):
+    if min_price is not None and max_price is not None and min_price > max_price:
+        # Mirrors the old endpoint: an inverted range is logged and ignored
+        logger.warning("Received invalid price range: min_price=%s > max_price=%s", min_price, max_price)
+        return None, None
+    return min_price, max_price
+
+
+class PostgresSearchBackend:
+    name = "postgres"
+
+    def content_version(self, db_version: int) -> str:
+        # Queries the live table, so results are always as of the latest commit
+        return str(db_version)
+
+    def search(self, db: Session, *, product_id=None, name=None, category=None, seller_id=None,
+               min_price=None, max_price=None, limit=100) -> List[Dict]:
+        query = select(*SEARCH_COLUMNS)
+        rank = None
+
+        if product_id is not None:
+            query = query.where(Product.product_id == product_id)
+
+        tokens = tokenize(name)
+        if name is not None and name.strip():
+            q = name.strip()
+            match = [Product.name.ilike(f"%{q}%"), Product.name.bool_op("%")(q)]
+            rank = func.similarity(Product.name, q)
+            if tokens:
+                # 'lam:* & des:*' - prefix match on every word, so keystroke searches hit the GIN index
+                tsq = func.to_tsquery("simple", " & ".join(f"{t}:*" for t in tokens))
+                match.append(Product.search_vector.bool_op("@@")(tsq))
+                rank = rank + func.ts_rank(Product.search_vector, tsq)
+            query = query.where(or_(*match))
+
+        if category is not None and category.strip():
+            query = query.where(Product.category.ilike(f"%{category.strip()}%"))
+
+        if seller_id is not None and seller_id.strip():
+            query = query.where(Product.seller_id == seller_id.strip())
+
+        min_price, max_price = _price_filters(min_price, max_price)
+        if min_price is not None:
+            query = query.where(Product.price >= min_price)
+        if max_price is not None:
+            query = query.where(Product.price <= max_price)
+
+        if rank is not None:
+            query = query.order_by(rank.desc(), Product.product_id)
+        else:
+            query = query.order_by(Product.product_id)
+        return [dict(row._mapping) for row in db.execute(query.limit(limit))]
+
+
+class _WordIndex:
+    """Inverted index over name words, plus a trigram index over the vocabulary.
+
+    Partial and fuzzy matching work on distinct words rather than documents, so a query
+    only scores the handful of vocabulary words that share a trigram with it (or, for a
+    token under 3 characters, that contain it: a scan of the vocabulary).
+    """
+
+    def __init__(self):
+        self.docs: Dict[int, Dict] = {}
+        self.doc_words: Dict[int, set] = {}
+        self.postings: Dict[str, set] = {}  # word -> product ids
+        self.word_grams: Dict[str, set] = {}  # trigram -> words
+
+    def add(self, doc: Dict):
+        pid = doc["product_id"]
+        words = set(tokenize(doc["name"]))
+        self.docs[pid] = doc
+        self.doc_words[pid] = words
+        for word in words:
+            postings = self.postings.get(word)
+            if postings is None:
+                postings = self.postings[word] = set()
+                for gram in trigrams(word):
+                    self.word_grams.setdefault(gram, set()).add(word)
+            postings.add(pid)
+
+    def discard(self, pid: int):
+        self.docs.pop(pid, None)
+        for word in self.doc_words.pop(pid, ()):
+            postings = self.postings[word]
+            postings.discard(pid)
+            if not postings:
+                del self.postings[word]
+                for gram in trigrams(word):
+                    words = self.word_grams[gram]
+                    words.discard(word)
+                    if not words:
+                        del self.word_grams[gram]
+
+    def match_words(self, token: str) -> List[tuple]:
+        """(score, word) for every vocabulary word matching `token`, best first."""
+        grams = trigrams(token)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.word_grams.get(gram, ()))
+        if len(token) < 3:
+            # Too short to share a trigram with the words it's inside ("tv" in "smarttv"), so
+            # scan the vocabulary, as ILIKE '%tv%' does in the postgres backend
+            for word in self.postings:
+                if token in word and word not in shared:
+                    shared[word] = 0  # an infix match, ranked below the prefixes found above
+        matches = []
+        for word, count in shared.items():
+            similarity = count / len(grams | trigrams(word))
+            if word == token:
+                score = 3.0
+            elif word.startswith(token):
+                score = 2.0 + similarity
+            elif token in word:
+                score = 1.0 + similarity
+            elif similarity >= SEARCH_SIMILARITY_THRESHOLD:
+                score = similarity
+            else:
+                continue
+            matches.append((score, word))
+        matches.sort(reverse=True)
+        return matches
+
+
+class InMemorySearchBackend:
+    name = "memory"
+
+    def __init__(self, ttl: int = SEARCH_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._index = _WordIndex()
+        self._built_at = 0.0
+        self._rebuilding = False
+        self._first_build = threading.Lock()
+        self.version = 0  # products change counter the index reflects
+        self._unsequenced = 0  # local writes applied since then that could not be sequenced
+
+    # --- index maintenance ---
+
+    def _note_write(self, version: Optional[int]):
+        # Caller holds the lock. A write whose version directly follows ours moves the whole
+        # index to that version; anything else (a gap = writes from another instance) leaves
+        # content this process alone has, until the next rebuild.
+        if version is None or version == self.version:
+            return
+        if version == self.version + 1:
+            self.version = version
+        else:
+            self._unsequenced += 1
+
+    def upsert(self, doc: Dict, version: Optional[int] = None):
+        with self._lock:
+            self._index.discard(doc["product_id"])
+            self._index.add(doc)
+            self._note_write(version)
+
+    def remove(self, product_id: int, version: Optional[int] = None):
+        with self._lock:
+            self._index.discard(product_id)
+            self._note_write(version)
+
+    def rebuild(self):
+        started = time.perf_counter()
+        index = _WordIndex()
+        db = SessionLocal()
+        try:
+            snapshot(db)
+            version, _ = read_version(db)
+            rows = db.execute(select(*SEARCH_COLUMNS).execution_options(stream_results=True, yield_per=5000))
+            for row in rows:
+                index.add(dict(row._mapping))
+        finally:
+            db.close()
+        with self._lock:
+            self._index = index
+            self.version = version
+            self._unsequenced = 0
+            self._built_at = time.monotonic()
+            self._rebuilding = False
+        logger.info("Search index rebuilt with %d products at version %s in %.2fs", len(index.docs), version, time.perf_counter() - started)
+
+    def _background_rebuild(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            logger.error("Search index rebuild failed: %s", e, exc_info=True)
+            with self._lock:
+                self._rebuilding = False
+
+    def _ensure_fresh(self, db_version: Optional[int] = None):
+        if not self._built_at:
+            # First search on this process builds synchronously; concurrent callers wait for it
+            with self._first_build:
+                if not self._built_at:
+                    self.rebuild()
+            return
+        with self._lock:
+            behind = db_version is not None and (db_version > self.version or self._unsequenced)
+            if self._rebuilding or (not behind and time.monotonic() - self._built_at < self.ttl):
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._background_rebuild, name="search-index-rebuild", daemon=True).start()
+
+    def content_version(self, db_version: int) -> str:
+        # Results are served from the index as it stands while a catch-up rebuild runs, so
+        # report the version it reflects rather than the database's
+        self._ensure_fresh(db_version)
+        with self._lock:
+            if self._unsequenced:
+                return f"{self.version}+{_PROCESS_TOKEN}.{self._unsequenced}"
+            return str(self.version)
+
+    # --- querying ---
+
+    def _name_scores(self, index: _WordIndex, name: str) -> Dict[int, float]:
+        q = name.strip().lower()
+        tokens = tokenize(q)
+        if not tokens:
+            # Query had no word characters: fall back to a plain substring match
+            return {pid: 1.0 for pid, doc in index.docs.items() if q in (doc["name"] or "").lower()}
+
+        per_token = [index.match_words(token) for token in tokens]
+        # every word of the query must match (AND), like the tsquery in the postgres backend
+        candidates = None
+        for matches in per_token:
+            hits = set().union(*(index.postings[word] for _, word in matches))
+            candidates = hits if candidates is None else candidates & hits
+            if not candidates:
+                return {}
+
+        scores = dict.fromkeys(candidates, 0.0)
+        for matches in per_token:
+            # A product scores the best matching word for each query token
+            remaining = set(candidates)
+            for score, word in matches:
+                hit = remaining & index.postings[word]
+                for pid in hit:
+                    scores[pid] += score
+                remaining -= hit
+                if not remaining:
+                    break
+        return scores
+
+    def search(self, db: Session, *, product_id=None, name=None, category=None, seller_id=None,
+               min_price=None, max_price=None, limit=100) -> List[Dict]:
+        self._ensure_fresh()
+        min_price, max_price = _price_filters(min_price, max_price)
+        category = category.strip().lower() if category and category.strip() else None
+        seller_id = seller_id.strip() if seller_id and seller_id.strip() else None
+
+        with self._lock:
+            index = self._index
+            if name is not None and name.strip():
+                candidates = self._name_scores(index, name)
+            else:
+                candidates = None
+            if product_id is not None:
+                if candidates is None:
+                    candidates = {product_id: 0.0} if product_id in index.docs else {}
+                else:
+                    candidates = {product_id: candidates[product_id]} if product_id in candidates else {}
+
+            def keep(doc):
+                if category is not None and category not in (doc["category"] or "").lower():
+                    return False
+                if seller_id is not None and doc["seller_id"] != seller_id:
+                    return False
+                if min_price is not None and doc["price"] < min_price:
+                    return False
+                if max_price is not None and doc["price"] > max_price:
+                    return False
+                return True
+
+            if candidates is None:
+                # No ranking criteria: first `limit` matching products by id
+                top = heapq.nsmallest(limit, (pid for pid, doc in index.docs.items() if keep(doc)))
+                return [index.docs[pid] for pid in top]
+            top = heapq.nsmallest(
+                limit,
+                ((-score, pid) for pid, score in candidates.items() if keep(index.docs[pid])),
+            )
+            return [index.docs[pid] for _, pid in top]
+
+
+def ensure_search_schema(engine) -> bool:
+    """Add the pg_trgm indexes if the extension is available. Returns False when it is not.
+
+    The tsvector column and its GIN index come from migration 2 (db/migrations.py).
+    """
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON "Products" USING GIN (name gin_trgm_ops)'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_products_category_trgm ON "Products" USING GIN (category gin_trgm_ops)'))
+        return True
+    except DBAPIError as e:
+        logger.warning("pg_trgm unavailable, search falls back to the in-process index: %s", e.orig)
+        return False
+
+
+search_backend = None
+
+
+def setup_search():
+    global search_backend
+    has_trgm = ensure_search_schema(engine)
+    if SEARCH_BACKEND == "memory" or (SEARCH_BACKEND == "auto" and not has_trgm):
+        search_backend = InMemorySearchBackend()
+    else:
+        search_backend = PostgresSearchBackend()
+    logger.info("Search backend: %s", search_backend.name)
+    return search_backend
+
+
+def get_search_backend():
+    if search_backend is None:
+        setup_search()
+    return search_backend
+
+
+def index_product(product, version: Optional[int] = None):
+    # Called by the product write paths after commit, with the change counter the write
+    # bumped (db.versions.written_version); only the in-process index needs telling
+    if isinstance(search_backend, InMemorySearchBackend):
+        search_backend.upsert({column.key: getattr(product, column.key) for column in SEARCH_COLUMNS}, version)
+
+
+def unindex_product(product_id: int, version: Optional[int] = None):
+    if isinstance(search_backend, InMemorySearchBackend):
+        search_backend.remove(product_id, version)
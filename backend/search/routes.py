@@ -1,46 +1,17 @@
-import uuid
-import boto3
-import json
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, HTTPException, Depends, Query # Import Query
-from sqlalchemy import Column, Integer, String, text,Float, create_engine, and_
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response # Import Query
+from sqlalchemy.orm import Session
+from config import SEARCH_RESULT_LIMIT
+from models import get_db
+from search.engine import get_search_backend
+from cache import get_or_load, catalogue_key
+from db.versions import read_version, snapshot
+from http_cache import make_etag, validators, is_not_modified, not_modified
+from images.gallery import load_images
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configured centrally by logging_config.setup_logging()
 logger = logging.getLogger(__name__)
-try:
-    from config import DATABASE_URL
-    Base = declarative_base()
-    class Product(Base):
-        __tablename__ = "Products"
-        product_id = Column(Integer, primary_key=True, index=True)
-        name = Column(String, nullable=False)
-        category = Column(String) # Consider adding description if needed
-        price = Column(Float, nullable=False)
-        seller_id = Column(String, nullable=False)  # <-- change Integer ➔ String
-        image_key = Column(String)
-        status     = Column(String, server_default=text("'unsold'"))
-        # quantity = Column(Integer) # Add if you have this column
-
-    engine = create_engine(DATABASE_URL)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-    def get_db():
-        db = SessionLocal()
-        try:
-            yield db
-        finally:
-            db.close()
-
-except ImportError as e:
-    logger.error(f"Could not import necessary modules (e.g., config). Error: {e}")
-    raise
-except Exception as e:
-    logger.error(f"Database setup failed: {e}", exc_info=True)
-    raise
 
 
 # --- Router ---
@@ -50,85 +21,88 @@ router = APIRouter()
 
 @router.get('/')
 def search_products(
+    request: Request,
+    response: Response,
     product_id: Optional[int] = Query(None, description="Search by Product ID"),
     name: Optional[str] = Query(None, description="Search by product name (partial match)"),
     category: Optional[str] = Query(None, description="Search by category (partial match)"),
     seller_id: Optional[str] = Query(None, description="Search by Seller ID (exact match)"),
     min_price: Optional[float] = Query(None, description="Minimum price for price range search"),
     max_price: Optional[float] = Query(None, description="Maximum price for price range search"),
+    limit: int = Query(SEARCH_RESULT_LIMIT, ge=1, le=500, description="Maximum number of results"),
     db: Session = Depends(get_db)
 ) -> List[Dict[str, Any]]:
-    print("Empty list",Product)
     """
     Searches for products based on various criteria.
-    Returns all products if no search criteria are provided.
+    Returns the first `limit` products if no search criteria are provided.
+    Sends an ETag (and Last-Modified once the index is current) and answers a matching
+    If-None-Match with 304.
 
     Args:
         product_id: Optional. Search for a specific product by its ID.
-        name: Optional. Search by product name using partial, case-insensitive matching.
+        name: Optional. Search by product name: word-prefix, partial and fuzzy matching,
+            best matches first (see search/engine.py).
         category: Optional. Search by category using partial, case-insensitive matching.
         seller_id: Optional. Search for products by a specific seller ID (exact match).
         min_price: Optional. Include products with a price greater than or equal to this value.
         max_price: Optional. Include products with a price less than or equal to this value.
+        limit: Optional. Maximum number of results to return.
         db: Database session dependency.
 
     Returns:
         A list of dictionaries, where each dictionary represents a product matching the criteria.
     """
-    logger.info(f"Received search request with params: product_id={product_id}, name='{name}', category='{category}', seller_id='{seller_id}', min_price={min_price}, max_price={max_price}")
+    logger.debug("Search request: product_id=%s, name=%r, category=%r, seller_id=%r, min_price=%s, max_price=%s",
+                 product_id, name, category, seller_id, min_price, max_price)
 
     try:
-        query = db.query(Product)
-
-        if product_id is not None:
-            logger.info(f"Applying filter: product_id = {product_id}")
-            query = query.filter(Product.product_id == product_id)
-
-        if name is not None and name.strip():
-            logger.info(f"Applying filter: name ilike '%{name.strip()}%'")
-            query = query.filter(Product.name.ilike(f"%{name.strip()}%"))
-
-        if category is not None and category.strip():
-            logger.info(f"Applying filter: category ilike '%{category.strip()}%'")
-            query = query.filter(Product.category.ilike(f"%{category.strip()}%"))
-
-        if seller_id is not None and seller_id.strip():
-             logger.info(f"Applying filter: seller_id = '{seller_id.strip()}'")
-             query = query.filter(Product.seller_id == seller_id.strip())
-
-        # Handle price range
-        if min_price is not None and max_price is not None:
-            logger.info(f"Applying filter: price between {min_price} and {max_price}")
-            # Check for min > max here as a backend safeguard, though frontend validates this
-            if min_price > max_price:
-                 logger.warning(f"Received invalid price range: min_price={min_price} > max_price={max_price}")
-                 pass # Let the query handle it (it won't match anything if min > max)
-            else:
-                query = query.filter(and_(Product.price >= min_price, Product.price <= max_price))
-        elif min_price is not None:
-            logger.info(f"Applying filter: price >= {min_price}")
-            query = query.filter(Product.price >= min_price)
-        elif max_price is not None:
-            logger.info(f"Applying filter: price <= {max_price}")
-            query = query.filter(Product.price <= max_price)
-        products = query.all()
-        logger.info(f"Found {len(products)} products after filtering.")
-        result_list = [
-            {
-                "ProductID": p.product_id,
-                "title": p.name,
-                "price": p.price,
-                "quantity": 1, # Default or fetch if you added a column
-                "description": p.category, # Using category for description as per products/routes.py logic
-                "imageKey": p.image_key,
-                "seller_id": p.seller_id,
-                "status":p.status
-            }
-            for p in products
-        ]
-        print("RETURNED LIST",result_list)
+        backend = get_search_backend()
+        snapshot(db)
+        db_version, changed_at = read_version(db)
+        content_version = backend.content_version(db_version)
+        params = dict(product_id=product_id, name=name, category=category, seller_id=seller_id,
+                      min_price=min_price, max_price=max_price, limit=limit)
+        etag = make_etag("search", content_version, sorted(params.items()))
+        # An index still catching up must not claim the latest write's timestamp
+        last_modified = changed_at if content_version == str(db_version) else None
+        headers = validators(etag, last_modified)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(headers)
+
+        def run_search():
+            products = backend.search(
+                db,
+                product_id=product_id,
+                name=name,
+                category=category,
+                seller_id=seller_id,
+                min_price=min_price,
+                max_price=max_price,
+                limit=limit,
+            )
+            logger.debug("Found %d products after filtering (%s backend).", len(products), backend.name)
+            # One product_images query for every hit
+            images = load_images(db, [p["product_id"] for p in products])
+            return [
+                {
+                    "ProductID": p["product_id"],
+                    "title": p["name"],
+                    "price": p["price"],
+                    "quantity": 1, # Default or fetch if you added a column
+                    "description": p["category"], # Using category for description as per products/routes.py logic
+                    "imageKey": p["image_key"],
+                    "images": images[p["product_id"]],
+                    "seller_id": p["seller_id"],
+                    "status":p["status"]
+                }
+                for p in products
+            ]
+
+        result_list = get_or_load(catalogue_key("search", content_version, **params), run_search)
+        response.headers.update(headers)
+        logger.debug("Search results: %s", result_list)  # only formatted when debug is on
         return result_list
 
     except Exception as e:
-        logger.error(f"Error during product search: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Failed to perform search: An unexpected error occurred.")
+        logger.error("Error during product search: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to perform search: An unexpected error occurred.")
@@ -0,0 +1,114 @@
+# backend/stats/aggregates.py
+# Per-seller and per-category counters: active listings, their total and average price,
+# sold count and revenue.
+#
+# seller_stats and category_stats (migration 9) are kept current by statement-level triggers
+# on "Products" and transactions, in the same transaction as the write, whichever code path
+# makes it (ORM, bulk UPDATE/DELETE, import, admin, psql). Reading one is a primary key lookup.
+# The seller_stats_expected/category_stats_expected views recount from scratch, for checking:
+#
+#   python -m stats.aggregates --check      # list counters that differ from a recount (exit 1 if any)
+#   python -m stats.aggregates --rebuild    # the same, then replace every counter with the recount
+import argparse
+import sys
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from models import SellerStats, CategoryStats, SessionLocal
+import logging
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ("active_listings", "listed_value", "sold_count", "revenue")
+MONEY = ("listed_value", "revenue")  # NUMERIC; the others are counts
+# (table, key column) of each kind of counter
+TABLES = {"seller": ("seller_stats", "seller_id"), "category": ("category_stats", "category")}
+
+
+def _stats_dict(row) -> Dict:
+    active = row.active_listings if row else 0
+    listed_value = float(row.listed_value) if row else 0.0
+    return {
+        "active_listings": active,
+        "sold_count": row.sold_count if row else 0,
+        "revenue": float(row.revenue) if row else 0.0,
+        "average_price": round(listed_value / active, 2) if active else None,
+        "updated_at": row.updated_at.isoformat() if row else None,
+    }
+
+
+def get_seller_stats(db: Session, seller_id: str) -> Dict:
+    """Counters for one seller (zeros for a seller with no listings or sales)."""
+    return {"seller_id": seller_id, **_stats_dict(db.get(SellerStats, seller_id))}
+
+
+def get_category_stats(db: Session, category: Optional[str]) -> Dict:
+    """Counters for one category; None is products without a category."""
+    return {"category": category, **_stats_dict(db.get(CategoryStats, category or ""))}
+
+
+def list_category_stats(db: Session) -> List[Dict]:
+    """Every category with listings or sales, most active listings first."""
+    rows = db.execute(
+        select(CategoryStats)
+        .where((CategoryStats.active_listings != 0) | (CategoryStats.sold_count != 0))
+        .order_by(CategoryStats.active_listings.desc(), CategoryStats.category)
+    ).scalars()
+    return [{"category": row.category or None, **_stats_dict(row)} for row in rows]
+
+
+def drift(db: Session, kind: str) -> List[Dict]:
+    """Counters of `kind` that differ from a recount, as {key, stored: {...}, expected: {...}}."""
+    table, key = TABLES[kind]
+    # A missing row and a row of zeros are the same thing (counters don't delete their rows)
+    stored = ", ".join(f"coalesce(s.{c}, 0) AS stored_{c}" for c in COUNTERS)
+    expected = ", ".join(f"coalesce(e.{c}, 0) AS expected_{c}" for c in COUNTERS)
+    rows = db.execute(text(
+        f"SELECT {key}, {stored}, {expected} "
+        f"FROM {table} s FULL JOIN {table}_expected e USING ({key}) "
+        f"WHERE ({', '.join(f'coalesce(s.{c}, 0)' for c in COUNTERS)}) "
+        f"IS DISTINCT FROM ({', '.join(f'coalesce(e.{c}, 0)' for c in COUNTERS)}) "
+        f"ORDER BY {key}"
+    )).mappings()
+    return [
+        {
+            "key": row[key],
+            "stored": {c: (float if c in MONEY else int)(row[f"stored_{c}"]) for c in COUNTERS},
+            "expected": {c: (float if c in MONEY else int)(row[f"expected_{c}"]) for c in COUNTERS},
+        }
+        for row in rows
+    ]
+
+
+def rebuild(db: Session, dry_run: bool = False) -> Dict[str, List[Dict]]:
+    """Compare every counter with a recount and, unless dry_run, replace them all with it."""
+    # Product and sale writes wait until this commits, so the recount can't miss one in flight
+    db.execute(text('LOCK TABLE "Products", transactions IN SHARE MODE'))
+    report = {kind: drift(db, kind) for kind in TABLES}
+    if not dry_run:
+        db.execute(text("SELECT recount_stats()"))
+    db.commit()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check or rebuild the seller/category counters")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--check", action="store_true", help="only report counters that differ from a recount")
+    action.add_argument("--rebuild", action="store_true", help="replace every counter with a recount")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        report = rebuild(db, dry_run=args.check)
+    finally:
+        db.close()
+    for kind, rows in report.items():
+        for row in rows:
+            print(f"{kind} {row['key']!r}: stored {row['stored']} expected {row['expected']}")
+        print(f"{len(rows)} {kind} counters {'differ' if args.check else 'corrected'}")
+    if args.check and any(report.values()):
+        sys.exit(1)
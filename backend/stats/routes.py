@@ -0,0 +1,47 @@
+# backend/stats/routes.py
+# Dashboard and seller-view figures from the precomputed counters (stats/aggregates.py):
+# each is one primary key lookup, however many products and sales are behind it.
+#
+# A seller's figures include their revenue, so only that seller (or an admin) may read them.
+# The category figures are public and leave revenue out.
+from typing import Dict, List
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from config import ADMIN_GROUP
+from models import get_db
+from auth.tokens import Identity
+from auth.middleware import require_identity, caller_id
+from stats.aggregates import get_seller_stats, get_category_stats, list_category_stats
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Left out of the public (category) figures
+PRIVATE_COUNTERS = ("revenue",)
+
+
+def _public(stats: Dict) -> Dict:
+    return {k: v for k, v in stats.items() if k not in PRIVATE_COUNTERS}
+
+
+@router.get('/sellers/{seller_id}')
+def seller_stats(seller_id: str, identity: Identity = Depends(require_identity), db: Session = Depends(get_db)) -> Dict:
+    if ADMIN_GROUP not in identity.groups:
+        caller_id(identity, seller_id)  # 403 unless it's the caller's own
+    logger.debug("seller_stats seller=%s caller=%s", seller_id, identity.sub)
+    return get_seller_stats(db, seller_id)
+
+
+@router.get('/categories')
+def category_stats_list(db: Session = Depends(get_db)) -> List[Dict]:
+    return [_public(stats) for stats in list_category_stats(db)]
+
+
+@router.get('/categories/{category}')
+def category_stats(category: str, db: Session = Depends(get_db)) -> Dict:
+    logger.debug("category_stats category=%s", category)
+    return _public(get_category_stats(db, category))
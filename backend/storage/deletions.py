@@ -0,0 +1,243 @@
+# backend/storage/deletions.py
+# Deferred, batched deletion of S3 objects.
+#
+# Deleting a product queues its image key in s3_deletions (migration 6) in the same
+# transaction, so the request never waits on S3 and a key is never lost to an S3 failure.
+# DeletionWorker drains the queue with DeleteObjects, up to S3_DELETE_BATCH_SIZE keys per
+# request: a batch is claimed by pushing next_attempt_at out by S3_DELETE_LEASE (FOR UPDATE
+# SKIP LOCKED, so several instances can drain side by side and a crashed worker's batch
+# comes back after the lease), deleted keys are removed from the queue and failed ones are
+# retried with exponential backoff.
+#
+# sweep_orphans() reconciles the bucket against product image keys and queues images no
+# product references (abandoned uploads, keys leaked before this queue existed):
+#
+#   python -m storage.deletions --sweep --dry-run   # count orphans only
+#   python -m storage.deletions --sweep             # queue them
+#   python -m storage.deletions --drain             # drain the queue once, e.g. from cron
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import text
+
+from config import (
+    S3_DELETE_BATCH_SIZE, S3_DELETE_INTERVAL, S3_DELETE_LEASE, S3_DELETE_RETRY_BASE,
+    S3_DELETE_MAX_BACKOFF, S3_IMAGE_PREFIX, S3_ORPHAN_GRACE_HOURS,
+)
+from models import AsyncSessionLocal
+from storage.s3 import s3
+import logging
+
+logger = logging.getLogger(__name__)
+
+_ENQUEUE = text("INSERT INTO s3_deletions (key) VALUES (:key) ON CONFLICT (key) DO NOTHING")
+_CLAIM = text(
+    "UPDATE s3_deletions SET attempts = attempts + 1, "
+    "next_attempt_at = CURRENT_TIMESTAMP + :lease * interval '1 second' "
+    "WHERE key IN (SELECT key FROM s3_deletions WHERE next_attempt_at <= CURRENT_TIMESTAMP "
+    "ORDER BY next_attempt_at LIMIT :limit FOR UPDATE SKIP LOCKED) "
+    "RETURNING key"
+)
+_DONE = text("DELETE FROM s3_deletions WHERE key = ANY(:keys)")
+_RETRY = text(
+    "UPDATE s3_deletions SET last_error = :error, "
+    "next_attempt_at = CURRENT_TIMESTAMP + LEAST(:max_backoff, :base * power(2, attempts - 1)) * interval '1 second' "
+    "WHERE key = :key"
+)
+_REFERENCED = text(
+    'SELECT image_key FROM "Products" WHERE image_key = ANY(:keys) '
+    "UNION SELECT image_key FROM product_images WHERE image_key = ANY(:keys)"
+)
+_QUEUED = text("SELECT key FROM s3_deletions WHERE key = ANY(:keys)")
+_NEXT_DUE = text("SELECT EXTRACT(EPOCH FROM min(next_attempt_at) - CURRENT_TIMESTAMP) FROM s3_deletions")
+_PENDING = text("SELECT count(*) AS pending, min(enqueued_at) AS oldest, max(attempts) AS max_attempts FROM s3_deletions")
+
+
+def enqueue_deletions(db, keys: Iterable[str]):
+    """Queue S3 keys for deletion inside db's current transaction (commits with the caller's write)."""
+    params = [{"key": key} for key in keys if key]
+    if params:
+        db.execute(_ENQUEUE, params)
+
+
+async def aenqueue_deletions(db, keys: Iterable[str]):
+    """enqueue_deletions() for an AsyncSession."""
+    await db.run_sync(enqueue_deletions, list(keys))
+
+
+class DeletionWorker:
+    def __init__(self, storage=s3, session_factory=AsyncSessionLocal, batch_size: int = S3_DELETE_BATCH_SIZE,
+                 interval: float = S3_DELETE_INTERVAL, lease: int = S3_DELETE_LEASE,
+                 retry_base: int = S3_DELETE_RETRY_BASE, max_backoff: int = S3_DELETE_MAX_BACKOFF):
+        self.storage = storage
+        self.session_factory = session_factory
+        self.batch_size = min(batch_size, 1000)  # the DeleteObjects limit
+        self.interval = interval
+        self.lease = lease
+        self.retry_base = retry_base
+        self.max_backoff = max_backoff
+        self._wake = None  # created in start(), on the serving event loop
+        self._task = None
+        self._stopping = False
+
+    async def drain_once(self) -> Tuple[int, int]:
+        """Claim and delete one batch of due keys; returns (deleted, failed)."""
+        async with self.session_factory() as db:
+            keys = (await db.execute(_CLAIM, {"lease": self.lease, "limit": self.batch_size})).scalars().all()
+            await db.commit()
+        if not keys:
+            return 0, 0
+
+        try:
+            errors = await self.storage.delete_objects(keys)
+        except Exception as e:
+            # The whole request failed (timeout, credentials, throttling past botocore's retries)
+            logger.warning("S3 batch delete of %d keys failed: %s", len(keys), e)
+            errors = [{"Key": key, "Code": type(e).__name__, "Message": str(e)} for key in keys]
+        # Deleting a missing key is not an error in S3, but don't retry it forever if a stand-in says so
+        failed = {e["Key"]: f"{e.get('Code')}: {e.get('Message')}" for e in errors if e.get("Code") != "NoSuchKey"}
+        deleted = [key for key in keys if key not in failed]
+
+        async with self.session_factory() as db:
+            if deleted:
+                await db.execute(_DONE, {"keys": deleted})
+            if failed:
+                await db.execute(_RETRY, [
+                    {"key": key, "error": error[:1000], "base": self.retry_base, "max_backoff": self.max_backoff}
+                    for key, error in failed.items()
+                ])
+            await db.commit()
+        if failed:
+            logger.warning("S3 batch delete: %d deleted, %d will be retried (e.g. %s)",
+                           len(deleted), len(failed), next(iter(failed.values())))
+        else:
+            logger.debug("S3 batch delete: %d deleted", len(deleted))
+        return len(deleted), len(failed)
+
+    async def drain(self) -> Tuple[int, int]:
+        """Delete batches until no due key is left (or only partial batches remain)."""
+        deleted = failed = 0
+        while True:
+            batch_deleted, batch_failed = await self.drain_once()
+            deleted, failed = deleted + batch_deleted, failed + batch_failed
+            if batch_deleted + batch_failed < self.batch_size:
+                return deleted, failed
+
+    async def seconds_until_due(self) -> float:
+        """How long until the next queued key may be tried (the poll interval if none is queued)."""
+        async with self.session_factory() as db:
+            due = (await db.execute(_NEXT_DUE)).scalar()
+        return self.interval if due is None else min(self.interval, max(float(due), 0.0))
+
+    def wake(self):
+        """Drain now rather than at the next poll, e.g. after a commit that queued keys."""
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self):
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="s3-deletion-worker")
+
+    async def stop(self):
+        if self._task:
+            # The flag as well as cancel(): on 3.11 a wait_for() finishing at the same moment
+            # (e.g. an S3 call) can swallow the cancellation
+            self._stopping = True
+            self._wake.set()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        timeout = 0.0  # drain whatever was left queued by the last run first
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping:
+                break
+            # Cleared before draining: a key queued while a batch is in flight wakes the next round
+            self._wake.clear()
+            try:
+                await self.drain()
+                # Sleep until the earliest retry or lease expiry, so backoff isn't rounded up to the poll
+                timeout = await self.seconds_until_due()
+            except Exception as e:
+                logger.error("S3 deletion worker failed: %s", e, exc_info=True)
+                timeout = self.interval
+
+
+deletion_worker = DeletionWorker()
+
+
+async def pending_stats():
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(_PENDING)).one()
+    return {"pending": row.pending, "oldest": row.oldest, "max_attempts": row.max_attempts}
+
+
+async def _list_page(prefix: str, token=None):
+    kwargs = {"Bucket": s3.bucket, "Prefix": prefix, "MaxKeys": 1000}
+    if token:
+        kwargs["ContinuationToken"] = token
+    return await s3.call("list_objects_v2", **kwargs)
+
+
+async def sweep_orphans(prefix: str = S3_IMAGE_PREFIX, grace_hours: int = S3_ORPHAN_GRACE_HOURS,
+                        dry_run: bool = False) -> dict:
+    """Queue objects under prefix that no product references and are older than grace_hours.
+
+    The grace period covers uploads whose product has not been saved yet: get_upload_url
+    hands out the key before create-product stores it.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=grace_hours)
+    scanned = orphans = 0
+    token = None
+    while True:
+        page = await _list_page(prefix, token)
+        candidates: List[str] = [obj["Key"] for obj in page.get("Contents", []) if obj["LastModified"] < cutoff]
+        scanned += page.get("KeyCount", 0)
+        if candidates:
+            async with AsyncSessionLocal() as db:
+                known = set((await db.execute(_REFERENCED, {"keys": candidates})).scalars())
+                known.update((await db.execute(_QUEUED, {"keys": candidates})).scalars())
+                found = [key for key in candidates if key not in known]
+                if found and not dry_run:
+                    await aenqueue_deletions(db, found)
+                    await db.commit()
+            orphans += len(found)
+        if not page.get("IsTruncated"):
+            break
+        token = page["NextContinuationToken"]
+    logger.info("Orphan sweep of s3://%s/%s: %d objects, %d orphans %s",
+                s3.bucket, prefix, scanned, orphans, "found" if dry_run else "queued")
+    return {"scanned": scanned, "orphans": orphans, "queued": 0 if dry_run else orphans}
+
+
+async def _main(args):
+    if args.sweep:
+        print(await sweep_orphans(args.prefix, args.grace_hours, args.dry_run))
+    if args.drain:
+        deleted, failed = await DeletionWorker().drain()
+        print(f"Deleted {deleted} objects, {failed} left for retry.")
+    print(await pending_stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drain the S3 deletion queue or sweep the bucket for orphaned images")
+    parser.add_argument("--drain", action="store_true", help="delete every due key now")
+    parser.add_argument("--sweep", action="store_true", help="queue objects no product references")
+    parser.add_argument("--dry-run", action="store_true", help="with --sweep: count orphans without queueing them")
+    parser.add_argument("--prefix", default=S3_IMAGE_PREFIX)
+    parser.add_argument("--grace-hours", type=int, default=S3_ORPHAN_GRACE_HOURS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args))
@@ -0,0 +1,128 @@
+# backend/storage/s3.py
+# Every S3 call the API makes goes through AsyncS3.
+#
+# boto3 blocks, so calls run on a dedicated pool of S3_MAX_CONCURRENCY threads (the same
+# size as the client's connection pool) rather than on the event loop or Starlette's shared
+# threadpool: a slow S3 can queue S3 work but cannot stall other requests. Each call has an
+# overall deadline (S3_CALL_TIMEOUT, queueing and retries included) on top of botocore's
+# connect/read timeouts and retry policy (S3_MAX_ATTEMPTS, S3_RETRY_MODE). Every call's
+# latency and outcome goes to the external_call_duration_seconds histogram (metrics.py).
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import boto3
+from botocore.config import Config
+
+from config import (
+    AWS_REGION, AWS_S3_BUCKET, S3_ENDPOINT_URL, S3_MAX_CONCURRENCY, S3_CALL_TIMEOUT,
+    S3_CONNECT_TIMEOUT, S3_READ_TIMEOUT, S3_MAX_ATTEMPTS, S3_RETRY_MODE,
+)
+from metrics import timed_call
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def make_client(max_concurrency: int = S3_MAX_CONCURRENCY):
+    return boto3.client(
+        "s3",
+        region_name=AWS_REGION,
+        endpoint_url=S3_ENDPOINT_URL,
+        config=Config(
+            connect_timeout=S3_CONNECT_TIMEOUT,
+            read_timeout=S3_READ_TIMEOUT,
+            retries={"max_attempts": S3_MAX_ATTEMPTS, "mode": S3_RETRY_MODE},
+            max_pool_connections=max_concurrency,
+        ),
+    )
+
+
+class AsyncS3:
+    def __init__(self, client=None, bucket: str = AWS_S3_BUCKET,
+                 max_concurrency: int = S3_MAX_CONCURRENCY, timeout: float = S3_CALL_TIMEOUT):
+        # Created up front: boto3 client creation is not thread-safe
+        self.client = client or make_client(max_concurrency)
+        self.bucket = bucket
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="s3")
+
+    async def run(self, fn, *, timeout: float = None, name: str = None):
+        """Run fn() on the S3 pool; raises asyncio.TimeoutError past the deadline."""
+        loop = asyncio.get_running_loop()
+        name = name or getattr(fn, "__name__", "call")
+        future = loop.run_in_executor(self._executor, fn)
+        try:
+            with timed_call("s3", name):
+                return await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            # The worker thread finishes (or times out in botocore) on its own; we just stop waiting
+            logger.warning("S3 %s timed out after %ss", name, timeout or self.timeout)
+            raise
+
+    async def call(self, operation: str, *, timeout: float = None, **kwargs):
+        """Run client.<operation>(**kwargs) on the S3 pool."""
+        return await self.run(functools.partial(getattr(self.client, operation), **kwargs), timeout=timeout, name=operation)
+
+    async def get_object_bytes(self, key: str) -> bytes:
+        # The body is read on the pool thread too: it streams from the connection
+        def fetch():
+            return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        return await self.run(fetch, name="get_object")
+
+    async def put_object(self, key: str, body: bytes, content_type: str, cache_control: str = None):
+        kwargs = {"CacheControl": cache_control} if cache_control else {}
+        return await self.call("put_object", Bucket=self.bucket, Key=key, Body=body, ContentType=content_type, **kwargs)
+
+    async def delete_object(self, key: str):
+        return await self.call("delete_object", Bucket=self.bucket, Key=key)
+
+    async def delete_objects(self, keys):
+        """One DeleteObjects request (at most 1000 keys); returns the per-key Errors list."""
+        response = await self.call(
+            "delete_objects",
+            Bucket=self.bucket,
+            Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+        )
+        return response.get("Errors", [])
+
+    async def presigned_put_url(self, key: str, content_type: str, expires_in: int = 3600) -> str:
+        return (await self.presigned_put_urls([(key, content_type)], expires_in))[0]
+
+    async def presigned_put_urls(self, items: List[Tuple[str, str]], expires_in: int = 3600) -> List[str]:
+        """One presigned PUT URL per (key, content_type), signed in a single trip to the pool."""
+        # Signing is local CPU work with the client's cached credentials, but the first call
+        # (or a refresh near expiry) fetches them over the network, so it stays off the event loop
+        def sign_all():
+            return [
+                self.client.generate_presigned_url(
+                    ClientMethod="put_object",
+                    Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type},
+                    ExpiresIn=expires_in,
+                )
+                for key, content_type in items
+            ]
+        return await self.run(sign_all, name="generate_presigned_url")
+
+    async def presigned_post(self, key_prefix: str, max_bytes: int, content_type_prefix: str = "image/",
+                             expires_in: int = 3600) -> Dict:
+        """One POST policy ({"url", "fields"}) valid for any number of uploads under key_prefix.
+
+        S3 enforces the conditions: the key must start with key_prefix, Content-Type with
+        content_type_prefix, and the body must be 1..max_bytes long. Each upload sends the
+        fields plus its own "key" and "Content-Type" fields, then the file.
+        """
+        return await self.call(
+            "generate_presigned_post",
+            Bucket=self.bucket,
+            Key=key_prefix + "${filename}",  # botocore turns this into a starts-with condition on $key
+            Conditions=[
+                ["starts-with", "$Content-Type", content_type_prefix],
+                ["content-length-range", 1, max_bytes],
+            ],
+            ExpiresIn=expires_in,
+        )
+
+
+s3 = AsyncS3()
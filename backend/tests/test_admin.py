@@ -0,0 +1,33 @@
+# backend/tests/test_admin.py
+import pytest
+
+from conftest import create_product
+
+ADMIN_ROUTES = [
+    ("GET", "/api/admin/users"),
+    ("GET", "/api/admin/transactions"),
+    ("GET", "/api/admin/transactions/last_week"),
+    ("GET", "/api/admin/analytics/transactions"),
+    ("POST", "/api/admin/analytics/refresh"),
+]
+
+
+@pytest.mark.parametrize("method, path", ADMIN_ROUTES)
+def test_admin_routes_need_the_admin_group(client, signed_in, method, path):
+    assert client.request(method, path).status_code == 401
+    signed_in("alice")
+    assert client.request(method, path).status_code == 403
+    signed_in("alice", groups=["sellers"])
+    assert client.request(method, path).status_code == 403
+
+
+def test_admin_delete_needs_the_admin_group(client, seller, signed_in):
+    product_id = create_product(client, seller)
+    assert client.delete(f"/api/admin/{product_id}").status_code == 401
+    signed_in(seller)  # even the product's own seller
+    assert client.delete(f"/api/admin/{product_id}").status_code == 403
+    assert client.get(f"/api/products/{product_id}").status_code == 200
+
+    signed_in("root", groups=["admin"])
+    assert client.delete(f"/api/admin/{product_id}").status_code == 200
+    assert client.get(f"/api/products/{product_id}").status_code == 404
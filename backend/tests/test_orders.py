@@ -0,0 +1,81 @@
+# backend/tests/test_orders.py
+import json
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import stripe
+from sqlalchemy import select, text
+
+from conftest import create_product
+from db.versions import read_version
+from models import Product, SessionLocal, Transaction, engine
+
+# Long enough for the whole race on a slow machine; a lock cycle never finishes
+RACE_TIMEOUT = 60
+
+
+def _finalize(client, product_id, buyer):
+    return client.post("/api/orders/finalize-order", params={
+        "product_id": product_id, "buyer_id": buyer, "session_id": f"cs_{product_id}_{buyer}",
+    })
+
+
+def _update_price(client, product_id, seller_id, price):
+    return client.put(f"/api/products/{product_id}", data={
+        "seller_id": seller_id, "updates_json_string": json.dumps({"price": price}),
+    })
+
+
+def _cancel_lock_waits():
+    # Unstick sessions waiting on a lock, so a lock cycle fails the test instead of hanging it
+    with engine.connect() as conn:
+        conn.execute(text(
+            "SELECT pg_cancel_backend(pid) FROM pg_stat_activity "
+            "WHERE datname = current_database() AND wait_event_type = 'Lock'"
+        ))
+
+
+def test_finalize_races_update_without_deadlock(client, seller):
+    # finalize_order and update_product both write the product row (and the stats rows its
+    # triggers touch) and bump the catalogue version; locked in different orders they deadlock
+    product_ids = [create_product(client, seller, price=10) for _ in range(100)]
+    with SessionLocal() as db:
+        version_before = read_version(db)[0]
+
+    with ThreadPoolExecutor(16) as pool:
+        futures = []
+        for pid in product_ids:
+            futures.append(pool.submit(_finalize, client, pid, "buyer"))
+            futures.append(pool.submit(_update_price, client, pid, seller, 20))
+        _, stuck = wait(futures, timeout=RACE_TIMEOUT)
+        if stuck:
+            _cancel_lock_waits()
+        responses = [f.result() for f in futures]
+
+    assert not stuck, f"{len(stuck)} requests deadlocked"
+    failed = [r.text for r in responses if r.status_code != 200]
+    assert not failed, failed
+    with SessionLocal() as db:
+        products = db.execute(select(Product).where(Product.product_id.in_(product_ids))).scalars().all()
+        assert {(p.status, p.price) for p in products} == {("sold", 20)}
+        sales = db.execute(select(Transaction).where(Transaction.product_id.in_(product_ids))).scalars().all()
+        assert sorted(t.product_id for t in sales) == sorted(product_ids)
+        assert {t.amount for t in sales} <= {10, 20}
+        # One bump per committed write
+        assert read_version(db)[0] - version_before == 2 * len(product_ids)
+
+
+def test_checkout_refuses_sold_products(client, seller, monkeypatch):
+    calls = []
+    monkeypatch.setattr(stripe.checkout.Session, "create", lambda **kwargs: calls.append(kwargs))
+    product_id = create_product(client, seller)
+    assert _finalize(client, product_id, "first-buyer").status_code == 200
+
+    response = client.post("/api/orders/create-checkout-session", params={
+        "seller_id": seller, "product_id": product_id, "buyer_id": "second-buyer",
+    })
+    assert response.status_code == 409
+    assert calls == []
+    missing = client.post("/api/orders/create-checkout-session", params={
+        "seller_id": seller, "product_id": 2**31 - 1, "buyer_id": "second-buyer",
+    })
+    assert missing.status_code == 404
@@ -0,0 +1,63 @@
+# backend/tests/test_products.py
+import json
+
+import pytest
+
+from conftest import create_product
+from images.pipeline import image_pipeline
+from models import ProductImage, SessionLocal
+
+
+def test_product_etag_moves_when_a_gallery_image_is_rendered(client, seller):
+    # Only the cover's variants are copied onto the product row, but the page shows them all
+    product_id = create_product(client, seller, image_keys=["products/cover.jpg", "products/second.jpg"])
+    etag = client.get(f"/api/products/{product_id}").headers["ETag"]
+    assert client.get(f"/api/products/{product_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    with SessionLocal() as db:
+        image = db.query(ProductImage).filter_by(product_id=product_id, image_key="products/second.jpg").one()
+    variants = {"thumb": {"webp": "variants/second/thumb.webp"}}
+    client.portal.call(image_pipeline._save, image.image_id, product_id, "products/second.jpg", variants)
+
+    response = client.get(f"/api/products/{product_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert [image["imageVariants"] for image in response.json()["images"]] == [None, variants]
+
+
+@pytest.mark.parametrize("view", ["listing", "product", "search"])
+def test_revalidation_is_304_until_a_write_then_200(client, seller, view):
+    product_id = create_product(client, seller, name="Etagtest lamp", category="etag-test")
+    path, params = {
+        "listing": ("/api/products/", {"category": "etag-test"}),
+        "product": (f"/api/products/{product_id}", {}),
+        "search": ("/api/search/", {"name": "etagtest"}),
+    }[view]
+    first = client.get(path, params=params)
+    etag = first.headers["ETag"]
+    # Served twice: once loaded, once from the cache
+    for _ in range(2):
+        assert client.get(path, params=params, headers={"If-None-Match": etag}).status_code == 304
+
+    client.put(f"/api/products/{product_id}", data={
+        "seller_id": seller, "updates_json_string": json.dumps({"name": "Etagtest lamp, renamed"}),
+    })
+    response = client.get(path, params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "Etagtest lamp, renamed" in response.text
+
+
+def test_bulk_update_never_reopens_a_sold_product(client, seller):
+    sold, listed = create_product(client, seller), create_product(client, seller)
+    assert client.post("/api/orders/finalize-order", params={"product_id": sold, "buyer_id": "buyer"}).status_code == 200
+
+    response = client.post("/api/products/bulk-update", data={
+        "seller_id": seller, "product_ids": [sold, listed], "updates_json_string": json.dumps({"status": "unsold", "price": 5}),
+    })
+    assert response.json() == {"updated": [listed], "skipped": [sold]}
+    assert client.get(f"/api/products/{sold}").json()["price"] == 10
+    # Without a status change, sold products are still edited
+    response = client.post("/api/products/bulk-update", data={
+        "seller_id": seller, "product_ids": [sold, listed], "updates_json_string": json.dumps({"category": "archive"}),
+    })
+    assert response.json() == {"updated": sorted([sold, listed]), "skipped": []}
@@ -0,0 +1,24 @@
+# backend/tests/test_stats.py
+from conftest import create_product
+
+
+def test_seller_stats_are_for_the_seller_or_an_admin(client, seller, signed_in):
+    create_product(client, seller, price=10)
+    path = f"/api/stats/sellers/{seller}"
+    assert client.get(path).status_code == 401
+
+    signed_in("someone-else")
+    assert client.get(path).status_code == 403
+    signed_in(seller)
+    own = client.get(path)
+    assert own.status_code == 200
+    assert own.json()["active_listings"] == 1 and "revenue" in own.json()
+    signed_in("root", groups=["admin"])
+    assert client.get(path).status_code == 200
+
+
+def test_category_stats_leave_out_revenue(client, seller):
+    create_product(client, seller, category="stats-test")
+    single = client.get("/api/stats/categories/stats-test").json()
+    assert single["active_listings"] >= 1 and "revenue" not in single
+    assert all("revenue" not in stats for stats in client.get("/api/stats/categories").json())
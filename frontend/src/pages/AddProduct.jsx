@@ -35,8 +35,8 @@ const AddProduct = () => {
     seller_id: user_id,   // ← default placeholder
   });
 
-  const [imageFile, setImageFile] = useState(null);
-  const [imagePreview, setImagePreview] = useState('');
+  const [imageFiles, setImageFiles] = useState([]);
+  const [imagePreviews, setImagePreviews] = useState([]);
   const [uploadProgress, setUploadProgress] = useState(0);
   const [isSubmitting, setIsSubmitting] = useState(false);
   const [error, setError] = useState('');
@@ -55,10 +55,10 @@ const AddProduct = () => {
   };
 
   const handleImageChange = (e) => {
-    const file = e.target.files[0];
-    if (file) {
-      setImageFile(file);
-      setImagePreview(URL.createObjectURL(file));
+    const files = Array.from(e.target.files);
+    if (files.length) {
+      setImageFiles(files);
+      setImagePreviews(files.map((file) => URL.createObjectURL(file)));
       setUploadProgress(0);
       setError('');
     }
@@ -66,14 +66,14 @@ const AddProduct = () => {
 
   useEffect(() => {
     return () => {
-      if (imagePreview) URL.revokeObjectURL(imagePreview);
+      imagePreviews.forEach((preview) => URL.revokeObjectURL(preview));
     };
-  }, [imagePreview]);
+  }, [imagePreviews]);
 
   const handleSubmit = async () => {
     setError('');
-    if (!imageFile) {
-      setError('Please select an image.');
+    if (!imageFiles.length) {
+      setError('Please select at least one image.');
       return;
     }
     if (!form.name || !form.price || !form.seller_id) {
@@ -85,26 +85,24 @@ const AddProduct = () => {
     setUploadProgress(0);
 
     try {
-      // 1) Get presigned URL
-      setError('Step 1/3: Requesting upload URL...');
-      const { data: { upload_url, key } } = await axios.get('/api/products/upload-url', {
-        params: { filename: imageFile.name },
-      });
-      // alert(data)
-      console.log('Upload URL received:', upload_url);
-      console.log('Key:', key);
-      // 2) Upload to S3
-      setError('Step 2/3: Uploading image...');
-      console.log('Uploading image to S3...');
-      await axios.put(upload_url, imageFile, {
-        headers: { 'Content-Type': imageFile.type },
-        onUploadProgress: (e) => {
-          const pct = Math.round((e.loaded * 100) / e.total);
-          setUploadProgress(pct);
-          console.log(`Upload progress: ${pct}%`);
-        },
-      });
-      console.log('Image upload completed.');
+      // 1) Get presigned URLs for every image in one request
+      setError('Step 1/3: Requesting upload URLs...');
+      const params = new URLSearchParams();
+      imageFiles.forEach((file) => params.append('filename', file.name));
+      const { data: { uploads } } = await axios.get('/api/products/upload-urls', { params });
+      // 2) Upload to S3, all images at once
+      setError('Step 2/3: Uploading images...');
+      const loaded = imageFiles.map(() => 0);
+      const total = imageFiles.reduce((sum, file) => sum + file.size, 0);
+      await Promise.all(uploads.map(({ upload_url, content_type }, i) =>
+        axios.put(upload_url, imageFiles[i], {
+          headers: { 'Content-Type': content_type },
+          onUploadProgress: (e) => {
+            loaded[i] = e.loaded;
+            setUploadProgress(Math.round((loaded.reduce((a, b) => a + b, 0) * 100) / total));
+          },
+        })
+      ));
 
       // 3) Create product
       setError('Step 3/3: Creating product entry...');
@@ -113,7 +111,7 @@ const AddProduct = () => {
       payload.append('price', form.price);
       payload.append('category', form.description);
       payload.append('seller_id', form.seller_id);    // now a string username
-      payload.append('image_keys', key);
+      uploads.forEach(({ key }) => payload.append('image_keys', key));
 
       console.log('Payload:', payload);
       await axios.post('/api/products/create-product', payload);
@@ -190,14 +188,16 @@ const AddProduct = () => {
           ))}
 
           <Button component="label" variant="outlined" sx={{ mt: 2 }}>
-            {imageFile ? 'Change Image' : 'Upload Image'}
-            <input type="file" accept="image/*" hidden onChange={handleImageChange} />
+            {imageFiles.length ? 'Change Images' : 'Upload Images'}
+            <input type="file" accept="image/*" multiple hidden onChange={handleImageChange} />
           </Button>
 
-          {imagePreview && (
+          {imagePreviews.length > 0 && (
             <Box mt={2}>
               <Typography>Preview:</Typography>
-              <Box component="img" src={imagePreview} alt="preview" sx={{ width: 200, mt: 1 }} />
+              {imagePreviews.map((preview, i) => (
+                <Box key={preview} component="img" src={preview} alt={`preview ${i + 1}`} sx={{ width: 200, mt: 1, mr: 1 }} />
+              ))}
             </Box>
           )}
 
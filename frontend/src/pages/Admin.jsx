@@ -73,10 +73,18 @@ const Admin = () => {
         setLoadingUsers(true);
         setUserError(null);
         try {
-            const response = await axios.get("/api/admin/users", {
-                headers: { Authorization: `Bearer ${token}` }
-            });
-            setUsers(response.data);
+            // The directory is paged; follow X-Next-Cursor until the last page
+            let allUsers = [];
+            let after = null;
+            do {
+                const response = await axios.get("/api/admin/users", {
+                    headers: { Authorization: `Bearer ${token}` },
+                    params: { limit: 1000, ...(after ? { after } : {}) }
+                });
+                allUsers = allUsers.concat(response.data);
+                after = response.headers["x-next-cursor"];
+            } while (after);
+            setUsers(allUsers);
         } catch (error) {
             console.error("Error fetching users:", error.response?.data?.detail || error.message);
             setUserError("Failed to fetch users: " + (error.response?.data?.detail || error.message));
@@ -89,10 +97,18 @@ const Admin = () => {
         setLoadingProducts(true);
         setProductError(null);
         try {
-            const response = await axios.get("/api/products", {
-                headers: { Authorization: `Bearer ${token}` }
-            });
-            setProducts(response.data);
+            // The listing is paged; follow X-Next-Cursor until the last page
+            let allProducts = [];
+            let after = null;
+            do {
+                const response = await axios.get("/api/products", {
+                    headers: { Authorization: `Bearer ${token}` },
+                    params: { limit: 500, ...(after ? { after } : {}) }
+                });
+                allProducts = allProducts.concat(response.data);
+                after = response.headers["x-next-cursor"];
+            } while (after);
+            setProducts(allProducts);
         } catch (error) {
             console.error("Error fetching products:", error.response?.data?.detail || error.message);
             setProductError("Failed to fetch products: " + (error.response?.data?.detail || error.message));
@@ -19,6 +19,8 @@ function OrderSuccess() {
     const buyer_id = queryParams.get("buyer_id");
     const seller_id = queryParams.get("seller_id");
     const product_id = queryParams.get("product_id");
+    // Stripe checkout session id: makes a retried or re-rendered finalize return the original sale
+    const session_id = queryParams.get("session_id");
 
     const [finalizing, setFinalizing] = useState(true); // State to track finalization process
     const [finalized, setFinalized] = useState(false); // State to indicate if finalization was successful
@@ -43,7 +45,7 @@ function OrderSuccess() {
 
             try {
                 await axios.post("/api/orders/finalize-order", null, {
-                    params: { buyer_id, seller_id, product_id },
+                    params: { buyer_id, seller_id, product_id, session_id },
                     // headers: { Authorization: `Bearer ${token}` }, // Uncomment later
                 });
                 console.log("✅ Order finalized after Stripe payment!");
@@ -81,7 +83,7 @@ function OrderSuccess() {
         finalizeOrder();
 
         // Dependencies: Include query param variables and navigate
-    }, [buyer_id, seller_id, product_id, navigate]); // Added navigate to dependencies
+    }, [buyer_id, seller_id, product_id, session_id, navigate]); // Added navigate to dependencies
 
     return (
         <Box
@@ -67,12 +67,21 @@ const Products = () => {
                     params.seller_id = userID;
                 }
 
-                const response = await axios.get(endpoint, { params });
+                // The listing is paged; follow X-Next-Cursor until the last page
+                let allProducts = [];
+                let after = null;
+                do {
+                    const response = await axios.get(endpoint, {
+                        params: { ...params, limit: 500, ...(after ? { after } : {}) }
+                    });
+                    allProducts = allProducts.concat(response.data);
+                    after = response.headers['x-next-cursor'];
+                } while (after);
 
                 if (userRole !== 'seller') {
-                    setProducts(response.data.filter(product => product.status !== 'sold'));
+                    setProducts(allProducts.filter(product => product.status !== 'sold'));
                 } else {
-                    setProducts(response.data);
+                    setProducts(allProducts);
                 }
 
             } catch (err) {
@@ -240,6 +249,13 @@ const Products = () => {
                         const productDescription = product.description;
                         const productImageKey = product.image_key || product.imageKey;
                         const fullImageUrl = productImageKey ? `${cdnBaseUrl}${productImageKey}?auto=compress&width=600` : '';
+                        // Resized AVIF/WebP copies once the backend has rendered them; the original until then
+                        const variants = product.imageVariants;
+                        const srcSet = (format) => variants && ['thumb', 'medium']
+                            .filter((size) => variants[size]?.[format])
+                            .map((size) => `${cdnBaseUrl}${variants[size][format]} ${size === 'thumb' ? 320 : 800}w`)
+                            .join(', ');
+                        const gridSizes = '(min-width: 900px) 33vw, (min-width: 600px) 50vw, 100vw';
 
                         return (
                             <Grid item xs={12} sm={6} md={4} key={product.ProductID}>
@@ -256,15 +272,19 @@ const Products = () => {
                                         alignItems: 'center',
                                     }}>
                                         {fullImageUrl ? (
-                                            <Box component="img" src={fullImageUrl} alt={productName} sx={{
-                                                position: 'absolute',
-                                                top: 0,
-                                                left: 0,
-                                                width: '100%',
-                                                height: '100%',
-                                                objectFit: 'cover',
-                                                borderRadius: 2,
-                                            }} />
+                                            <picture>
+                                                {srcSet('avif') && <source type="image/avif" srcSet={srcSet('avif')} sizes={gridSizes} />}
+                                                {srcSet('webp') && <source type="image/webp" srcSet={srcSet('webp')} sizes={gridSizes} />}
+                                                <Box component="img" src={fullImageUrl} alt={productName} loading="lazy" sx={{
+                                                    position: 'absolute',
+                                                    top: 0,
+                                                    left: 0,
+                                                    width: '100%',
+                                                    height: '100%',
+                                                    objectFit: 'cover',
+                                                    borderRadius: 2,
+                                                }} />
+                                            </picture>
                                         ) : (
                                             <Typography variant="body2" color="text.secondary">No Image</Typography>
                                         )}